@@ -28,8 +28,10 @@ const API_CONFIG = {
   BASE_URL: 'http://139.224.33.240:8000',
   ENDPOINTS: {
     PROCESS_VIDEO: '/process-video',
+    JOB_STATUS: '/jobs',
     CHECK_FILE: '/check-file'
-  }
+  },
+  JOB_POLL_INTERVAL_MS: 1000
 };
 
 interface RouteParams {
@@ -67,6 +69,8 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
   const [isProcessing, setIsProcessing] = useState(false);
   const [isUploading, setIsUploading] = useState(false);
   const [lastUploadedUri, setLastUploadedUri] = useState<string | null>(null);
+  // 使用 ref 保存最近上传内容的摘要，保证同一次处理流程中立即可读
+  const lastUploadedDigest = useRef<string | null>(null);
   const [messages, setMessages] = useState<Array<{
     id: string;
     text: string;
@@ -197,9 +201,10 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
         throw new Error(`文件检查失败: ${error.message}`);
       }
 
-      // 先检查文件是否已经上传
+      // 先按内容摘要检查文件是否已经上传
       const filename = uri.split('/').pop() || '';
-      console.log('检查文件是否已上传:', filename);
+      const digest = await RNFS.hash(uri.replace('file://', ''), 'sha256');
+      console.log('检查文件是否已上传:', filename, digest);
 
       try {
         const checkResponse = await fetch(`${API_CONFIG.BASE_URL}${API_CONFIG.ENDPOINTS.CHECK_FILE}`, {
@@ -207,7 +212,7 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
           headers: {
             'Content-Type': 'application/json',
           },
-          body: JSON.stringify({ filename }),
+          body: JSON.stringify({ filename, digest }),
         });
 
         if (!checkResponse.ok) {
@@ -220,6 +225,7 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
         if (checkData.status === 'success' && checkData.exists) {
           console.log('文件已存在于服务器');
           setLastUploadedUri(uri);
+          lastUploadedDigest.current = checkData.digest;
           return true;
         }
       } catch (error) {
@@ -262,6 +268,7 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
       if (data.status === 'success') {
         console.log('视频上传成功');
         setLastUploadedUri(uri);
+        lastUploadedDigest.current = data.digest;
         return true;
       } else {
         throw new Error(data.message || '上传失败');
@@ -291,6 +298,7 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
       setCurrentMediaUri(videoPath);
       // 重置上传状态
       setLastUploadedUri(null);
+      lastUploadedDigest.current = null;
       setIsPlaying(true);
 
       // 添加选择确认消息
@@ -436,6 +444,25 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
     }]);
   };
 
+  // 轮询渲染任务直到结束，返回最终任务状态
+  const waitForJob = async (jobId: string) => {
+    while (true) {
+      const response = await fetch(`${API_CONFIG.BASE_URL}${API_CONFIG.ENDPOINTS.JOB_STATUS}/${jobId}`);
+      if (!response.ok) {
+        throw new Error(`查询任务状态失败: ${response.status}`);
+      }
+      const data = await response.json();
+      const job = data.job;
+      if (job.status === 'succeeded') {
+        return { status: 'success', ...job };
+      }
+      if (job.status === 'failed') {
+        return { status: 'error', message: job.error };
+      }
+      await new Promise(resolve => setTimeout(resolve, API_CONFIG.JOB_POLL_INTERVAL_MS));
+    }
+  };
+
   const handleNaturalLanguageCommand = async (command: string) => {
     if (!currentMediaUri) {
       Alert.alert(getLocalizedText('错误', 'Error'), getLocalizedText('没有选择视频', 'No video selected'));
@@ -460,11 +487,16 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
         method: 'POST',
         body: (() => {
           const formData = new FormData();
-          formData.append('video', {
-            uri: currentMediaUri,
-            type: 'video/mp4',
-            name: currentMediaUri.split('/').pop() || 'video.mp4',
-          } as any);
+          // 服务器已有该内容时只发送摘要，避免重复上传整段视频
+          if (lastUploadedDigest.current) {
+            formData.append('digest', lastUploadedDigest.current);
+          } else {
+            formData.append('video', {
+              uri: currentMediaUri,
+              type: 'video/mp4',
+              name: currentMediaUri.split('/').pop() || 'video.mp4',
+            } as any);
+          }
           formData.append('instruction', command);
           return formData;
         })(),
@@ -484,7 +516,12 @@ const EditMediaScreen: React.FC<Props> = ({ route, navigation }) => {
         );
       }
 
-      const data = await nlpResponse.json();
+      let data = await nlpResponse.json();
+
+      // 服务器异步处理时返回任务 ID，轮询直到完成
+      if (data.job_id && data.status === 'accepted') {
+        data = await waitForJob(data.job_id);
+      }
 
       // 显示 NLP 解析的回复
       if (data.message) {
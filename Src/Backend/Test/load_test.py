@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+并发连接压测
+模拟大量移动端同时轮询任务状态，统计服务端在给定并发连接数下的成功率与延迟。
+
+对运行中的服务压测：
+    python Test/load_test.py --url http://127.0.0.1:8000 --path /jobs/<job_id> --connections 2000
+    python Test/load_test.py --url http://127.0.0.1:8000 --path "/jobs/<job_id>?wait=20" --connections 2000
+
+对比 Flask 开发服务器与异步服务模式（使用内置的演示应用，无需视频依赖）：
+    python Test/load_test.py --demo --connections 500 1000 2000
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+from urllib.parse import urlparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def _request(host, port, path, timeout):
+    """发送一次 GET 请求，返回 (状态码, 耗时)；失败时状态码为 None。"""
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+        status = int(data.split(b' ', 2)[1]) if data.startswith(b'HTTP/') else None
+        return status, time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return None, time.perf_counter() - start
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _client(host, port, path, deadline, interval, timeout, results):
+    """单个客户端：在截止时间前反复请求（短轮询时每次间隔 interval 秒）。"""
+    while time.perf_counter() < deadline:
+        status, elapsed = await _request(host, port, path, timeout)
+        results.append((status, elapsed))
+        if status is None:
+            await asyncio.sleep(interval)
+        elif interval:
+            await asyncio.sleep(interval)
+
+
+async def _run_load(url, path, connections, duration, interval, timeout):
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    results = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        _client(host, port, path, deadline, interval, timeout, results)
+        for _ in range(connections)
+    ])
+    # 压测期间另外探测一次健康检查的延迟
+    probe_status, probe_latency = await _request(host, port, '/health-check', timeout)
+    return results, probe_status, probe_latency
+
+
+def run_load(url, path, connections, duration=10.0, interval=1.0, timeout=30.0):
+    results, probe_status, probe_latency = asyncio.run(
+        _run_load(url, path, connections, duration, interval, timeout))
+    ok = sorted(e for s, e in results if s is not None and s < 500)
+    failed = len(results) - len(ok)
+    def pct(p):
+        return ok[min(len(ok) - 1, int(len(ok) * p))] * 1000 if ok else float('nan')
+    return {
+        'connections': connections,
+        'requests': len(results),
+        'ok': len(ok),
+        'failed': failed,
+        'p50_ms': pct(0.5),
+        'p95_ms': pct(0.95),
+        'probe_ok': probe_status == 200,
+        'probe_ms': probe_latency * 1000,
+    }
+
+
+def print_report(label, report):
+    print(f"{label:<8} 连接数={report['connections']:<6} 请求={report['requests']:<7} "
+          f"成功={report['ok']:<7} 失败={report['failed']:<6} "
+          f"p50={report['p50_ms']:.0f}ms p95={report['p95_ms']:.0f}ms "
+          f"健康检查={'OK' if report['probe_ok'] else '失败'}({report['probe_ms']:.0f}ms)")
+
+
+# ---------- 演示应用：模拟阻塞的 LLM 调用与长时间渲染任务 ----------
+def _build_demo_app():
+    from flask import Flask, jsonify
+    from job_queue import JobManager
+
+    app = Flask(__name__)
+    job_manager = JobManager(max_workers=2)
+    job = job_manager.submit('demo', lambda j: time.sleep(3600) or {})
+
+    @app.route('/health-check')
+    def health_check():
+        return jsonify({"status": "ok"})
+
+    @app.route('/jobs/<job_id>')
+    def get_job_status(job_id):
+        found = job_manager.get(job_id)
+        if found is None:
+            return jsonify({"error": "任务不存在"}), 404
+        return jsonify({"status": "success", "job": found.to_dict()})
+
+    return app, job_manager, job.job_id
+
+
+def _serve_demo(mode, port):
+    app, job_manager, job_id = _build_demo_app()
+    print(f"JOB_ID={job_id}", flush=True)
+    if mode == 'dev':
+        # 与 api_server.py 相同的启动方式
+        app.run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+    else:
+        import uvicorn
+        from asgi_server import AsyncAPIServer
+        uvicorn.run(AsyncAPIServer(app, job_manager=job_manager), host='127.0.0.1', port=port,
+                    log_level='warning', backlog=4096)
+
+
+def _wait_port(port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"端口 {port} 未就绪")
+
+
+def run_demo(connection_levels, duration):
+    scenarios = [
+        # 开发服务器：客户端每秒短轮询一次
+        ('dev', 18101, '/jobs/{job_id}', 1.0),
+        # 异步模式：同样的短轮询，请求经 WSGIBridge 交给 Flask 处理
+        ('asgi', 18102, '/jobs/{job_id}', 1.0),
+        # 异步模式：客户端长轮询，等待期间连接挂起（延迟约等于 wait）
+        ('asgi-lp', 18103, '/jobs/{job_id}?wait=5', 0.0),
+    ]
+    for label, port, path_template, interval in scenarios:
+        mode = 'dev' if label == 'dev' else 'asgi'
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve-demo', mode,
+                                 '--port', str(port)], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True)
+        try:
+            job_id = proc.stdout.readline().strip().split('=', 1)[1]
+            threading.Thread(target=proc.stdout.read, daemon=True).start()
+            _wait_port(port)
+            for connections in connection_levels:
+                report = run_load(f"http://127.0.0.1:{port}", path_template.format(job_id=job_id),
+                                  connections, duration=duration, interval=interval, timeout=duration + 10)
+                print_report(label, report)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发连接压测')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--path', default='/health-check')
+    parser.add_argument('--connections', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=1.0, help='短轮询间隔（秒），长轮询时设为 0')
+    parser.add_argument('--demo', action='store_true', help='对比开发服务器与异步服务模式')
+    parser.add_argument('--serve-demo', choices=['dev', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=18100, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_demo:
+        _serve_demo(args.serve_demo, args.port)
+    elif args.demo:
+        run_demo(args.connections, args.duration)
+    else:
+        for connections in args.connections:
+            print_report('target', run_load(args.url, args.path, connections, args.duration,
+                                            args.interval, args.duration + 30))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+测试准入控制：并发上限、有界队列、队列满时拒绝并给出 Retry-After
+"""
+
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, AdmissionRejected, default_limit
+
+
+def test_default_limit():
+    assert default_limit('render', cores=8, memory_gb=64) == 8
+    # 内存不足时按内存限制并发
+    assert default_limit('render', cores=8, memory_gb=4) == 2
+    assert default_limit('analyze', cores=8, memory_gb=64) == 4
+    assert default_limit('segment', cores=8, memory_gb=64) == 1
+
+
+def test_admission_controller():
+    controller = AdmissionController(limits={'render': 2}, max_queue={'render': 1})
+
+    # 上限 2 + 队列 1：前三个预留成功，第四个立即被拒绝
+    tickets = [controller.reserve('render') for _ in range(3)]
+    try:
+        controller.reserve('render')
+        assert False, '应当抛出 AdmissionRejected'
+    except AdmissionRejected as e:
+        assert e.resource_class == 'render' and e.retry_after >= 1
+
+    running = []
+    lock = threading.Lock()
+    peak = [0]
+    release = threading.Event()
+
+    def work(ticket):
+        with ticket:
+            with lock:
+                running.append(1)
+                peak[0] = max(peak[0], len(running))
+            release.wait(5)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in tickets]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    # 同时运行的数量不超过上限
+    assert controller.snapshot()['render']['running'] == 2
+    release.set()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+    assert controller.snapshot()['render'] == {'limit': 2, 'max_queue': 1, 'running': 0, 'reserved': 0}
+
+    # 同步接口：运行名额被占满时等待超时后拒绝
+    held = [controller.admit('render', timeout=1) for _ in range(2)]
+    try:
+        controller.admit('render', timeout=0.1)
+        assert False, '应当抛出 AdmissionRejected'
+    except AdmissionRejected:
+        pass
+    for ticket in held:
+        ticket.release()
+    assert controller.snapshot()['render']['reserved'] == 0
+    print("✓ 准入控制测试通过")
+
+
+def test_on_acquired():
+    controller = AdmissionController(limits={'render': 1}, max_queue={'render': 2})
+    started = []
+    first, second, third = (controller.reserve('render') for _ in range(3))
+    first.on_acquired(lambda: started.append('first'))
+    second.on_acquired(lambda: started.append('second'))
+    third.on_acquired(lambda: started.append('third'))
+    # 只有一个运行名额：后两个排队，不占用任何线程
+    assert started == ['first'] and controller.snapshot()['render']['running'] == 1
+
+    # 排队中放弃的预留不会拿到名额
+    second.release()
+    first.release()
+    assert started == ['first', 'third'] and controller.snapshot()['render']['running'] == 1
+    third.release()
+    assert controller.snapshot()['render'] == {'limit': 1, 'max_queue': 2, 'running': 0, 'reserved': 0}
+    print("✓ 异步等待运行名额测试通过")
+
+
+if __name__ == "__main__":
+    test_default_limit()
+    test_admission_controller()
+    test_on_acquired()
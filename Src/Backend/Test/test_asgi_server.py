@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+测试 ASGI 桥接：请求体边接收边读取、客户端中途断开时读到已到达部分、断开后停止发送响应体
+"""
+
+import os
+import sys
+import asyncio
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asgi_server import WSGIBridge, StreamingInput
+
+SCOPE = {'type': 'http', 'method': 'POST', 'path': '/upload', 'query_string': b'', 'headers': [],
+         'server': ('127.0.0.1', 8000), 'client': ('127.0.0.1', 50000), 'scheme': 'http'}
+
+
+def _run(bridge, messages):
+    """依次送出 messages，返回已发送的 ASGI 消息。"""
+    sent = []
+
+    async def main():
+        queue = asyncio.Queue()
+        for message in messages:
+            await queue.put(message)
+
+        async def receive():
+            return await queue.get()
+
+        async def send(message):
+            sent.append(message)
+
+        await bridge(SCOPE, receive, send)
+
+    asyncio.run(main())
+    return sent
+
+
+def test_streaming_read():
+    first_chunk_seen = threading.Event()
+    received = []
+
+    def app(environ, start_response):
+        stream = environ['wsgi.input']
+        received.append(stream.read(5))
+        first_chunk_seen.set()
+        received.append(stream.read())
+        received.append(stream.read())
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    sent = []
+
+    async def main():
+        gate = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=lambda: (first_chunk_seen.wait(5), loop.call_soon_threadsafe(gate.set)),
+                         daemon=True).start()
+        step = 0
+
+        async def receive():
+            nonlocal step
+            step += 1
+            if step == 1:
+                return {'type': 'http.request', 'body': b'hello', 'more_body': True}
+            if step == 2:
+                # 应用读到第一块之后才送出剩余请求体
+                await gate.wait()
+                return {'type': 'http.request', 'body': b' world', 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        await WSGIBridge(app, max_workers=2)(SCOPE, receive, send)
+
+    asyncio.run(main())
+    assert received == [b'hello', b' world', b'']
+    assert sent[0]['status'] == 200 and sent[-1]['more_body'] is False
+    print("✓ 请求体流式读取测试通过")
+
+
+def test_disconnect_during_upload():
+    received = []
+
+    def app(environ, start_response):
+        stream = environ['wsgi.input']
+        while True:
+            chunk = stream.read(4)
+            if not chunk:
+                break
+            received.append(chunk)
+        start_response('200 OK', [])
+        return [b'']
+
+    sent = _run(WSGIBridge(app, max_workers=2), [
+        {'type': 'http.request', 'body': b'abcdefgh', 'more_body': True},
+        {'type': 'http.disconnect'},
+    ])
+    # 应用读到已到达的部分后得到 EOF，并且不再发送响应体
+    assert b''.join(received) == b'abcdefgh'
+    assert not any(m['type'] == 'http.response.body' and m.get('body') for m in sent)
+    print("✓ 上传中断开测试通过")
+
+
+def test_json_body_in_several_messages():
+    from flask import Flask, request, jsonify
+    app = Flask(__name__)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        return jsonify(request.get_json())
+
+    body = b'{"instruction": "' + b'x' * 5000 + b'", "digests": ["ab"]}'
+    parts = [body[i:i + 1000] for i in range(0, len(body), 1000)]
+    messages = [{'type': 'http.request', 'body': part, 'more_body': i < len(parts) - 1}
+                for i, part in enumerate(parts)]
+    # 分块传输（没有 Content-Length）与声明了 Content-Length 两种情况
+    for headers in ([], [(b'content-length', str(len(body)).encode('ascii'))]):
+        scope = dict(SCOPE, headers=[(b'content-type', b'application/json')] + headers)
+        bridge = WSGIBridge(app, max_workers=2, input_buffer_bytes=1500)
+        sent = []
+
+        async def main():
+            queue = asyncio.Queue()
+            for message in messages:
+                await queue.put(message)
+
+            async def send(message):
+                sent.append(message)
+
+            await bridge(scope, queue.get, send)
+
+        asyncio.run(main())
+        assert sent[0]['status'] == 200
+        payload = b''.join(m.get('body', b'') for m in sent[1:])
+        assert b'"digests":["ab"]' in payload.replace(b' ', b'') and payload.count(b'x') == 5000
+    print("✓ 多条消息的 JSON 请求体测试通过")
+
+
+def test_stop_body_on_disconnect():
+    produced = []
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+
+        def body():
+            for i in range(1000):
+                produced.append(i)
+                yield b'x' * 1024
+        return body()
+
+    sent = []
+
+    async def main():
+        step = 0
+
+        async def receive():
+            nonlocal step
+            step += 1
+            if step == 1:
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.sleep(0.05)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            await asyncio.sleep(0.001)
+
+        await WSGIBridge(app, max_workers=2)(SCOPE, receive, send)
+
+    asyncio.run(main())
+    # 断开后不再读取响应体，也不发送结束消息
+    assert len(produced) < 1000
+    assert all(m.get('more_body', True) for m in sent if m['type'] == 'http.response.body')
+    print("✓ 响应中断开测试通过")
+
+
+def test_backpressure():
+    async def main():
+        stream = StreamingInput(asyncio.get_running_loop(), max_buffer=8)
+        await stream.feed(b'12345678')
+        blocked = asyncio.ensure_future(stream.feed(b'9'))
+        await asyncio.sleep(0.01)
+        # 缓冲已满，读取之前不再接收
+        assert not blocked.done()
+        assert await asyncio.get_running_loop().run_in_executor(None, stream.read, 4) == b'1234'
+        await asyncio.wait_for(blocked, 1)
+        stream.finish()
+        assert stream.read() == b'56789' and stream.read() == b''
+
+    asyncio.run(main())
+    print("✓ 背压测试通过")
+
+
+if __name__ == "__main__":
+    test_streaming_read()
+    test_disconnect_during_upload()
+    test_json_body_in_several_messages()
+    test_stop_body_on_disconnect()
+    test_backpressure()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试音频混合引擎：整块计算、覆盖 / 叠加 / 压低三种模式、声道转换、标量时间兼容
+"""
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_mixer import AudioMixer, AudioLayer, to_channels, MODE_OVERWRITE, MODE_MIX, MODE_DUCK
+
+calls = []
+
+
+def base_source(tt):
+    """原音频：立体声，左右声道分别为 0.5 / -0.5"""
+    calls.append(len(tt))
+    return np.tile(np.array([0.5, -0.5], dtype=np.float32), (len(tt), 1))
+
+
+def mono_source(tt):
+    """片段：单声道，取值为片段内时间"""
+    return np.asarray(tt, dtype=np.float32)
+
+
+def test_to_channels():
+    assert to_channels(np.zeros(3)).shape == (3, 2)
+    assert to_channels(np.ones((3, 1))).tolist() == [[1, 1]] * 3
+    assert to_channels(np.arange(12).reshape(3, 4)).tolist() == [[0, 1], [4, 5], [8, 9]]
+    print("✓ 声道转换测试通过")
+
+
+def test_modes():
+    tt = np.array([0.5, 1.5, 2.5, 3.5, 4.5])
+
+    mixer = AudioMixer(base_source, duration=5.0)
+    mixer.add_layer(AudioLayer(mono_source, 2.0, start=1.0, end=3.0, gain=2.0, mode=MODE_OVERWRITE))
+    out = mixer.make_frame(tt)
+    assert out.shape == (5, 2)
+    assert out[0].tolist() == [0.5, -0.5] and out[4].tolist() == [0.5, -0.5]
+    # 区间内只有新音频（单声道复制到两个声道，音量 ×2）
+    assert out[1].tolist() == [1.0, 1.0] and out[2].tolist() == [3.0, 3.0]
+    # 原音频只对区间外的时间点取样
+    assert calls[-1] == 3
+
+    mixer = AudioMixer(base_source, duration=5.0)
+    mixer.add_layer(AudioLayer(mono_source, 2.0, start=1.0, end=3.0, mode=MODE_MIX))
+    out = mixer.make_frame(tt)
+    assert np.allclose(out[1], [1.0, 0.0]) and np.allclose(out[3], [0.5, -0.5])
+
+    mixer = AudioMixer(base_source, duration=5.0)
+    mixer.add_layer(AudioLayer(mono_source, 2.0, start=1.0, end=3.0, mode=MODE_DUCK, duck_gain=0.2, ramp=0.5))
+    out = mixer.make_frame(np.array([0.25, 0.75, 2.0, 3.25, 4.0]))
+    assert np.allclose(out[0], [0.5, -0.5])
+    # 渐变区间内原音频音量线性过渡
+    assert np.allclose(out[1], [0.5 * 0.6, -0.5 * 0.6])
+    assert np.allclose(out[2], [0.1 + 1.0, -0.1 + 1.0])
+    assert np.allclose(out[3], [0.5 * 0.6, -0.5 * 0.6])
+    print("✓ 覆盖 / 叠加 / 压低模式测试通过")
+
+
+def test_multiple_layers_and_scalar():
+    mixer = AudioMixer(None, duration=10.0)
+    mixer.add_layer(AudioLayer(mono_source, 1.0, start=2.0, end=3.0, mode=MODE_MIX))
+    mixer.add_layer(AudioLayer(mono_source, 1.0, start=2.5, end=3.5, gain=0.5, mode=MODE_OVERWRITE))
+    # 标量时间返回 (2,)；后加入的覆盖片段同样覆盖更早的片段
+    assert mixer.make_frame(2.75).tolist() == [0.125, 0.125]
+    assert mixer.make_frame(2.25).tolist() == [0.25, 0.25]
+    assert mixer.make_frame(11.0).tolist() == [0.0, 0.0]
+    assert np.allclose(mixer.make_frame(np.array([3.4]))[0], [0.45, 0.45])
+    # 片段比区间短时区间尾部为静音
+    mixer.add_layer(AudioLayer(mono_source, 0.5, start=5.0, end=6.0, mode=MODE_MIX))
+    assert np.allclose(mixer.make_frame(np.array([5.25, 5.75])), [[0.25, 0.25], [0.0, 0.0]])
+    print("✓ 多片段与标量时间测试通过")
+
+
+if __name__ == "__main__":
+    test_to_channels()
+    test_modes()
+    test_multiple_layers_and_scalar()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试批量渲染：进程池并行执行、逐项状态、单项失败不影响其他项
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process_pool
+from job_queue import RenderJob
+from batch_render import BatchRenderer, editor_type_for, ITEM_SUCCEEDED, ITEM_FAILED
+
+
+def fake_render(editor_type, video_path, action, output_path):
+    """代替真实编辑器：源文件名含 bad 时失败，否则写出输出文件"""
+    if 'bad' in video_path:
+        raise ValueError('解码失败')
+    with open(output_path, 'w') as f:
+        f.write(f"{editor_type}:{action}:{os.getpid()}")
+    return output_path
+
+
+def test_editor_type_for():
+    assert editor_type_for('action: trim start=2.0 editor=ffmpeg') == 'ffmpeg'
+    assert editor_type_for('action: trim start=2.0') == 'moviepy'
+
+
+def test_batch_renderer():
+    with tempfile.TemporaryDirectory() as root:
+        tasks = []
+        for name in ['a.mp4', 'bad.mp4', 'c.mp4']:
+            tasks.append({
+                'item': {'name': name},
+                'editor_type': 'moviepy',
+                'video_path': os.path.join(root, name),
+                'action': 'action: trim start=2.0',
+                'output_path': os.path.join(root, f"out_{name}"),
+            })
+        committed = []
+        renderer = BatchRenderer(max_workers=2)
+        job = RenderJob('process_batch')
+        try:
+            items = renderer.run(job, tasks, on_success=lambda t: committed.append(t['item']['name']),
+                                 worker=fake_render)
+        finally:
+            process_pool.shutdown()
+
+        status = {i['name']: i['status'] for i in items}
+        assert status == {'a.mp4': ITEM_SUCCEEDED, 'bad.mp4': ITEM_FAILED, 'c.mp4': ITEM_SUCCEEDED}
+        assert '解码失败' in items[1]['error']
+        assert sorted(committed) == ['a.mp4', 'c.mp4']
+        assert job.progress == 1.0
+        # 渲染在子进程中完成
+        with open(os.path.join(root, 'out_a.mp4')) as f:
+            assert int(f.read().rsplit(':', 1)[1]) != os.getpid()
+        print("✓ 批量渲染测试通过")
+
+
+def test_shared_pool():
+    # 批量渲染与并行分段渲染共用同一个进程池
+    try:
+        executor = process_pool.get_executor(2)
+        assert process_pool.get_executor(8) is executor
+    finally:
+        process_pool.shutdown()
+    assert process_pool._executor is None
+    print("✓ 共用进程池测试通过")
+
+
+if __name__ == "__main__":
+    test_editor_type_for()
+    test_batch_renderer()
+    test_shared_pool()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试可续传的分块上传：区间合并与缺失区间、乱序与重叠写入、中断后续传、摘要校验
+"""
+
+import io
+import os
+import sys
+import hashlib
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import ContentStore
+from chunked_upload import UploadSessionManager, UploadSessionError, merge_ranges, missing_ranges
+
+
+class BrokenStream(io.BytesIO):
+    """读出 limit 字节后模拟连接断开"""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise OSError('连接已断开')
+        return super().read(min(size, self.limit - self.tell()))
+
+
+def test_ranges():
+    assert merge_ranges([[10, 20], [0, 5], [5, 8], [15, 30], [40, 40]]) == [[0, 8], [10, 30]]
+    assert merge_ranges([]) == []
+    assert missing_ranges([[0, 8], [10, 30]], 50) == [[8, 10], [30, 50]]
+    assert missing_ranges([], 10) == [[0, 10]]
+    assert missing_ranges([[0, 10]], 10) == []
+    print("✓ 区间计算测试通过")
+
+
+def test_upload_session():
+    with tempfile.TemporaryDirectory() as root:
+        store = ContentStore(os.path.join(root, 'store'))
+        manager = UploadSessionManager(store, os.path.join(root, 'sessions'), chunk_size=7)
+        data = os.urandom(100)
+        session = manager.create('VID_0001.mp4', len(data), hashlib.sha256(data).hexdigest())
+        session_id = session['session_id']
+        assert session['missing'] == [[0, 100]] and not session['complete']
+
+        # 乱序、重叠写入
+        manager.write_range(session_id, 60, io.BytesIO(data[60:]), 40)
+        status = manager.write_range(session_id, 50, io.BytesIO(data[50:70]), 20)
+        assert status['received'] == [[50, 100]] and status['received_bytes'] == 50
+
+        # 写入中途断开：已写入的部分仍记为已收到，之后只需补传缺失部分
+        try:
+            manager.write_range(session_id, 0, BrokenStream(data[:50], 21), 50)
+            assert False, "断开应抛出异常"
+        except OSError:
+            pass
+        status = manager.status(session_id)
+        assert status['received'] == [[0, 21], [50, 100]] and status['missing'] == [[21, 50]]
+        try:
+            manager.finalize(session_id)
+            assert False, "区间未到齐时不能完成"
+        except UploadSessionError:
+            pass
+
+        status = manager.write_range(session_id, 21, io.BytesIO(data[21:50]), 29)
+        assert status['complete']
+        record = manager.finalize(session_id)
+        assert record['digest'] == hashlib.sha256(data).hexdigest()
+        with open(store.path_for(record['name']), 'rb') as f:
+            assert f.read() == data
+        # 会话数据已移除
+        try:
+            manager.status(session_id)
+            assert False, "完成后会话应已删除"
+        except UploadSessionError:
+            pass
+
+        # 越界区间
+        other = manager.create('b.mp4', 10)['session_id']
+        for start, length in ((10, 1), (5, 6), (-1, 1)):
+            try:
+                manager.write_range(other, start, io.BytesIO(b'x' * length), length)
+                assert False, "越界区间应报错"
+            except UploadSessionError:
+                pass
+    print("✓ 分块写入与续传测试通过")
+
+
+def test_digest_mismatch():
+    with tempfile.TemporaryDirectory() as root:
+        store = ContentStore(os.path.join(root, 'store'))
+        manager = UploadSessionManager(store, os.path.join(root, 'sessions'))
+        session_id = manager.create('a.mp4', 4, 'ab' * 32)['session_id']
+        manager.write_range(session_id, 0, io.BytesIO(b'data'), 4)
+        try:
+            manager.finalize(session_id)
+            assert False, "摘要不匹配应报错"
+        except UploadSessionError as e:
+            assert '内容摘要不匹配' in str(e)
+        # 校验失败时会话保留，数据未进入存储
+        assert manager.status(session_id)['complete']
+        assert store.lookup(hashlib.sha256(b'data').hexdigest()) is None
+    print("✓ 摘要校验测试通过")
+
+
+def test_invalid_size():
+    with tempfile.TemporaryDirectory() as root:
+        manager = UploadSessionManager(ContentStore(os.path.join(root, 'store')), os.path.join(root, 'sessions'))
+        for size in ('abc', '', -5, 0, '-1', 1.5, True, None, [4], float('inf')):
+            try:
+                manager.create('a.mp4', size)
+                assert False, f"size={size!r} 应被拒绝"
+            except UploadSessionError:
+                pass
+        assert os.listdir(os.path.join(root, 'sessions')) == []
+        # 整数字符串与整数值的小数按整数处理
+        assert manager.create('a.mp4', '4')['size'] == 4
+        assert manager.create('a.mp4', 4.0)['size'] == 4
+    print("✓ 文件大小校验测试通过")
+
+
+if __name__ == "__main__":
+    test_ranges()
+    test_upload_session()
+    test_digest_mismatch()
+    test_invalid_size()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+测试无损合并：输入收集、复制 / 转码方案选择、拼接命令，以及 MoviePy 合并共用的画布补边
+"""
+
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concat_render import concat_inputs, plan_concat, build_commands, canvas_size, pad_frame, pad_command
+from render_profiles import default_profile
+
+# 与 nlp_parser.OPERATIONS 中对应条目相同的参数定义
+OPERATIONS = {
+    'concatenate': {'params': {
+        'second_video': {'type': str, 'default': '', 'required': True},
+        'transition': {'type': str, 'default': 'none', 'required': False},
+        'transition_duration': {'type': float, 'default': 1.0, 'required': False},
+    }},
+    'concatenate_multiple': {'params': {
+        'video_files': {'type': list, 'default': [], 'required': True},
+        'transition': {'type': str, 'default': 'none', 'required': False},
+        'transition_duration': {'type': float, 'default': 1.0, 'required': False},
+    }},
+    'speed': {'params': {'factor': {'type': float, 'default': 1.0, 'required': True}}},
+}
+
+
+def _meta(width=1920, height=1080, fps=30.0, codec='h264', pix_fmt='yuv420p', rotation=0, audio=True,
+          profile='High', level=40):
+    return {
+        'duration': 10.0,
+        'video': {'codec': codec, 'width': width, 'height': height, 'fps': fps, 'pix_fmt': pix_fmt,
+                  'rotation': rotation, 'profile': profile, 'level': level, 'duration': 10.0},
+        'audio': {'codec': 'aac', 'sample_rate': 48000, 'channels': 2} if audio else None,
+    }
+
+
+def test_inputs():
+    with tempfile.TemporaryDirectory() as work_dir:
+        first, second = os.path.join(work_dir, 'a.mp4'), os.path.join(work_dir, 'b.mp4')
+        for path in (first, second):
+            open(path, 'w').close()
+        missing = os.path.join(work_dir, 'missing.mp4')
+
+        assert concat_inputs(first, [f"action: concatenate second_video={second}"], OPERATIONS) == [first, second]
+        # concatenate_multiple 跳过缺失文件
+        assert concat_inputs(first, [f"action: concatenate_multiple video_files={second},{missing}"],
+                             OPERATIONS) == [first, second]
+        # 提示词中的列表写法 [a,b]
+        assert concat_inputs(first, [f"action: concatenate_multiple video_files=[{second},{second}]"],
+                             OPERATIONS) == [first, second, second]
+        # 有转场或其他操作时不适用
+        assert concat_inputs(first, [f"action: concatenate second_video={second} transition=fade"], OPERATIONS) is None
+        assert concat_inputs(first, [f"action: concatenate second_video={second}", "action: speed factor=2"],
+                             OPERATIONS) is None
+        try:
+            concat_inputs(first, [f"action: concatenate second_video={missing}"], OPERATIONS)
+            assert False, "缺失的第二个视频应报错"
+        except FileNotFoundError:
+            pass
+    print("✓ 合并输入收集测试通过")
+
+
+def test_plan():
+    assert plan_concat([_meta(), _meta()]) == {'mode': 'copy'}
+
+    plan = plan_concat([_meta(), _meta(width=1280, height=720), _meta(fps=60.0, audio=False)])
+    assert plan['mode'] == 'normalize'
+    assert (plan['target']['width'], plan['target']['height'], plan['target']['fps']) == (1920, 1080, 60.0)
+    assert plan['transcode'] == [True, True, True]
+
+    # 只有与目标格式不同的输入需要转码
+    plan = plan_concat([_meta(), _meta(codec='hevc')])
+    assert plan['transcode'] == [False, True]
+
+    # 格式相同但 H.264 profile / level 不同的输入也需转码，目标沿用第一个可复制输入的 profile / level
+    plan = plan_concat([_meta(width=1280, height=720), _meta(), _meta(profile='Main'), _meta(level=41)])
+    assert plan['transcode'] == [True, False, True, True]
+    assert (plan['target']['profile'], plan['target']['level']) == ('High', 40)
+    assert plan_concat([_meta(), _meta(level=41)])['transcode'] == [False, True]
+
+    # 旋转或无法直接拼接的像素格式不适用
+    assert plan_concat([_meta(), _meta(rotation=90)]) is None
+    assert plan_concat([_meta(pix_fmt='yuv422p10le'), _meta(width=1280)]) is None
+    print("✓ 合并方案测试通过")
+
+
+def test_commands():
+    with tempfile.TemporaryDirectory() as work_dir:
+        metas = [_meta(), _meta()]
+        commands = build_commands(['a.mp4', 'b.mp4'], metas, plan_concat(metas), work_dir, 'out.mp4')
+        assert len(commands) == 1 and commands[0][-1] == 'out.mp4'
+        assert commands[0][commands[0].index('-c') + 1] == 'copy'
+
+        metas = [_meta(), _meta(codec='hevc', audio=False)]
+        commands = build_commands(['a.mp4', 'b.mp4'], metas, plan_concat(metas), work_dir, 'out.mp4')
+        # 两段封装转换 / 转码 + 拼接
+        assert len(commands) == 3
+        assert 'libx264' not in commands[0] and commands[0][commands[0].index('-c') + 1] == 'copy'
+        assert 'libx264' in commands[1] and any(arg.startswith('anullsrc') for arg in commands[1])
+        assert 'aac_adtstoasc' in commands[-1]
+        # 转码按默认渲染配置编码，像素格式与直接复制的输入一致
+        transcode = commands[1]
+        assert transcode[transcode.index('-preset') + 1] == 'medium' and transcode[transcode.index('-crf') + 1] == '23'
+        assert transcode[transcode.index('-pix_fmt') + 1] == 'yuv420p' and '+faststart' in commands[-1]
+        # 与直接复制的输入相同的 profile / level
+        assert transcode[transcode.index('-profile:v') + 1] == 'high' and transcode[transcode.index('-level') + 1] == '4.0'
+        with open(os.path.join(work_dir, 'inputs.txt'), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert [line.rsplit('/', 1)[-1] for line in lines] == ["part_00.ts'", "part_01.ts'"]
+
+        # 指定的渲染配置决定转码的 preset / CRF 与是否前置 moov；H.264 profile 仍与复制的输入一致
+        profile = default_profile().with_overrides({'preset': 'fast', 'crf': 20, 'h264_profile': 'baseline',
+                                                    'faststart': False})
+        metas = [_meta(pix_fmt='yuvj420p', profile='Main'), _meta(width=1280, height=720, pix_fmt='yuvj420p')]
+        commands = build_commands(['a.mp4', 'b.mp4'], metas, plan_concat(metas), work_dir, 'out.mp4', profile)
+        transcode = commands[1]
+        assert transcode[transcode.index('-preset') + 1] == 'fast' and transcode[transcode.index('-crf') + 1] == '20'
+        assert transcode[transcode.index('-profile:v') + 1] == 'main' and transcode.count('-profile:v') == 1
+        assert transcode[transcode.index('-pix_fmt') + 1] == 'yuvj420p'
+        assert '+faststart' not in commands[-1]
+    print("✓ 合并命令测试通过")
+
+
+def test_padding():
+    assert canvas_size([(1920, 1080), (1280, 720), (1080, 1920)]) == (1920, 1920)
+    frame = np.full((2, 4, 3), 255, dtype=np.uint8)
+    # 尺寸一致时原样返回，不复制
+    assert pad_frame(frame, (4, 2)) is frame
+    padded = pad_frame(frame, (8, 4))
+    assert padded.shape == (4, 8, 3) and padded.dtype == np.uint8
+    # 居中放置，四周补黑边
+    assert (padded[1:3, 2:6] == 255).all() and padded.sum() == frame.sum()
+    # MoviePy 合并前的一次性补边按渲染配置的 CRF 编码，而非无损
+    command = pad_command('b.mp4', (1920, 1080), 'b_pad.mp4', default_profile().with_overrides({'crf': 20}))
+    assert command[command.index('-vf') + 1].startswith('pad=1920:1080:') and command[-1] == 'b_pad.mp4'
+    assert command[command.index('-crf') + 1] == '20' and '-qp' not in command
+    print("✓ 画布补边测试通过")
+
+
+if __name__ == "__main__":
+    test_inputs()
+    test_plan()
+    test_commands()
+    test_padding()
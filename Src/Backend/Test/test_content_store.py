@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+测试内容寻址上传存储：同名不同内容不冲突、同内容去重、索引重启后仍可用、客户端引用只能解析到存储内对象
+"""
+
+import io
+import os
+import sys
+import hashlib
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import ContentStore
+
+
+def test_content_store():
+    with tempfile.TemporaryDirectory() as root:
+        store = ContentStore(root, chunk_size=7)
+        data_a = os.urandom(50000)
+        data_b = os.urandom(1234)
+
+        # 两台设备上传同名但内容不同的文件
+        rec_a = store.save_upload(io.BytesIO(data_a), 'VID_0001.mp4')
+        rec_b = store.save_upload(io.BytesIO(data_b), 'VID_0001.mp4')
+        assert rec_a['digest'] == hashlib.sha256(data_a).hexdigest()
+        assert rec_a['name'] != rec_b['name']
+        assert not rec_a['deduplicated'] and not rec_b['deduplicated']
+
+        # 同样内容换个名字上传，只存一份
+        rec_c = store.save_upload(io.BytesIO(data_a), 'copy.mp4')
+        assert rec_c['deduplicated'] and rec_c['name'] == rec_a['name']
+        assert sorted(f for f in os.listdir(root) if f.endswith('.mp4')) == sorted([rec_a['name'], rec_b['name']])
+
+        # 部分哈希预检
+        partial = ContentStore.partial_hash(io.BytesIO(data_a))
+        assert [r['digest'] for r in store.lookup_partial(partial, len(data_a))] == [rec_a['digest']]
+        assert store.lookup_partial(partial, len(data_a) + 1) == []
+
+        # 重新加载索引后仍能按摘要找到
+        reloaded = ContentStore(root)
+        found = reloaded.lookup(rec_a['digest'])
+        assert found and set(found['original_filenames']) == {'VID_0001.mp4', 'copy.mp4'}
+        print("✓ 内容寻址存储测试通过")
+
+
+def test_resolve():
+    with tempfile.TemporaryDirectory() as root:
+        store = ContentStore(os.path.join(root, 'store'))
+        record = store.save_upload(io.BytesIO(os.urandom(1000)), 'bgm.mp3')
+        # 摘要、对象名与 path_for 返回的路径都指向同一对象
+        for reference in (record['digest'], record['name'], store.path_for(record['name'])):
+            assert store.resolve(reference)['digest'] == record['digest']
+        # 存储目录以外的路径即使文件名相同也不接受
+        outside = os.path.join(root, record['name'])
+        open(outside, 'w').close()
+        for reference in (outside, f"../{record['name']}", '/etc/passwd', 'bgm.mp3', '', None):
+            assert store.resolve(reference) is None
+        print("✓ 对象引用解析测试通过")
+
+
+if __name__ == "__main__":
+    test_content_store()
+    test_resolve()
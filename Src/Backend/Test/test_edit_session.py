@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+测试多步剪辑会话：追加操作不重建编辑器、撤销后按操作链重放、重启后恢复会话、过期扫描不载入会话
+"""
+
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edit_session import EditSessionManager, EditSessionError
+
+
+class FakeEditor:
+    """记录被执行的操作，代替真正的视频编辑器"""
+    created = 0
+
+    def __init__(self, video_path):
+        FakeEditor.created += 1
+        self.applied = []
+        self.closed = False
+
+    def execute_action(self, action, operations):
+        if 'bad' in action:
+            raise ValueError('参数错误')
+        self.applied.append(action)
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+def test_edit_session():
+    with tempfile.TemporaryDirectory() as root:
+        video = os.path.join(root, 'src.mp4')
+        open(video, 'wb').close()
+        FakeEditor.created = 0
+        manager = EditSessionManager(FakeEditor, {}, os.path.join(root, 'sessions'))
+
+        session = manager.create('abc', video, user_id='u1')
+        for action in ['action: trim start=1 end=5', 'action: speed factor=2', 'action: rotate angle=90']:
+            manager.append(session.session_id, action)
+        # 三个操作共用一个编辑器
+        assert FakeEditor.created == 1
+        assert len(session.editor.applied) == 3
+
+        # 失败的操作不会进入操作链
+        try:
+            manager.append(session.session_id, 'action: bad')
+            assert False, '应当抛出 EditSessionError'
+        except EditSessionError:
+            pass
+        assert len(session.actions) == 3 and session.editor is None
+
+        manager.undo(session.session_id)
+        editor = manager.editor_for(session)
+        assert editor.applied == ['action: trim start=1 end=5', 'action: speed factor=2']
+
+        # 新的管理器（模拟服务重启）从磁盘恢复操作链
+        reopened = EditSessionManager(FakeEditor, {}, os.path.join(root, 'sessions'))
+        restored = reopened.get(session.session_id)
+        assert restored.actions == session.actions and restored.user_id == 'u1'
+
+        reopened.delete(session.session_id)
+        try:
+            reopened.get(session.session_id)
+            assert False, '会话应已删除'
+        except EditSessionError:
+            pass
+        print("✓ 剪辑会话测试通过")
+
+
+def test_stale_scan():
+    with tempfile.TemporaryDirectory() as root:
+        video = os.path.join(root, 'src.mp4')
+        open(video, 'wb').close()
+        manager = EditSessionManager(FakeEditor, {}, os.path.join(root, 'sessions'), max_age=60)
+        fresh = manager.create('fresh', video)
+        stale = manager.create('stale', video)
+        stale.updated_at = time.time() - 120
+        manager._save(stale)
+
+        # 扫描只读磁盘元数据：过期会话不计入引用，也不会被载入缓存或刷新 last_used
+        reopened = EditSessionManager(FakeEditor, {}, os.path.join(root, 'sessions'), max_age=60)
+        assert reopened.referenced_digests() == ['fresh']
+        assert reopened._sessions == {}
+
+        manager.expire_stale()
+        assert manager.referenced_digests() == ['fresh']
+        assert stale.session_id not in manager._sessions
+        assert not os.path.exists(manager._meta_path(stale.session_id))
+        assert manager.get(fresh.session_id) is fresh
+        print("✓ 会话过期扫描测试通过")
+
+
+if __name__ == "__main__":
+    test_edit_session()
+    test_stale_scan()
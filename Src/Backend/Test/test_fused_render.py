@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+测试操作链融合：可融合判断、滤镜翻译与尺寸/时长跟踪、参数校验与 MoviePy 一致
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_probe
+from fused_render import FilterGraphCompiler, compile_actions, map_action_paths, parse_action
+
+# 与 nlp_parser.OPERATIONS 中对应条目相同的参数定义
+OPERATIONS = {
+    'trim': {'params': {'start': {'type': float, 'default': 0.0, 'required': True},
+                        'end': {'type': float, 'default': None, 'required': False}}},
+    'speed': {'params': {'factor': {'type': float, 'default': 1.0, 'required': True}}},
+    'adjust_volume': {'params': {'factor': {'type': float, 'default': 1.0, 'required': True}}},
+    'rotate': {'params': {'angle': {'type': float, 'default': 90.0, 'required': True}}},
+    'crop': {'params': {'x1': {'type': float, 'default': 0.0, 'required': True},
+                        'y1': {'type': float, 'default': 0.0, 'required': True},
+                        'x2': {'type': float, 'default': None, 'required': True},
+                        'y2': {'type': float, 'default': None, 'required': True}}},
+    'adjust_brightness': {'params': {'factor': {'type': float, 'default': 1.0, 'required': True}}},
+    'adjust_contrast': {'params': {'factor': {'type': float, 'default': 1.0, 'required': True}}},
+    'add_transition': {'params': {}},
+    'concatenate_multiple': {'params': {'video_files': {'type': list, 'default': [], 'required': True},
+                                        'transition': {'type': str, 'default': 'none', 'required': False},
+                                        'transition_duration': {'type': float, 'default': 1.0, 'required': False}}},
+    'add_background_music': {'params': {'audio_file': {'type': str, 'default': '', 'required': True},
+                                        'mix': {'type': bool, 'default': False, 'required': False}}},
+}
+
+META = {
+    'duration': 20.0,
+    'video': {'duration': 20.0, 'display_width': 1920, 'display_height': 1080, 'fps': 30.0},
+    'audio': {'sample_rate': 48000},
+}
+
+
+def test_parse_action():
+    assert parse_action('action: trim start=2 end=8 editor=moviepy', OPERATIONS) == ('trim', {'start': 2.0, 'end': 8.0})
+    assert parse_action('action: add_transition type=fade', OPERATIONS) is None
+    try:
+        parse_action('action: speed', OPERATIONS)
+        assert False, "缺少参数应报错"
+    except ValueError as e:
+        assert '缺少必需参数' in str(e)
+    print("✓ 操作解析测试通过")
+
+
+def test_map_action_paths():
+    stored = {'a' * 64: '/store/a.mp4', 'b' * 64: '/store/b.mp3'}
+    resolve = stored.get
+    assert map_action_paths(f"action: concatenate_multiple video_files=[{'a' * 64},{'a' * 64}] transition=none",
+                            OPERATIONS, resolve) == \
+        'action: concatenate_multiple video_files=[/store/a.mp4,/store/a.mp4] transition=none'
+    assert map_action_paths(f"action: add_background_music audio_file={'b' * 64} mix=true editor=moviepy",
+                            OPERATIONS, resolve) == \
+        'action: add_background_music audio_file=/store/b.mp3 mix=true editor=moviepy'
+    # 不引用文件的操作原样返回
+    assert map_action_paths('action: trim start=1 end=2', OPERATIONS, resolve) == 'action: trim start=1 end=2'
+    for action, message in (('action: add_background_music audio_file=/etc/passwd', '只能引用已上传的文件'),
+                            (f"action: concatenate_multiple video_files=[{'a' * 64},../x.mp4]", '只能引用已上传的文件'),
+                            ('action: concatenate_multiple video_files=[]', '只能引用已上传的文件'),
+                            ('action: delete_everything', '不支持的操作')):
+        try:
+            map_action_paths(action, OPERATIONS, resolve)
+            assert False, f"应拒绝: {action}"
+        except ValueError as e:
+            assert message in str(e)
+    print("✓ 操作文件参数映射测试通过")
+
+
+def test_compiler():
+    compiler = FilterGraphCompiler(META)
+    for action in ('action: speed factor=2', 'action: trim start=1 end=20',
+                   'action: rotate angle=90', 'action: crop x1=0 y1=100 x2=1080 y2=1100.5',
+                   'action: adjust_brightness factor=1.5', 'action: adjust_volume factor=0.5'):
+        assert compiler.apply(*parse_action(action, OPERATIONS))
+    # 变速后时长减半，trim 的结束时间超出时截断到新时长
+    assert compiler.duration == 9.0
+    assert compiler.video_filters == [
+        'setpts=PTS-STARTPTS', 'setpts=PTS/2', 'trim=start=1:end=10,setpts=PTS-STARTPTS',
+        'transpose=2', 'crop=1080:1000:0:100',
+        "lutrgb=r='min(val*1.5,maxval)':g='min(val*1.5,maxval)':b='min(val*1.5,maxval)'",
+    ]
+    assert compiler.audio_filters == [
+        'asetpts=PTS-STARTPTS', 'asetrate=96000,aresample=48000',
+        'atrim=start=1:end=10,asetpts=PTS-STARTPTS', 'volume=0.5',
+    ]
+    assert (compiler.width, compiler.height) == (1080, 1000)
+    command = compiler.build_command('in.mp4', 'out.mp4')
+    assert command[command.index('-r') + 1] == '30' and command[-1] == 'out.mp4'
+    assert '[0:a]' in command[command.index('-filter_complex') + 1]
+
+    # 旋转后的尺寸参与裁剪校验
+    try:
+        compiler.apply(*parse_action('action: crop x1=0 y1=0 x2=1500 y2=500', OPERATIONS))
+        assert False, "裁剪超出尺寸应报错"
+    except ValueError as e:
+        assert '超出视频尺寸' in str(e)
+    assert not FilterGraphCompiler(META).apply('rotate', {'angle': 45.0})
+    print("✓ 滤镜图编译测试通过")
+
+
+def test_compile_actions():
+    with tempfile.TemporaryDirectory() as root:
+        video_path = os.path.join(root, 'a.mp4')
+        with open(video_path, 'wb') as f:
+            f.write(b'0')
+        previous = media_probe._default_store
+        media_probe._default_store = media_probe.MediaMetadataStore(
+            root, probe_func=lambda path: dict(META, version=media_probe.PROBE_VERSION))
+        try:
+            assert compile_actions(video_path, ['action: trim start=2', 'action: adjust_contrast factor=0.5'], OPERATIONS)
+            assert compile_actions(video_path, ['action: trim start=2', 'action: add_transition'], OPERATIONS) is None
+            assert compile_actions(video_path, [], OPERATIONS) is None
+            try:
+                compile_actions(video_path, ['action: trim start=30'], OPERATIONS)
+                assert False, "起始时间超出时长应报错"
+            except ValueError as e:
+                assert '起始时间超出视频时长' in str(e)
+        finally:
+            media_probe._default_store = previous
+    print("✓ 可融合判断测试通过")
+
+
+if __name__ == "__main__":
+    test_parse_action()
+    test_map_action_paths()
+    test_compiler()
+    test_compile_actions()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+测试 HLS 打包：ffmpeg 命令、按内容摘要命名的输出目录与复用、失败清理、分段路径解析
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hls_packager
+from hls_packager import HLSPackager, PLAYLIST_NAME
+
+DIGEST = 'ab' * 32
+
+
+def _fake_ffmpeg(commands, fail=False):
+    """代替真实 ffmpeg：记录命令，并在临时目录写出播放列表与分段"""
+    def run(command, **kwargs):
+        commands.append(command)
+        if fail:
+            raise subprocess.CalledProcessError(1, command, stderr='编码失败')
+        out_dir = os.path.dirname(command[-1])
+        for name in (PLAYLIST_NAME, 'init.mp4', 'seg_00000.m4s'):
+            open(os.path.join(out_dir, name), 'w').close()
+    return run
+
+
+def _value(command, flag):
+    return command[command.index(flag) + 1]
+
+
+def test_package():
+    original = hls_packager.subprocess.run
+    commands = []
+    with tempfile.TemporaryDirectory() as root:
+        video_path = os.path.join(root, 'out.mp4')
+        open(video_path, 'w').close()
+        packager = HLSPackager(os.path.join(root, 'hls'), segment_seconds=6.0, url_prefix='/hls')
+        try:
+            hls_packager.subprocess.run = _fake_ffmpeg(commands)
+            result = packager.package(video_path, DIGEST)
+            # 相同内容再次打包时直接复用，不再调用 ffmpeg
+            assert packager.package(video_path, DIGEST) == result
+        finally:
+            hls_packager.subprocess.run = original
+
+        key = DIGEST[:32]
+        assert result == {
+            'key': key,
+            'playlist_path': os.path.join(root, 'hls', key, PLAYLIST_NAME),
+            'playlist_url': f"/hls/{key}/{PLAYLIST_NAME}",
+        }
+        assert len(commands) == 1
+        command = commands[0]
+        # 流拷贝切分为 fMP4 分段，先写入临时目录
+        assert _value(command, '-c') == 'copy' and _value(command, '-hls_time') == '6.0'
+        assert _value(command, '-hls_segment_type') == 'fmp4' and _value(command, '-hls_playlist_type') == 'vod'
+        assert _value(command, '-hls_segment_filename').endswith(os.path.join(f"{key}.tmp", 'seg_%05d.m4s'))
+        assert command[-1] == os.path.join(root, 'hls', f"{key}.tmp", PLAYLIST_NAME)
+        assert sorted(os.listdir(os.path.join(root, 'hls'))) == [key]
+
+        # 分段路径解析只接受摘要目录下的 HLS 文件
+        assert packager.resolve(key, 'seg_00000.m4s') == os.path.join(root, 'hls', key, 'seg_00000.m4s')
+        assert packager.resolve(key, 'init.mp4') is not None
+        assert packager.resolve(key, '../out.mp4') is None
+        assert packager.resolve(key, 'seg_00001.m4s') is None
+        assert packager.resolve('../hls', PLAYLIST_NAME) is None
+    print("✓ HLS 打包测试通过")
+
+
+def test_package_failure():
+    original = hls_packager.subprocess.run
+    with tempfile.TemporaryDirectory() as root:
+        video_path = os.path.join(root, 'out.mp4')
+        open(video_path, 'w').close()
+        packager = HLSPackager(os.path.join(root, 'hls'))
+        try:
+            hls_packager.subprocess.run = _fake_ffmpeg([], fail=True)
+            packager.package(video_path, DIGEST)
+            assert False, "ffmpeg 失败应抛出异常"
+        except subprocess.CalledProcessError:
+            pass
+        finally:
+            hls_packager.subprocess.run = original
+        # 临时目录已清理，不留下半成品
+        assert os.listdir(os.path.join(root, 'hls')) == []
+        try:
+            packager.package(os.path.join(root, 'missing.mp4'), DIGEST)
+            assert False, "缺失的输入应报错"
+        except FileNotFoundError:
+            pass
+    print("✓ HLS 打包失败清理测试通过")
+
+
+if __name__ == "__main__":
+    test_package()
+    test_package_failure()
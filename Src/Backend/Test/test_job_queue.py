@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+测试渲染任务队列：任务状态流转、进度上报与并发上限
+"""
+
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobManager, JOB_SUCCEEDED, JOB_FAILED
+
+
+def test_job_lifecycle():
+    """任务成功与失败两种结局"""
+    manager = JobManager(max_workers=2)
+    try:
+        def ok(job, value):
+            job.update(progress=0.5, stage='半程')
+            return {'output_path': f'/uploads/{value}'}
+
+        def boom(job):
+            raise ValueError('参数错误')
+
+        good = manager.wait(manager.submit('demo', ok, 'a.mp4'))
+        bad = manager.wait(manager.submit('demo', boom))
+
+        assert good.status == JOB_SUCCEEDED
+        assert good.to_dict()['output_path'] == '/uploads/a.mp4'
+        assert good.progress == 1.0
+        assert bad.status == JOB_FAILED
+        assert '参数错误' in bad.to_dict()['error']
+        print("✓ 任务状态流转正确")
+    finally:
+        manager.shutdown()
+
+
+def test_concurrency_bound():
+    """同时运行的任务数不超过 max_workers"""
+    manager = JobManager(max_workers=2)
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+    try:
+        def slow(job):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+
+        jobs = [manager.submit('demo', slow) for _ in range(6)]
+        for job in jobs:
+            manager.wait(job)
+        assert state['peak'] <= 2
+        assert manager.in_flight() == 0 and manager.queue_depth() == 0
+        print(f"✓ 并发峰值: {state['peak']}")
+    finally:
+        manager.shutdown()
+
+
+def test_register_then_start():
+    """登记后未启动的任务可查询、可等待，但不占用工作线程"""
+    manager = JobManager(max_workers=1)
+    try:
+        pending = manager.register('demo', {'video': 'a.mp4'})
+        other = manager.wait(manager.submit('demo', lambda job: {'value': 1}), timeout=2)
+        assert other.status == JOB_SUCCEEDED and manager.queue_depth() == 1
+        assert manager.get(pending.job_id) is pending and not pending.future.done()
+
+        manager.start(pending, lambda job, value: {'value': value}, 2)
+        assert manager.wait(pending, timeout=2).to_dict()['value'] == 2
+        print("✓ 登记后启动测试通过")
+    finally:
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_concurrency_bound()
+    test_register_then_start()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试媒体元数据探测：ffprobe 输出解析、旋转后的显示尺寸、旁路文件缓存
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_probe import MediaMetadataStore, parse_probe_output, basic_info
+
+SAMPLE_PROBE = {
+    'streams': [
+        {
+            'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High', 'level': 40,
+            'width': 1920, 'height': 1080, 'pix_fmt': 'yuv420p',
+            'avg_frame_rate': '30000/1001', 'r_frame_rate': '30000/1001',
+            'duration': '10.010000', 'nb_frames': '300', 'bit_rate': '5000000',
+            'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}],
+        },
+        {
+            'index': 1, 'codec_type': 'audio', 'codec_name': 'aac',
+            'sample_rate': '48000', 'channels': 2, 'channel_layout': 'stereo',
+            'duration': '10.000000', 'bit_rate': '128000',
+        },
+    ],
+    'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'duration': '10.010000',
+               'size': '6400000', 'bit_rate': '5115000'},
+}
+
+
+def test_parse_probe_output():
+    meta = parse_probe_output(SAMPLE_PROBE, [0.0, 2.002, 4.004])
+    video = meta['video']
+    assert abs(video['fps'] - 29.97) < 0.01
+    assert video['frame_count'] == 300
+    assert video['rotation'] == 270
+    assert video['profile'] == 'High' and video['level'] == 40
+    # 竖屏拍摄：编码尺寸 1920x1080，显示尺寸 1080x1920
+    assert (video['display_width'], video['display_height']) == (1080, 1920)
+    assert meta['audio']['channels'] == 2 and meta['audio']['channel_layout'] == 'stereo'
+    assert meta['keyframes'] == [0.0, 2.002, 4.004]
+    assert abs(meta['duration'] - 10.01) < 1e-6
+
+    info = basic_info(meta)
+    assert info['width'] == 1080 and info['height'] == 1920
+    assert info['codec'] == 'h264'
+    assert basic_info(parse_probe_output({'streams': [SAMPLE_PROBE['streams'][1]]})) is None
+    print("✓ ffprobe 输出解析测试通过")
+
+
+def test_sidecar_cache():
+    with tempfile.TemporaryDirectory() as root:
+        calls = []
+
+        def fake_probe(path):
+            calls.append(path)
+            return parse_probe_output(SAMPLE_PROBE)
+
+        digest = 'ab' * 32
+        video_path = os.path.join(root, f"{digest}.mp4")
+        other_path = os.path.join(root, 'clip.mp4')
+        for path in (video_path, other_path):
+            with open(path, 'wb') as f:
+                f.write(b'video')
+
+        store = MediaMetadataStore(os.path.join(root, '.meta'), probe_func=fake_probe)
+        assert store.lookup(digest) is None
+        store.probe(video_path)
+        store.probe(video_path)
+        assert len(calls) == 1
+        # 内容寻址文件以摘要命名旁路文件
+        assert os.path.exists(store.sidecar_path(digest))
+
+        # 新实例（模拟另一个进程）直接读取旁路文件，不再探测
+        other = MediaMetadataStore(os.path.join(root, '.meta'), probe_func=fake_probe)
+        assert other.probe(video_path)['video']['codec'] == 'h264'
+        assert len(calls) == 1
+
+        # 普通文件按路径 + 大小 + 修改时间缓存，内容变化后重新探测
+        store.probe(other_path)
+        store.probe(other_path)
+        assert len(calls) == 2
+        with open(other_path, 'wb') as f:
+            f.write(b'changed video')
+        store.probe(other_path)
+        assert len(calls) == 3
+    print("✓ 元数据旁路文件缓存测试通过")
+
+
+if __name__ == "__main__":
+    test_parse_probe_output()
+    test_sidecar_cache()
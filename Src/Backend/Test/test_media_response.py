@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试流式媒体响应：单区间、多区间、后缀区间、416、If-Range 与 304
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request
+from media_response import send_media_file, parse_range_header
+
+
+def _make_app(path):
+    app = Flask(__name__)
+
+    @app.route('/video')
+    def video():
+        return send_media_file(path, request.environ, request.headers)
+
+    return app.test_client()
+
+
+def test_parse_range_header():
+    assert parse_range_header('bytes=0-', 100) == [(0, 99)]
+    assert parse_range_header('bytes=-10', 100) == [(90, 99)]
+    assert parse_range_header('bytes=10-20, 50-', 100) == [(10, 20), (50, 99)]
+    assert parse_range_header('bytes=200-300', 100) == []
+    assert parse_range_header('items=0-1', 100) is None
+    assert parse_range_header('bytes=5-1', 100) is None
+
+
+def test_send_media_file():
+    data = os.urandom(1000000)
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+        f.write(data)
+        path = f.name
+    try:
+        client = _make_app(path)
+
+        full = client.get('/video')
+        assert full.status_code == 200 and full.data == data
+        etag = full.headers['ETag']
+
+        part = client.get('/video', headers={'Range': 'bytes=100-199'})
+        assert part.status_code == 206
+        assert part.data == data[100:200]
+        assert part.headers['Content-Range'] == f'bytes 100-199/{len(data)}'
+
+        open_ended = client.get('/video', headers={'Range': 'bytes=999000-'})
+        assert open_ended.data == data[999000:]
+
+        multi = client.get('/video', headers={'Range': 'bytes=0-9,20-29'})
+        assert multi.status_code == 206
+        assert multi.headers['Content-Type'].startswith('multipart/byteranges')
+        assert data[0:10] in multi.data and data[20:30] in multi.data
+        assert int(multi.headers['Content-Length']) == len(multi.data)
+
+        assert client.get('/video', headers={'Range': 'bytes=2000000-'}).status_code == 416
+        assert client.get('/video', headers={'If-None-Match': etag}).status_code == 304
+
+        # If-Range 与当前 ETag 不一致：忽略 Range，返回完整文件
+        stale = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        assert stale.status_code == 200 and len(stale.data) == len(data)
+        fresh = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        assert fresh.status_code == 206 and fresh.data == data[:10]
+        print("✓ 流式媒体响应测试通过")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    test_parse_range_header()
+    test_send_media_file()
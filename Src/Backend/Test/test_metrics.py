@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+测试运行指标：计数器、直方图分桶累积、回调仪表与 Prometheus 文本输出
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry
+
+
+def test_metrics_exposition():
+    registry = Registry()
+    requests = registry.counter('demo_requests_total', '请求数', ('status',))
+    latency = registry.histogram('demo_latency_seconds', '耗时', ('stage',), buckets=(0.1, 1))
+    depth = registry.gauge('demo_queue_depth', '队列深度', callback=lambda: 3)
+
+    requests.inc(status='ok')
+    requests.inc(2, status='ok')
+    latency.observe(0.05, stage='parse')
+    latency.observe(0.5, stage='parse')
+    latency.observe(5, stage='parse')
+    with latency.time(stage='encode'):
+        pass
+
+    text = registry.render()
+    assert '# TYPE demo_requests_total counter' in text
+    assert 'demo_requests_total{status="ok"} 3' in text
+    assert 'demo_latency_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'demo_latency_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'demo_latency_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'demo_latency_seconds_count{stage="parse"} 3' in text
+    assert 'demo_latency_seconds_sum{stage="parse"} 5.55' in text
+    assert latency.count(stage='encode') == 1
+    assert 'demo_queue_depth 3' in text
+
+    # 标签不匹配时报错
+    try:
+        requests.inc(kind='x')
+        assert False, '应当抛出 ValueError'
+    except ValueError:
+        pass
+    print("✓ 运行指标测试通过")
+
+
+if __name__ == "__main__":
+    test_metrics_exposition()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+测试并行分段渲染：分段边界（帧对齐、关键帧吸附）、拼接命令、分段失败时回退
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process_pool
+from parallel_render import ParallelRenderer, plan_segments, keyframes_for, build_mux_command
+
+
+def fake_segment(video_path, actions, start, end, output_path, threads, profile):
+    """代替真实编码：起点非 0 的分段失败"""
+    if start > 0:
+        raise ValueError('编码失败')
+    with open(output_path, 'w') as f:
+        f.write(f"{start}-{end}")
+    return output_path
+
+
+def fake_audio(video_path, actions, output_path, profile):
+    return None
+
+
+def test_plan_segments():
+    # 120 秒、4 个进程：等分为 4 段，边界对齐到帧
+    segments = plan_segments(120.0, 30.0, 4)
+    assert segments == [(0.0, 30.0), (30.0, 60.0), (60.0, 90.0), (90.0, 120.0)]
+    # 边界吸附到附近的关键帧
+    segments = plan_segments(120.0, 30.0, 4, keyframes=[0.0, 28.0, 61.0, 95.5])
+    assert [s for s, _ in segments] == [0.0, 28.0, 61.0, 95.5]
+    # 帧率 25 时非整帧的等分点取整到帧
+    segments = plan_segments(100.0, 25.0, 3)
+    assert all(abs(round(s * 25) - s * 25) < 1e-9 for s, _ in segments)
+    assert segments[-1][1] == 100.0
+    # 分段数受每段最短时长限制；太短不拆分
+    assert len(plan_segments(35.0, 30.0, 32)) == 3
+    assert plan_segments(15.0, 30.0, 8) is None
+    assert plan_segments(120.0, 30.0, 1) is None
+    print("✓ 分段方案测试通过")
+
+
+def test_keyframes_for():
+    keyframes = [0.0, 2.0, 4.0]
+    assert keyframes_for(['action: adjust_volume factor=0.5', 'action: crop x1=0 y1=0 x2=10 y2=10'],
+                         keyframes) == keyframes
+    # 改变时间轴的操作后关键帧位置失效
+    assert keyframes_for(['action: trim start=1.0', 'action: rotate angle=90'], keyframes) is None
+    assert keyframes_for(['action: speed factor=2'], keyframes) is None
+    print("✓ 关键帧可用性测试通过")
+
+
+def test_mux_command():
+    command = build_mux_command('parts.txt', 'audio.m4a', 'out.mp4')
+    assert command[command.index('-c') + 1] == 'copy' and '1:a' in command and command[-1] == 'out.mp4'
+    assert '-map' not in build_mux_command('parts.txt', None, 'out.mp4')
+    print("✓ 拼接命令测试通过")
+
+
+def test_fallback_on_failure():
+    with tempfile.TemporaryDirectory() as root:
+        renderer = ParallelRenderer(max_workers=2)
+        output_path = os.path.join(root, 'out.mp4')
+        try:
+            ok = renderer.render('in.mp4', ['action: adjust_volume factor=0.5'], output_path, 120.0, 30.0,
+                                 segment_worker=fake_segment, audio_worker=fake_audio)
+        finally:
+            process_pool.shutdown()
+        assert not ok and not os.path.exists(output_path)
+        # 临时目录已清理
+        assert os.listdir(root) == []
+    print("✓ 分段失败回退测试通过")
+
+
+if __name__ == "__main__":
+    test_plan_segments()
+    test_keyframes_for()
+    test_mux_command()
+    test_fallback_on_failure()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+测试人格索引：按用户列出、按更新时间排序、跨实例可见、删除
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persona_index import PersonaIndex
+
+
+def _summary(user_id, name, last_updated):
+    return {
+        'user_id': user_id,
+        'persona_name': name,
+        'creation_date': '2025-01-01T00:00:00',
+        'last_updated': last_updated,
+        'style_summary': {'persona_name': name, 'total_edits': 3},
+    }
+
+
+def test_persona_index():
+    with tempfile.TemporaryDirectory() as root:
+        index = PersonaIndex(root)
+        assert index.list('alice') == []
+
+        index.update('alice', 'vlog', _summary('alice', 'vlog', '2025-01-02T00:00:00'))
+        index.update('alice', 'travel', _summary('alice', 'travel', '2025-01-03T00:00:00'))
+        index.update_many([_summary('alice_b', 'x', '2025-01-01T00:00:00')])
+
+        # 用户名前缀相同的其他用户不会混入
+        assert [p['persona_name'] for p in index.list('alice')] == ['travel', 'vlog']
+        assert [p['persona_name'] for p in index.list('alice_b')] == ['x']
+
+        # 另一个实例（模拟另一个进程）写入后，本实例可见
+        other = PersonaIndex(root)
+        other.update('alice', 'vlog', _summary('alice', 'vlog', '2025-01-04T00:00:00'))
+        assert index.list('alice')[0]['persona_name'] == 'vlog'
+
+        index.remove('alice', 'travel')
+        assert index.get('alice', 'travel') is None
+        assert len(PersonaIndex(root).list('alice')) == 1
+        print("✓ 人格索引测试通过")
+
+
+if __name__ == "__main__":
+    test_persona_index()
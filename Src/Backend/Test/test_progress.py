@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+测试任务进度上报：阶段进度换算、ffmpeg -progress 与 tqdm 输出解析、线程绑定、停滞检测与事件流
+"""
+
+import os
+import sys
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import progress
+from job_queue import JobManager, RenderJob, JOB_RUNNING
+
+SAMPLE_PROGRESS = [
+    "frame=120", "fps=48.5", "out_time_us=4000000", "out_time_ms=4000000", "progress=continue",
+    "frame=300", "fps=50.0", "out_time_us=10000000", "progress=end",
+]
+
+
+def test_reporter_span():
+    job = RenderJob('demo')
+    reporter = progress.ProgressReporter(job, min_interval=0)
+    with reporter.span(0.3, 0.9):
+        reporter.begin('编码视频', 200, 'frames')
+        reporter.update(100, rate=25.0)
+    assert abs(job.progress - 0.6) < 1e-9
+    assert job.stage == '编码视频' and job.unit == 'frames'
+    assert job.rate == 25.0 and job.eta == 4.0
+    assert job.units_done == 100 and job.units_total == 200
+    # 进入没有计量的新阶段时清除速率与剩余时间
+    job.update(progress=0.95, stage='切片打包')
+    assert job.rate is None and job.eta is None
+    print("✓ 阶段进度换算测试通过")
+
+
+def test_parse_outputs():
+    blocks = progress.parse_ffmpeg_progress(SAMPLE_PROGRESS)
+    assert blocks[0] == {'frame': 120, 'fps': 48.5, 'out_time': 4.0, 'end': False}
+    assert blocks[1]['end'] and blocks[1]['out_time'] == 10.0
+    assert progress.parse_tqdm(" 40%|####      | 8/20 [00:04<00:06,  1.9it/s]\r 45%|####5     | 9/20 [00:05") == (9, 20)
+    assert progress.parse_tqdm("loading model") is None
+    print("✓ ffmpeg / tqdm 进度输出解析测试通过")
+
+
+def test_bound_in_worker():
+    manager = JobManager(max_workers=1)
+    try:
+        seen = []
+
+        def work(job):
+            seen.append(progress.current().active)
+            reporter = progress.current()
+            reporter.begin('掩码传播', 4, 'frames')
+            for _ in range(4):
+                reporter.advance()
+            return {}
+
+        job = manager.wait(manager.submit('demo', work))
+        assert seen == [True]
+        assert job.units_done is None and job.progress == 1.0
+        # 工作线程之外没有绑定任务
+        assert not progress.current().active
+        progress.current().begin('空操作', 10)
+    finally:
+        manager.shutdown()
+    print("✓ 工作线程绑定测试通过")
+
+
+def test_stall_and_events():
+    job = RenderJob('demo')
+    job.stall_seconds = 0.05
+    job.status = JOB_RUNNING
+    job.update(stage='编码视频')
+    assert not job.stalled
+    time.sleep(0.1)
+    assert job.stalled and job.to_dict()['stalled']
+
+    events = []
+    reader = threading.Thread(target=lambda: events.extend(progress.job_event_stream(job, keepalive=0.05)))
+    reader.start()
+    time.sleep(0.1)
+    job.update(progress=0.5)
+    job.status = 'succeeded'
+    job.update(progress=1.0, stage='已完成')
+    reader.join(timeout=2)
+    assert not reader.is_alive()
+    assert events[0].startswith('event: progress\ndata: ')
+    assert events[-1].startswith('event: end\n') and '"progress": 1.0' in events[-1]
+    print("✓ 停滞检测与事件流测试通过")
+
+
+if __name__ == "__main__":
+    test_reporter_span()
+    test_parse_outputs()
+    test_bound_in_worker()
+    test_stall_and_events()
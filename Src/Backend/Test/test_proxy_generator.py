@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试代理文件：像素坐标参数按比例缩放、代理元数据的写入与读回、同一源文件只生成一次
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import proxy_generator
+from proxy_generator import ProxyGenerator, scale_action
+
+DIGEST = 'cd' * 32
+META = {'digest': DIGEST, 'source_width': 3840, 'source_height': 2160, 'width': 640, 'height': 360}
+
+
+def test_action_for_proxy():
+    with tempfile.TemporaryDirectory() as root:
+        generator = ProxyGenerator(root)
+    # crop 的像素坐标按宽高分别缩放
+    assert generator.action_for_proxy('action: crop x1=960 y1=540 x2=2880 y2=1620', META) == \
+        'action: crop x1=160.0 y1=90.0 x2=480.0 y2=270.0'
+    # 与像素无关的操作与参数保持不变
+    assert generator.action_for_proxy('action: trim start=1.5 end=3', META) == 'action: trim start=1.5 end=3'
+    assert generator.action_for_proxy('action: crop x1=abc y1=0', META) == 'action: crop x1=abc y1=0.0'
+    # 从代理回到原始分辨率
+    assert scale_action('action: crop x1=160 y1=90 x2=480 y2=270', 6.0, 6.0) == \
+        'action: crop x1=960.0 y1=540.0 x2=2880.0 y2=1620.0'
+    print("✓ 代理坐标缩放测试通过")
+
+
+def test_proxy_meta_round_trip():
+    original_run = proxy_generator.subprocess.run
+    original_probe = proxy_generator.media_probe.get_metadata
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        if command[0] == 'ffmpeg':
+            open(command[-1], 'w').close()
+            return subprocess.CompletedProcess(command, 0, '', '')
+        return subprocess.CompletedProcess(command, 0, '640x360\n', '')
+
+    with tempfile.TemporaryDirectory() as root:
+        source_path = os.path.join(root, 'source.mp4')
+        open(source_path, 'w').close()
+        generator = ProxyGenerator(os.path.join(root, 'proxies'), height=360, gop=12)
+        assert not generator.has_proxy(DIGEST) and generator.get_meta(DIGEST) is None
+        try:
+            proxy_generator.subprocess.run = fake_run
+            proxy_generator.media_probe.get_metadata = lambda path: {
+                'video': {'display_width': 3840, 'display_height': 2160}}
+            meta = generator.ensure_proxy(source_path, DIGEST)
+            # 已存在时直接返回，不再转码
+            assert generator.ensure_proxy(source_path, DIGEST) == meta
+        finally:
+            proxy_generator.subprocess.run = original_run
+            proxy_generator.media_probe.get_metadata = original_probe
+
+        assert meta == META
+        assert [c[0] for c in commands] == ['ffmpeg', 'ffprobe']
+        ffmpeg = commands[0]
+        assert ffmpeg[ffmpeg.index('-vf') + 1] == 'scale=-2:360' and ffmpeg[ffmpeg.index('-g') + 1] == '12'
+        assert generator.has_proxy(DIGEST) and os.path.exists(generator.proxy_path(DIGEST))
+        assert not os.path.exists(f"{generator.proxy_path(DIGEST)}.tmp.mp4")
+
+        # 重新创建（模拟服务重启）后从磁盘读回相同的元数据
+        reloaded = ProxyGenerator(os.path.join(root, 'proxies'))
+        assert reloaded.get_meta(DIGEST) == META
+    print("✓ 代理元数据测试通过")
+
+
+if __name__ == "__main__":
+    test_action_for_proxy()
+    test_proxy_meta_round_trip()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试渲染结果缓存：操作规范化、命中、按容量 LRU 淘汰、索引重启后仍可用、访问时间按批写回、键锁用完即释放
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_cache import RenderCache, normalize_action
+
+
+def _render(cache, key, size):
+    with open(cache.path_for(key), 'wb') as f:
+        f.write(os.urandom(size))
+    return cache.put(key, {'size': size})
+
+
+def test_normalize_action():
+    assert normalize_action('action: trim end=20.0 start=10') == 'action: trim end=20 start=10'
+    assert normalize_action('action: trim start=10  end=20') == normalize_action('action: trim end=20.0 start=10.0')
+    key_a = RenderCache.make_key('ABC', ['action: trim start=1 end=2'])
+    assert key_a == RenderCache.make_key('abc', ['action: trim end=2.0 start=1'])
+    assert key_a != RenderCache.make_key('abc', ['action: trim start=1 end=2'], profile='other')
+    assert key_a != RenderCache.make_key('abc', ['action: trim start=1 end=2'], editor_type='ffmpeg')
+
+
+def test_render_cache_lru():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RenderCache(root, max_bytes=2500)
+        assert cache.lookup('a') is None
+
+        _render(cache, 'a', 1000)
+        time.sleep(0.01)
+        _render(cache, 'b', 1000)
+        time.sleep(0.01)
+        # 访问 a，使 b 成为最久未访问的条目
+        assert cache.lookup('a')['hits'] == 1
+        time.sleep(0.01)
+        _render(cache, 'c', 1000)
+
+        assert cache.lookup('b') is None and not os.path.exists(cache.path_for('b'))
+        assert cache.lookup('a') is not None and cache.lookup('c') is not None
+        assert cache.total_bytes() == 2000
+
+        # 重启后索引仍可用
+        reopened = RenderCache(root, max_bytes=2500)
+        assert reopened.lookup('a') is not None
+
+        # 被钉住的条目即使最久未访问也不会被淘汰
+        time.sleep(0.01)
+        reopened.lookup('c')
+        reopened.pin('a')
+        _render(reopened, 'd', 1000)
+        assert reopened.lookup('a') is not None and reopened.lookup('c') is None
+        reopened.unpin('a')
+        print("✓ 渲染缓存测试通过")
+
+
+def test_batched_access_flush():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RenderCache(root, flush_every=3, flush_seconds=3600)
+        _render(cache, 'a', 10)
+        saved_at = os.path.getmtime(cache.index_path)
+        time.sleep(0.01)
+        os.utime(cache.index_path, (saved_at, saved_at))
+        # 前两次命中只更新内存，第三次才写回索引
+        cache.lookup('a')
+        cache.lookup('a')
+        assert os.path.getmtime(cache.index_path) == saved_at
+        assert RenderCache(root).lookup('a')['hits'] == 1
+        cache.lookup('a')
+        assert RenderCache(root).entries()[0]['hits'] == 3
+
+        cache.lookup('a')
+        cache.flush()
+        assert RenderCache(root).entries()[0]['hits'] == 4
+    print("✓ 访问时间批量写回测试通过")
+
+
+def test_key_locks_released():
+    with tempfile.TemporaryDirectory() as root:
+        cache = RenderCache(root)
+        entered = threading.Event()
+        order = []
+
+        def waiter():
+            entered.wait()
+            with cache.lock_for('k'):
+                order.append('waiter')
+
+        thread = threading.Thread(target=waiter)
+        with cache.lock_for('k'):
+            thread.start()
+            entered.set()
+            time.sleep(0.05)
+            order.append('owner')
+            assert 'k' in cache._key_locks
+        thread.join()
+        # 同一键串行执行，最后一个使用者退出后锁被移除
+        assert order == ['owner', 'waiter']
+        assert cache._key_locks == {}
+        try:
+            with cache.lock_for('k'):
+                raise RuntimeError('渲染失败')
+        except RuntimeError:
+            pass
+        assert cache._key_locks == {}
+    print("✓ 缓存键锁释放测试通过")
+
+
+if __name__ == "__main__":
+    test_normalize_action()
+    test_render_cache_lru()
+    test_batched_access_flush()
+    test_key_locks_released()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试渲染配置：编码参数生成、覆盖文件、缓存标识、基准测试的 preset 推荐
+"""
+
+import os
+import sys
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_profiles import RenderProfileRegistry, BUILTIN_PROFILES, default_profile, recommend, benchmark_command
+from fused_render import FilterGraphCompiler
+
+META = {
+    'duration': 10.0,
+    'video': {'codec': 'h264', 'pix_fmt': 'yuv420p', 'fps': 30.0, 'duration': 10.0, 'rotation': 0,
+              'display_width': 1920, 'display_height': 1080},
+    'audio': {'sample_rate': 48000},
+}
+
+
+def _value(args, flag):
+    return args[args.index(flag) + 1]
+
+
+def test_encoder_args():
+    share = default_profile()
+    args = share.ffmpeg_args(30.0)
+    assert _value(args, '-preset') == 'medium' and _value(args, '-crf') == '23'
+    assert _value(args, '-pix_fmt') == 'yuv420p' and '+faststart' in args
+    assert '-g' not in args and '-maxrate' not in args and share.allows_stream_copy
+
+    mobile = BUILTIN_PROFILES['mobile_720p']
+    args = mobile.ffmpeg_args(30.0)
+    assert _value(args, '-g') == '60' and _value(args, '-maxrate') == '2500k' and _value(args, '-level') == '3.1'
+    assert not mobile.allows_stream_copy
+
+    kwargs = BUILTIN_PROFILES['draft'].moviepy_kwargs(25.0)
+    assert kwargs['preset'] == 'ultrafast' and kwargs['audio_bitrate'] == '96k'
+    assert _value(kwargs['ffmpeg_params'], '-vf') == "scale='if(gt(iw,ih),-2,min(iw,540))':'if(gt(iw,ih),min(ih,540),-2)'"
+    print("✓ 编码参数测试通过")
+
+
+def test_fused_command_uses_profile():
+    compiler = FilterGraphCompiler(META)
+    compiler.apply('adjust_volume', {'factor': 0.5})
+    command = compiler.build_command('in.mp4', 'out.mp4', BUILTIN_PROFILES['draft'])
+    assert _value(command, '-preset') == 'ultrafast'
+    assert "scale='if(gt(iw,ih),-2,min(iw,540))'" in _value(command, '-filter_complex')
+    # 默认配置与原先的编码参数一致
+    command = compiler.build_command('in.mp4', 'out.mp4')
+    assert _value(command, '-preset') == 'medium' and _value(command, '-ar') == '44100'
+    print("✓ 融合渲染使用渲染配置测试通过")
+
+
+def _scaled_size(scale_filter, width, height):
+    """按 ffmpeg scale 滤镜的规则求值宽高表达式（-2 表示按比例取偶数）。"""
+    w_expr, h_expr = [e.strip("'") for e in scale_filter[len('scale='):].split("':'")]
+    names = {'iw': width, 'ih': height, 'min': min, 'gt': lambda a, b: a > b,
+             'if_': lambda cond, a, b: a if cond else b}
+    w = eval(w_expr.replace('if(', 'if_('), {}, names)
+    h = eval(h_expr.replace('if(', 'if_('), {}, names)
+    if w == -2:
+        w = int(round(width * h / height / 2)) * 2
+    if h == -2:
+        h = int(round(height * w / width / 2)) * 2
+    return w, h
+
+
+def test_portrait_scale():
+    mobile = BUILTIN_PROFILES['mobile_720p']
+    scale = mobile.scale_filter()
+    # 短边限制：横屏 1080p → 1280x720，竖屏 1080x1920 → 720x1280（而不是 405x720）
+    assert _scaled_size(scale, 1920, 1080) == (1280, 720)
+    assert _scaled_size(scale, 1080, 1920) == (720, 1280)
+    assert _scaled_size(BUILTIN_PROFILES['draft'].scale_filter(), 1080, 1920) == (540, 960)
+    # 小于上限时不放大
+    assert _scaled_size(scale, 480, 854) == (480, 854)
+
+    # 带旋转信息的竖屏手机视频：ffmpeg 先按旋转信息转正，滤镜看到的是显示尺寸
+    portrait = dict(META, video=dict(META['video'], rotation=90, display_width=1080, display_height=1920))
+    compiler = FilterGraphCompiler(portrait)
+    compiler.apply('adjust_volume', {'factor': 0.5})
+    command = compiler.build_command('in.mp4', 'out.mp4', mobile)
+    assert scale in _value(command, '-filter_complex')
+    print("✓ 竖屏缩放测试通过")
+
+
+def test_registry_overrides():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'profiles.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'share': {'preset': 'fast'}, 'kiosk': {'crf': 20, 'max_height': 720}}, f)
+        registry = RenderProfileRegistry(path)
+        assert registry.get().name == 'share' and registry.get('share').preset == 'fast'
+        assert registry.get('kiosk').max_height == 720
+        # 编码参数变化后缓存标识随之变化
+        assert registry.get('share').cache_tag() != BUILTIN_PROFILES['share'].cache_tag()
+        assert RenderProfileRegistry().get('share').cache_tag() == BUILTIN_PROFILES['share'].cache_tag()
+        try:
+            registry.get('cinema')
+            assert False, "未知配置应报错"
+        except ValueError as e:
+            assert '未知的渲染配置' in str(e)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'share': {'bitrate': 5000}}, f)
+        try:
+            RenderProfileRegistry(path)
+            assert False, "未知字段应报错"
+        except ValueError as e:
+            assert 'bitrate' in str(e)
+    print("✓ 覆盖文件测试通过")
+
+
+def test_recommend():
+    measurements = [
+        {'preset': 'ultrafast', 'speed': 20.0, 'kbps': 9000},
+        {'preset': 'veryfast', 'speed': 9.0, 'kbps': 5000},
+        {'preset': 'medium', 'speed': 3.0, 'kbps': 4000},
+        {'preset': 'slow', 'speed': 1.5, 'kbps': 3800},
+    ]
+    # 满足目标速度的最慢 preset
+    assert recommend(BUILTIN_PROFILES['draft'], measurements) == 'veryfast'
+    assert recommend(BUILTIN_PROFILES['share'], measurements) == 'slow'
+    assert recommend(BUILTIN_PROFILES['mobile_720p'], measurements) == 'medium'
+    # 都达不到时选最快的；没有速度要求时不调整
+    assert recommend(BUILTIN_PROFILES['draft'], measurements[2:]) == 'medium'
+    assert recommend(BUILTIN_PROFILES['archive'], measurements) is None
+
+    command = benchmark_command('in.mp4', BUILTIN_PROFILES['draft'], 'veryfast', 20.0, 30.0, 'out.mp4')
+    assert _value(command, '-preset') == 'veryfast' and _value(command, '-t') == '20.000' and command[-1] == 'out.mp4'
+    print("✓ preset 推荐测试通过")
+
+
+if __name__ == "__main__":
+    test_encoder_args()
+    test_fused_command_uses_profile()
+    test_portrait_scale()
+    test_registry_overrides()
+    test_recommend()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试智能剪切：GOP 切分方案、各段命令、trim 链换算为源视频区间
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smart_cut import plan_smart_cut, build_commands, smart_trim, PART_COPY, PART_ENCODE
+from fused_render import FilterGraphCompiler
+from render_profiles import BUILTIN_PROFILES
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+META = {
+    'duration': 12.0,
+    'keyframes': KEYFRAMES,
+    'video': {'codec': 'h264', 'profile': 'High', 'level': 41, 'pix_fmt': 'yuv420p', 'fps': 30.0,
+              'duration': 12.0, 'rotation': 0, 'display_width': 1280, 'display_height': 720},
+    'audio': {'sample_rate': 48000},
+}
+
+
+def test_plan():
+    # 剪掉开头 2.5 秒：开头不完整 GOP 重新编码，其余直接复制到结尾
+    assert plan_smart_cut(KEYFRAMES, 2.5, 12.0, 12.0) == [(PART_ENCODE, 2.5, 4.0), (PART_COPY, 4.0, 12.0)]
+    # 两端都不在关键帧上
+    assert plan_smart_cut(KEYFRAMES, 1.0, 9.0, 12.0) == [
+        (PART_ENCODE, 1.0, 2.0), (PART_COPY, 2.0, 8.0), (PART_ENCODE, 8.0, 9.0)]
+    # 正好从关键帧开始
+    assert plan_smart_cut(KEYFRAMES, 2.0, 12.0, 12.0) == [(PART_COPY, 2.0, 12.0)]
+    # 区间内没有足够长的完整 GOP
+    assert plan_smart_cut(KEYFRAMES, 4.5, 7.5, 12.0) is None
+    assert plan_smart_cut([], 1.0, 5.0, 12.0) is None
+    print("✓ GOP 切分方案测试通过")
+
+
+def test_commands():
+    with tempfile.TemporaryDirectory() as work_dir:
+        parts = plan_smart_cut(KEYFRAMES, 1.0, 9.0, 12.0)
+        commands = build_commands('in.mp4', parts, META, work_dir, 'out.mp4')
+        # 三段视频 + 音轨 + 拼接
+        assert len(commands) == 5
+        assert 'libx264' in commands[0] and commands[0][commands[0].index('-t') + 1] == '1.000000'
+        assert commands[1][commands[1].index('-c:v') + 1] == 'copy'
+        assert commands[3][commands[3].index('-ss') + 1] == '1.000000' and '0:a:0' in commands[3]
+        assert commands[-1][-1] == 'out.mp4' and 'concat' in commands[-1]
+        with open(os.path.join(work_dir, 'parts.txt'), encoding='utf-8') as f:
+            assert f.read().splitlines() == ["file 'part_00.ts'", "file 'part_01.ts'", "file 'part_02.ts'"]
+
+        # 切点片段沿用源码流的 profile / level，preset 与 CRF 取自渲染配置
+        edge = commands[0]
+        assert edge[edge.index('-profile:v') + 1] == 'high' and edge[edge.index('-level') + 1] == '4.1'
+        assert edge[edge.index('-preset') + 1] == 'medium' and edge[edge.index('-crf') + 1] == '23'
+        archive = BUILTIN_PROFILES['archive']
+        meta = dict(META, video=dict(META['video'], profile='Constrained Baseline', level=30))
+        edge = build_commands('in.mp4', parts, meta, work_dir, 'out.mp4', archive)[0]
+        assert edge[edge.index('-profile:v') + 1] == 'baseline' and edge[edge.index('-level') + 1] == '3.0'
+        assert edge[edge.index('-preset') + 1] == archive.preset and edge[edge.index('-crf') + 1] == str(archive.crf)
+        # 未知的 profile / level 不指定，由 x264 决定
+        meta = dict(META, video=dict(META['video'], profile=None, level=None))
+        edge = build_commands('in.mp4', parts, meta, work_dir, 'out.mp4')[0]
+        assert '-profile:v' not in edge and '-level' not in edge
+    # 非 H.264 源不适用
+    assert not smart_trim('in.mp4', dict(META, video=dict(META['video'], codec='vp9')), 1.0, 9.0, 'out.mp4')
+    print("✓ 剪切命令测试通过")
+
+
+def test_trim_chain_range():
+    compiler = FilterGraphCompiler(META)
+    compiler.apply('trim', {'start': 2.0, 'end': None})
+    compiler.apply('trim', {'start': 1.0, 'end': 5.0})
+    assert compiler.trim_only and (compiler.source_start, compiler.source_end) == (3.0, 7.0)
+    compiler.apply('adjust_volume', {'factor': 0.5})
+    assert not compiler.trim_only
+    print("✓ trim 链区间换算测试通过")
+
+
+if __name__ == "__main__":
+    test_plan()
+    test_commands()
+    test_trim_chain_range()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+测试时间轴雪碧图的数量与间隔计算
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sprite_sheet import sprite_layout, MAX_SPRITE_COUNT
+
+
+def test_sprite_layout():
+    # 默认 100 张，间隔按时长均分
+    assert sprite_layout(600.0) == {'count': 100, 'interval': 6.0}
+    assert sprite_layout(600.0, count=60) == {'count': 60, 'interval': 10.0}
+    # 指定间隔时数量向上取整
+    assert sprite_layout(25.0, interval=10) == {'count': 3, 'interval': 10.0}
+    # 数量有上限
+    assert sprite_layout(3600.0, interval=1)['count'] == MAX_SPRITE_COUNT
+    for bad in ({'count': 0}, {'interval': -1}):
+        try:
+            sprite_layout(10.0, **bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"应拒绝参数 {bad}")
+    try:
+        sprite_layout(0.0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("时长为 0 时应报错")
+    print("✓ 雪碧图布局计算测试通过")
+
+
+if __name__ == "__main__":
+    test_sprite_layout()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+测试磁盘容量管理：派生文件先于原始视频淘汰、按最近访问排序、正在使用与刚写入的文件不淘汰
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import ContentStore
+from render_cache import RenderCache
+from storage_manager import StorageManager, directory_artifacts, content_store_artifacts, render_cache_artifacts
+
+
+def _write(path, size):
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_storage_manager():
+    with tempfile.TemporaryDirectory() as root:
+        store = ContentStore(os.path.join(root, 'uploads'))
+        cache = RenderCache(os.path.join(root, 'uploads', 'render_cache'))
+        proxies = os.path.join(root, 'uploads', 'proxies')
+        os.makedirs(proxies)
+
+        old = store.save_upload(io.BytesIO(os.urandom(1000)), 'old.mp4')
+        new = store.save_upload(io.BytesIO(os.urandom(1000)), 'new.mp4')
+        for record in (old, new):
+            _age(store.path_for(record['name']), 3600)
+        # 代理文件与其元数据按摘要分组为同一项
+        _write(os.path.join(proxies, f"{old['digest']}.mp4"), 300)
+        _write(os.path.join(proxies, f"{old['digest']}.json"), 10)
+        _age(os.path.join(proxies, f"{old['digest']}.mp4"), 3600)
+        _age(os.path.join(proxies, f"{old['digest']}.json"), 3600)
+        for key in ('a' * 64, 'b' * 64):
+            _write(cache.path_for(key), 500)
+            cache.put(key)
+        cache._index['entries']['a' * 64]['created_at'] = time.time() - 3600
+        cache._index['entries']['a' * 64]['last_access'] = time.time() - 3600
+
+        removed = []
+        manager = StorageManager(3000, os.path.join(root, 'uploads', '.access.json'), min_age_seconds=600)
+        manager.add_source(lambda: content_store_artifacts(store, on_remove=removed.append))
+        manager.add_source(lambda: render_cache_artifacts(cache))
+        manager.add_source(lambda: directory_artifacts('proxy', proxies, ['*.mp4', '*.json']))
+        assert manager.usage() == {'original': 2000, 'render': 1000, 'proxy': 310}
+
+        # 超出 310 字节：先淘汰最久未访问的派生文件（代理的访问时间最早），原始视频不动
+        result = manager.sweep()
+        assert [e['kind'] for e in result['evicted']] == ['proxy']
+        assert not os.path.exists(os.path.join(proxies, f"{old['digest']}.json"))
+        assert store.lookup(old['digest']) is not None
+
+        # 预算收紧：派生文件中刚写入的渲染输出不淘汰，旧输出淘汰后再淘汰原始视频
+        manager.budget_bytes = 1200
+        protected = {new['digest']}
+        manager.add_protector(lambda: protected)
+        result = manager.sweep()
+        assert [e['kind'] for e in result['evicted']] == ['render', 'original']
+        assert cache.lookup('b' * 64) is not None
+        assert store.lookup(old['digest']) is None and removed == [old['digest']]
+        # 被引用的原始视频即使超出预算也保留
+        assert store.lookup(new['digest']) is not None
+        assert result['total_bytes'] == 1500
+
+        # 访问记录持久化，新实例可读取
+        manager.touch(new['digest'])
+        manager.sweep()
+        other = StorageManager(3000, os.path.join(root, 'uploads', '.access.json'))
+        assert new['digest'] in other._access
+    print("✓ 磁盘容量管理测试通过")
+
+
+if __name__ == "__main__":
+    test_storage_manager()
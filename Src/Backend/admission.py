@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+准入控制
+为 CPU/内存密集的请求分类限流，过载时快速拒绝而不是让所有请求一起变慢：
+- 每类请求（渲染、分析、分割、批量）有独立的并发上限，默认按 CPU 核数与内存推算
+- 超出并发上限的请求进入有界等待队列；队列也满时立即拒绝（HTTP 429 + Retry-After）
+- Retry-After 按该类请求的平均耗时与排队长度估算
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 各类请求的单任务内存估算（GB），用于推算默认并发上限
+MEMORY_PER_TASK_GB = {
+    'render': 1.5,
+    'analyze': 1.0,
+    'segment': 4.0,
+    'batch': 4.0,
+}
+# 各类请求的默认等待队列长度
+DEFAULT_MAX_QUEUE = {
+    'render': 32,
+    'analyze': 8,
+    'segment': 2,
+    'batch': 4,
+}
+
+
+def total_memory_gb() -> float:
+    """物理内存总量（GB），无法获取时返回 0。"""
+    try:
+        import psutil
+        return psutil.virtual_memory().total / 1024 ** 3
+    except ImportError:
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3
+        except (ValueError, OSError, AttributeError):
+            return 0.0
+
+
+def default_limit(resource_class: str, cores: Optional[int] = None, memory_gb: Optional[float] = None) -> int:
+    """按 CPU 核数与内存推算某类请求的并发上限。"""
+    cores = cores or os.cpu_count() or 1
+    memory_gb = total_memory_gb() if memory_gb is None else memory_gb
+    if resource_class == 'analyze':
+        by_cpu = max(1, cores // 2)
+    elif resource_class in ('segment', 'batch'):
+        # SAM2 占用 GPU，批量任务内部已有进程池，同时只运行少量
+        by_cpu = 1
+    else:
+        by_cpu = cores
+    if memory_gb > 0:
+        by_memory = max(1, int(memory_gb // MEMORY_PER_TASK_GB.get(resource_class, 1.0)))
+        return max(1, min(by_cpu, by_memory))
+    return by_cpu
+
+
+class AdmissionRejected(Exception):
+    """系统繁忙，请求未被接纳"""
+
+    def __init__(self, resource_class: str, retry_after: int):
+        super().__init__(f"服务器繁忙（{resource_class}），请 {retry_after} 秒后重试")
+        self.resource_class = resource_class
+        self.retry_after = retry_after
+
+
+class _ResourceClass:
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.running = 0
+        self.reserved = 0
+        self.avg_seconds: Optional[float] = None
+        # 通过 on_acquired 登记、等待运行名额的预留（先到先得）
+        self.waiters: deque = deque()
+        self.condition = threading.Condition()
+
+
+class Ticket:
+    """
+    已被接纳的请求。预留后占用队列名额；进入 with 代码块时等待并占用运行名额，退出时释放。
+    异步任务用 on_acquired 登记回调，拿到运行名额时才被调用，等待期间不占用任何线程。
+    """
+
+    def __init__(self, controller: 'AdmissionController', resource: _ResourceClass):
+        self._controller = controller
+        self._resource = resource
+        self._started: Optional[float] = None
+        self._released = False
+        self._callback: Optional[Callable[[], None]] = None
+        self._wait_start: Optional[float] = None
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        resource = self._resource
+        wait_start = time.perf_counter()
+        with resource.condition:
+            ok = resource.condition.wait_for(lambda: resource.running < resource.limit, timeout=timeout)
+            if not ok:
+                return False
+            resource.running += 1
+        self._mark_started(wait_start)
+        return True
+
+    def on_acquired(self, callback: Callable[[], None]):
+        """
+        不阻塞地等待运行名额：有空闲名额时立即调用 callback，否则排队，
+        由先结束的请求在 release 时移交名额并调用（在释放者的线程中执行）。
+        """
+        resource = self._resource
+        with resource.condition:
+            if resource.running < resource.limit and not resource.waiters:
+                resource.running += 1
+                ready = True
+            else:
+                self._callback = callback
+                self._wait_start = time.perf_counter()
+                resource.waiters.append(self)
+                ready = False
+        if ready:
+            self._mark_started(time.perf_counter())
+            callback()
+
+    def _mark_started(self, wait_start: float):
+        metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - wait_start, resource_class=self._resource.name)
+        self._started = time.perf_counter()
+
+    def release(self):
+        resource = self._resource
+        handoff = None
+        with resource.condition:
+            if self._released:
+                return
+            self._released = True
+            resource.reserved -= 1
+            if self._callback is not None and self._started is None:
+                # 尚未拿到运行名额就放弃
+                resource.waiters.remove(self)
+            if self._started is not None:
+                elapsed = time.perf_counter() - self._started
+                # 指数滑动平均，用于估算 Retry-After
+                resource.avg_seconds = elapsed if resource.avg_seconds is None \
+                    else 0.8 * resource.avg_seconds + 0.2 * elapsed
+                if resource.waiters:
+                    # 运行名额直接移交给最早排队的异步任务
+                    handoff = resource.waiters.popleft()
+                    handoff._mark_started(handoff._wait_start)
+                else:
+                    resource.running -= 1
+            resource.condition.notify()
+        if handoff is not None:
+            handoff._callback()
+
+    def __enter__(self):
+        if self._started is None:
+            self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """按请求类别的并发上限 + 有界等待队列"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None,
+                 max_queue: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            limits: 各类请求的并发上限，未指定的类别按 CPU 核数与内存推算
+            max_queue: 各类请求的等待队列长度
+        """
+        limits = limits or {}
+        max_queue = {**DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self._classes: Dict[str, _ResourceClass] = {}
+        for name in set(MEMORY_PER_TASK_GB) | set(limits) | set(max_queue):
+            self._classes[name] = _ResourceClass(
+                name, limits.get(name) or default_limit(name), max_queue.get(name, 0))
+        logger.info("准入控制并发上限: " + ", ".join(
+            f"{c.name}={c.limit}(队列 {c.max_queue})" for c in self._classes.values()))
+
+    def _resource(self, resource_class: str) -> _ResourceClass:
+        if resource_class not in self._classes:
+            raise ValueError(f"未知的请求类别: {resource_class}")
+        return self._classes[resource_class]
+
+    def check(self, resource_class: str):
+        """只检查是否还有名额（不预留），用于在上传等耗时步骤之前快速拒绝。"""
+        resource = self._resource(resource_class)
+        with resource.condition:
+            if resource.reserved >= resource.limit + resource.max_queue:
+                metrics.ADMISSION_REJECTED.inc(resource_class=resource_class)
+                raise AdmissionRejected(resource_class, self._retry_after(resource))
+
+    def reserve(self, resource_class: str) -> Ticket:
+        """
+        预留一个名额（运行中 + 排队中不超过 上限 + 队列长度），否则抛出 AdmissionRejected。
+        用于异步任务：接口中预留，工作线程中 with ticket 执行。
+        """
+        resource = self._resource(resource_class)
+        with resource.condition:
+            if resource.reserved >= resource.limit + resource.max_queue:
+                retry_after = self._retry_after(resource)
+                metrics.ADMISSION_REJECTED.inc(resource_class=resource_class)
+                logger.warning(f"准入拒绝 {resource_class}: 运行 {resource.running}/{resource.limit}, "
+                               f"已接纳 {resource.reserved}")
+                raise AdmissionRejected(resource_class, retry_after)
+            resource.reserved += 1
+        return Ticket(self, resource)
+
+    def admit(self, resource_class: str, timeout: float = 30.0) -> Ticket:
+        """
+        同步接口使用：预留名额并在 timeout 内等到运行名额，否则抛出 AdmissionRejected。
+        返回的 Ticket 已占用运行名额，需在 with 代码块中使用或手动 release。
+        """
+        ticket = self.reserve(resource_class)
+        if not ticket.acquire(timeout=timeout):
+            resource = self._resource(resource_class)
+            ticket.release()
+            metrics.ADMISSION_REJECTED.inc(resource_class=resource_class)
+            raise AdmissionRejected(resource_class, self._retry_after(resource))
+        return ticket
+
+    def _retry_after(self, resource: _ResourceClass) -> int:
+        avg = resource.avg_seconds or 5.0
+        waiting = max(0, resource.reserved - resource.limit) + 1
+        return max(1, int(math.ceil(avg * waiting / resource.limit)))
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """各类别当前的上限、运行数与已接纳数。"""
+        result = {}
+        for name, resource in self._classes.items():
+            with resource.condition:
+                result[name] = {
+                    'limit': resource.limit,
+                    'max_queue': resource.max_queue,
+                    'running': resource.running,
+                    'reserved': resource.reserved,
+                }
+        return result
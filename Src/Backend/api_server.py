@@ -1,13 +1,45 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory, send_file
+from flask import Flask, request, jsonify, make_response, Response
+from werkzeug.utils import safe_join
 from flask_cors import CORS
 import socket
+import uuid
+import time
 import os
 import logging
 import netifaces  # 用于获取网络接口信息
-from nlp_parser import process_instruction, DialogueManager
+from nlp_parser import process_instruction, DialogueManager, OPERATIONS
 from video_editor import MoviePyVideoEditor
+from job_queue import JobManager
+from content_store import ContentStore
+from chunked_upload import UploadSessionManager, UploadSessionError
+from media_response import send_media_file
+from hls_packager import HLSPackager, HLS_MIMETYPES
+from proxy_generator import ProxyGenerator
+from render_cache import RenderCache
+from render_profiles import RenderProfileRegistry
+from edit_session import EditSessionManager, EditSessionError
+from batch_render import BatchRenderer, editor_type_for, ITEM_QUEUED, ITEM_SUCCEEDED, ITEM_FAILED
+from admission import AdmissionController, AdmissionRejected
+from media_probe import get_metadata_store, get_metadata
+from ingest_analysis import IngestPipeline, TeeReader
+from sprite_sheet import SpriteSheetGenerator
+from fused_render import render_fused, map_action_paths
+from concat_render import render_concat
+from parallel_render import ParallelRenderer
+from storage_manager import StorageManager, directory_artifacts, content_store_artifacts, render_cache_artifacts
+import metrics
+import progress
+from config import RENDER_MAX_WORKERS, JOB_STALL_SECONDS, FUSED_RENDER_ENABLED, SMART_CUT_ENABLED, HLS_ENABLED, HLS_SEGMENT_SECONDS, PROXY_ENABLED, PROXY_HEIGHT, RENDER_CACHE_MAX_BYTES
+from config import BATCH_MAX_WORKERS, BATCH_MAX_ITEMS, LOSSLESS_CONCAT_ENABLED
+from config import DEFAULT_RENDER_PROFILE, PREVIEW_RENDER_PROFILE, RENDER_PROFILES_FILE
+from config import PARALLEL_RENDER_ENABLED, PARALLEL_RENDER_WORKERS, PARALLEL_RENDER_MIN_SECONDS, PARALLEL_SEGMENT_MIN_SECONDS
+from config import ADMISSION_LIMITS, ADMISSION_MAX_QUEUE, ADMISSION_WAIT_SECONDS
+from config import STORAGE_BUDGET_BYTES, STORAGE_SWEEP_SECONDS, STORAGE_MIN_AGE_SECONDS
+from config import INGEST_ANALYSIS_ENABLED, INGEST_SCENE_THRESHOLD, INGEST_THUMBNAIL_INTERVAL, INGEST_MAX_BUFFER_BYTES
 import mimetypes
+import shutil
 import re
+import threading
 
 # 导入新的ClipPersona Studio模块
 from clip_persona_studio import ClipPersonaStudio
@@ -37,8 +69,8 @@ app = Flask(__name__)
 CORS(app, resources={
     r"/*": {
         "origins": "*",
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Accept"],
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "Accept", "Content-Range"],
         "supports_credentials": True
     }
 })
@@ -48,38 +80,88 @@ clip_persona_studio = ClipPersonaStudio()
 enhanced_nlp_parser = EnhancedNLPParser()
 enhanced_video_comprehension = EnhancedVideoComprehension()
 
-# 文件名映射管理
-class FileManager:
-    def __init__(self):
-        self.file_counter = 0
-        self.filename_map = {}  # 原始文件名 -> 简化文件名的映射
-        self.reverse_map = {}   # 简化文件名 -> 原始文件名的映射
-        
-    def get_simplified_name(self, original_filename):
-        # 如果原始文件名已经有映射，直接返回
-        if original_filename in self.filename_map:
-            return self.filename_map[original_filename]
-            
-        # 生成新的简化文件名
-        self.file_counter += 1
-        simplified_name = f"{self.file_counter:03d}.mp4"  # 例如：001.mp4
-        
-        # 保存映射关系
-        self.filename_map[original_filename] = simplified_name
-        self.reverse_map[simplified_name] = original_filename
-        
-        return simplified_name
-        
-    def get_original_name(self, simplified_name):
-        return self.reverse_map.get(simplified_name)
-        
-    def has_file(self, original_filename):
-        return original_filename in self.filename_map
-
-# 创建文件管理器实例
-file_manager = FileManager()
+# 内容寻址的上传存储（按 SHA256 去重，索引持久化）
+content_store = ContentStore('uploads')
+# 可续传分块上传会话
+upload_sessions = UploadSessionManager(content_store, 'uploads/.sessions')
 # 创建对话管理器实例
 dialogue_manager = DialogueManager()
+# 创建渲染任务队列（并发编码数受 CPU 核数限制）
+job_manager = JobManager(max_workers=RENDER_MAX_WORKERS, stall_seconds=JOB_STALL_SECONDS)
+# HLS 分段打包器
+hls_packager = HLSPackager('uploads/hls', segment_seconds=HLS_SEGMENT_SECONDS)
+# 上传时探测的媒体元数据（旁路文件，编辑器与分析器共享）
+media_metadata = get_metadata_store('uploads/.meta')
+# 边上传边分析（镜头切换、缩略图、响度），结果按内容摘要缓存
+ingest_pipeline = IngestPipeline('uploads/.analysis', scene_threshold=INGEST_SCENE_THRESHOLD,
+                                 thumbnail_interval=INGEST_THUMBNAIL_INTERVAL,
+                                 max_buffer_bytes=INGEST_MAX_BUFFER_BYTES, metadata_store=media_metadata)
+# 低分辨率代理文件（预览用）
+proxy_generator = ProxyGenerator('uploads/proxies', height=PROXY_HEIGHT)
+# 时间轴缩略图雪碧图（关键帧解码，按内容摘要缓存）
+sprite_generator = SpriteSheetGenerator('uploads/sprites')
+# 渲染结果缓存（按输入摘要 + 操作链 + 编辑器 + 编码配置）
+render_cache = RenderCache('uploads/render_cache', max_bytes=RENDER_CACHE_MAX_BYTES)
+# 渲染配置（编码参数），内置配置可被基准测试的推荐结果覆盖
+render_profiles = RenderProfileRegistry(RENDER_PROFILES_FILE)
+# 预览在代理文件上以草稿配置渲染，与成片使用不同的缓存键
+preview_profile = render_profiles.get(PREVIEW_RENDER_PROFILE)
+PREVIEW_ENCODER_PROFILE = f"proxy{PROXY_HEIGHT}p-{preview_profile.cache_tag()}"
+# 多步剪辑会话
+edit_sessions = EditSessionManager(MoviePyVideoEditor, OPERATIONS, 'uploads/.edit_sessions')
+# 批量渲染进程池（首次使用时启动）
+batch_renderer = BatchRenderer(max_workers=BATCH_MAX_WORKERS)
+# 长视频分段并行导出的进程池（所有任务共用，首次使用时启动）
+parallel_renderer = ParallelRenderer(max_workers=PARALLEL_RENDER_WORKERS, min_segment_seconds=PARALLEL_SEGMENT_MIN_SECONDS)
+# 准入控制：CPU/内存密集请求按类别限流，过载时返回 429
+admission = AdmissionController(limits=ADMISSION_LIMITS, max_queue=ADMISSION_MAX_QUEUE)
+# 磁盘容量管理：超出预算时按最近访问时间淘汰，派生文件优先，正在使用的文件不淘汰
+storage_manager = StorageManager(STORAGE_BUDGET_BYTES, 'uploads/.storage_access.json',
+                                 min_age_seconds=STORAGE_MIN_AGE_SECONDS)
+storage_manager.add_source(lambda: content_store_artifacts(content_store, on_remove=media_metadata.forget))
+storage_manager.add_source(lambda: render_cache_artifacts(render_cache))
+storage_manager.add_source(lambda: directory_artifacts('proxy', 'uploads/proxies', ['*.mp4', '*.json']))
+storage_manager.add_source(lambda: directory_artifacts('hls', 'uploads/hls', ['*']))
+storage_manager.add_source(lambda: directory_artifacts('analysis', 'uploads/.analysis', ['*']))
+storage_manager.add_source(lambda: directory_artifacts('sprite', 'uploads/sprites', ['*']))
+# 旧版本按序号命名的输出，以及编辑器默认输出到工作目录的文件
+storage_manager.add_source(lambda: directory_artifacts('legacy_output', 'uploads', ['output_*.mp4', 'removed_*.mp4']))
+storage_manager.add_source(lambda: directory_artifacts(
+    'legacy_output', '.', ['output_*.mp4', 'output_video_*.mp4', 'ffmpeg_output_*.mp4']))
+# SAM2 分割残留的帧与掩码目录（正常结束时会自行删除）
+storage_manager.add_source(lambda: directory_artifacts(
+    'mask', '.', ['original_frames', 'frames_mask', 'white_mask_frames', 'original_mask_frames']))
+
+# 队列状态在采集 /metrics 时实时读取
+metrics.QUEUE_DEPTH.set_function(job_manager.queue_depth)
+metrics.JOBS_IN_FLIGHT.set_function(job_manager.in_flight)
+metrics.JOBS_STALLED.set_function(job_manager.stalled_count)
+
+def _job_refs(job):
+    """任务参数中引用的内容摘要"""
+    params = job.params
+    refs = list(params.get('digests') or [])
+    if params.get('digest'):
+        refs.append(params['digest'])
+    if params.get('video'):
+        refs.append(os.path.basename(params['video']).split('.', 1)[0])
+    if params.get('session_id'):
+        try:
+            refs.append(edit_sessions.get(params['session_id']).digest)
+        except (EditSessionError, OSError, ValueError, TypeError):
+            pass
+    return refs
+
+def _referenced_artifacts():
+    """进行中的任务与未过期的剪辑会话引用的文件，不可被淘汰"""
+    refs = []
+    for job in job_manager.active_jobs():
+        refs.extend(_job_refs(job))
+    refs.extend(edit_sessions.referenced_digests())
+    return refs
+
+storage_manager.add_protector(_referenced_artifacts)
+storage_manager.start(STORAGE_SWEEP_SECONDS)
 
 @app.after_request
 def after_request(response):
@@ -132,11 +214,74 @@ def root():
         "endpoints": {
             "health_check": "/health-check",
             "upload_video": "/upload-video",
+            "upload_sessions": "/upload-sessions",
             "process_video": "/process-video",
-            "check_file": "/check-file"
+            "job_status": "/jobs/<job_id>",
+            "job_events": "/jobs/<job_id>/events",
+            "commit_video": "/commit-video",
+            "edit_sessions": "/edit-sessions",
+            "process_batch": "/process-batch",
+            "hls": "/hls/<key>/index.m3u8",
+            "check_file": "/check-file",
+            "metrics": "/metrics"
         }
     })
 
+# Prometheus 文本格式的运行指标
+@app.route('/metrics')
+def metrics_endpoint():
+    return make_response(metrics.render_latest(), 200, {'Content-Type': metrics.CONTENT_TYPE})
+
+def _too_busy(e):
+    """系统繁忙时的 429 响应"""
+    response = jsonify({"error": str(e), "resource_class": e.resource_class, "retry_after": e.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def _unknown_profile(name):
+    """请求指定了不存在的渲染配置时返回 400 响应，否则返回 None"""
+    if name and name not in render_profiles.names():
+        return jsonify({"error": f"未知的渲染配置: {name}", "profiles": render_profiles.names()}), 400
+    return None
+
+def _submit_admitted(resource_class, kind, func, *args, params=None):
+    """
+    预留准入名额并登记任务；拿到运行名额后才交给工作线程执行，
+    等待中的任务不占用 JobManager 的线程，不会挤占其他类别的任务
+    """
+    ticket = admission.reserve(resource_class)
+    job = job_manager.register(kind, params)
+    job.update(stage='等待资源')
+
+    def run(job, *run_args):
+        with ticket:
+            return func(job, *run_args)
+
+    def start():
+        try:
+            job_manager.start(job, run, *args)
+        except Exception:
+            ticket.release()
+            raise
+
+    try:
+        ticket.on_acquired(start)
+    except Exception:
+        ticket.release()
+        raise
+    return job
+
+def _save_upload(stream, original_filename, kind):
+    """保存上传内容并记录上传字节数与耗时"""
+    start_time = time.perf_counter()
+    record = content_store.save_upload(stream, original_filename)
+    metrics.UPLOAD_SECONDS.observe(time.perf_counter() - start_time, kind=kind)
+    metrics.UPLOAD_BYTES.observe(record['size'], kind=kind)
+    if record['deduplicated']:
+        metrics.UPLOAD_DEDUPLICATED.inc()
+    return record
+
 # 上传视频端点
 @app.route('/upload-video', methods=['POST', 'OPTIONS'])
 def upload_video():
@@ -173,35 +318,30 @@ def upload_video():
             logger.warning(f"不支持的文件类型: {original_filename}")
             return jsonify({"error": "不支持的文件类型，请上传视频文件"}), 400
         
-        simplified_name = file_manager.get_simplified_name(original_filename)
-        logger.info(f"简化文件名: {simplified_name}")
-        
-        # 保存文件
-        upload_folder = 'uploads'
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            logger.info(f"创建上传目录: {upload_folder}")
-            
-        file_path = os.path.join(upload_folder, simplified_name)
-        
-        # 保存文件并记录进度
-        logger.info(f"开始保存文件: {file_path}")
-        video_file.save(file_path)
-        
-        # 验证文件是否保存成功
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            logger.info(f"视频保存成功: {file_path} (大小: {file_size} bytes)")
-        else:
-            logger.error(f"文件保存失败: {file_path}")
-            return jsonify({"error": "文件保存失败"}), 500
+        # 流式写盘并计算内容摘要，相同内容只保留一份；同时把字节送入上传分析
+        logger.info("开始保存文件")
+        ingest_key = _start_ingest()
+        stream = video_file.stream
+        if ingest_key:
+            stream = TeeReader(stream, lambda data: ingest_pipeline.feed(ingest_key, data))
+        try:
+            record = _save_upload(stream, original_filename, 'single')
+        except Exception:
+            if ingest_key:
+                ingest_pipeline.abort(ingest_key)
+            raise
+        file_path = content_store.path_for(record['name'])
+        _after_upload(record, ingest_key)
+        logger.info(f"视频保存成功: {file_path} (大小: {record['size']} bytes, 摘要: {record['digest']})")
         
         return jsonify({
             "status": "success",
-            "message": "视频上传成功",
+            "message": "视频已存在，无需重复保存" if record['deduplicated'] else "视频上传成功",
             "file_path": file_path,
-            "simplified_name": simplified_name,
-            "file_size": os.path.getsize(file_path)
+            "simplified_name": record['name'],
+            "digest": record['digest'],
+            "deduplicated": record['deduplicated'],
+            "file_size": record['size']
         })
         
     except Exception as e:
@@ -209,72 +349,510 @@ def upload_video():
         logger.exception("详细错误信息：")
         return jsonify({"error": str(e), "type": "upload_error"}), 500
 
-# 添加视频文件访问端点
+# 可续传分块上传：创建会话
+@app.route('/upload-sessions', methods=['POST', 'OPTIONS'])
+def create_upload_session():
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        size = data.get('size')
+        digest = data.get('digest')
+        if not filename or size is None:
+            return jsonify({"error": "filename 和 size 为必填项"}), 400
+        if not isinstance(filename, str):
+            return jsonify({"error": "filename 必须为字符串"}), 400
+        if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.wmv')):
+            return jsonify({"error": "不支持的文件类型，请上传视频文件"}), 400
+
+        # 服务器已有相同内容时无需上传
+        if digest:
+            record = content_store.lookup(digest)
+            if record:
+                return jsonify({
+                    "status": "success",
+                    "exists": True,
+                    "simplified_name": record['name'],
+                    "digest": record['digest'],
+                    "file_size": record['size']
+                })
+
+        session = upload_sessions.create(filename, size, digest)
+        _start_ingest(session['session_id'])
+        return jsonify({
+            "status": "success",
+            "exists": False,
+            "chunk_size": upload_sessions.chunk_size,
+            **session
+        }), 201
+
+    except UploadSessionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"创建上传会话失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# 可续传分块上传：上传区间 / 查询进度 / 取消
+@app.route('/upload-sessions/<session_id>', methods=['PUT', 'GET', 'DELETE', 'OPTIONS'])
+def upload_session_chunk(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        if request.method == 'GET':
+            return jsonify({"status": "success", **upload_sessions.status(session_id)})
+        if request.method == 'DELETE':
+            upload_sessions.abort(session_id)
+            ingest_pipeline.abort(session_id)
+            return jsonify({"status": "success"})
+
+        # 区间来自 Content-Range: bytes start-end/total，或查询参数 offset
+        content_range = request.headers.get('Content-Range')
+        length = None
+        if content_range:
+            match = re.match(r'bytes (\d+)-(\d+)/(\d+|\*)', content_range.strip())
+            if not match:
+                return jsonify({"error": f"无效的 Content-Range: {content_range}"}), 400
+            start = int(match.group(1))
+            length = int(match.group(2)) - start + 1
+        else:
+            offset = request.args.get('offset', '0')
+            if not offset.isdigit():
+                return jsonify({"error": f"无效的 offset: {offset}"}), 400
+            start = int(offset)
+            length = request.content_length
+
+        start_time = time.perf_counter()
+        received_before = upload_sessions.status(session_id)['received_bytes']
+        status = upload_sessions.write_range(session_id, start, request.stream, length)
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - start_time, kind='chunk')
+        metrics.UPLOAD_BYTES.observe(max(0, status['received_bytes'] - received_before), kind='chunk')
+        # 从文件开头连续到达的部分送入上传分析
+        received = status['received']
+        if received and received[0][0] == 0:
+            ingest_pipeline.feed_file(session_id, upload_sessions.data_path(session_id), received[0][1])
+        return jsonify({"status": "success", **status})
+
+    except UploadSessionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"上传分块失败: {str(e)}")
+        logger.exception("详细错误信息：")
+        return jsonify({"error": str(e)}), 500
+
+# 可续传分块上传：完成并校验
+@app.route('/upload-sessions/<session_id>/finalize', methods=['POST', 'OPTIONS'])
+def finalize_upload_session(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json(silent=True) or {}
+        record = upload_sessions.finalize(session_id, data.get('digest'))
+        file_path = content_store.path_for(record['name'])
+        _after_upload(record, session_id)
+        return jsonify({
+            "status": "success",
+            "message": "视频已存在，无需重复保存" if record['deduplicated'] else "视频上传成功",
+            "file_path": file_path,
+            "simplified_name": record['name'],
+            "digest": record['digest'],
+            "deduplicated": record['deduplicated'],
+            "file_size": record['size']
+        })
+
+    except UploadSessionError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        logger.error(f"完成上传会话失败: {str(e)}")
+        logger.exception("详细错误信息：")
+        return jsonify({"error": str(e)}), 500
+
+# 添加视频文件访问端点（流式返回，支持 Range/多区间/条件请求）
 @app.route('/uploads/<path:filename>')
 def serve_video(filename):
     try:
-        video_path = os.path.join('uploads', filename)
-        if not os.path.exists(video_path):
-            logger.error(f"视频文件不存在: {video_path}")
+        video_path = safe_join('uploads', filename)
+        if video_path is None or not os.path.isfile(video_path):
+            logger.error(f"视频文件不存在: {filename}")
             return jsonify({"error": "文件不存在"}), 404
 
-        # 获取文件大小
-        file_size = os.path.getsize(video_path)
-        
-        # 处理范围请求
-        range_header = request.headers.get('Range', None)
-        if range_header:
-            byte1, byte2 = 0, None
-            match = re.search('bytes=(\d+)-(\d*)', range_header)
-            if match:
-                groups = match.groups()
-                if groups[0]:
-                    byte1 = int(groups[0])
-                if groups[1]:
-                    byte2 = int(groups[1])
-            
-            if byte2 is None:
-                byte2 = file_size - 1
-            length = byte2 - byte1 + 1
-
-            # 打开文件并读取指定范围的数据
-            with open(video_path, 'rb') as f:
-                f.seek(byte1)
-                data = f.read(length)
-
-            response = make_response(data)
-            response.headers.add('Content-Type', 'video/mp4')
-            response.headers.add('Content-Range', f'bytes {byte1}-{byte2}/{file_size}')
-            response.headers.add('Accept-Ranges', 'bytes')
-            response.headers.add('Content-Length', str(length))
-            response.headers.add('Access-Control-Allow-Origin', '*')
-            response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            response.headers.add('Access-Control-Allow-Headers', 'Range')
-            response.status_code = 206
-            
-            return response
-            
-        # 非范围请求，返回完整文件
-        response = send_file(
-            video_path,
-            mimetype='video/mp4',
-            as_attachment=False,
-            conditional=True
-        )
-        
-        response.headers.add('Accept-Ranges', 'bytes')
-        response.headers.add('Content-Length', str(file_size))
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        response.headers.add('Access-Control-Allow-Headers', 'Range')
-        return response
+        storage_manager.touch(os.path.basename(video_path).split('.', 1)[0])
+        mimetype = mimetypes.guess_type(video_path)[0] or 'video/mp4'
+        return send_media_file(video_path, request.environ, request.headers, mimetype=mimetype)
 
     except Exception as e:
         logger.error(f"访问视频文件失败: {str(e)}")
         logger.exception("详细错误信息：")
         return jsonify({"error": str(e)}), 500
 
-# 修改处理视频编辑请求的函数
+# 媒体元数据：时长、帧率、分辨率、旋转、编码、关键帧位置、音频布局
+@app.route('/media/<digest>/metadata', methods=['GET', 'OPTIONS'])
+def media_metadata_info(digest):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        record = content_store.lookup(digest)
+        if record is None:
+            return jsonify({"error": "服务器上不存在该内容", "digest": digest}), 404
+        # 上传后的后台探测尚未完成时在此同步探测
+        meta = media_metadata.probe(content_store.path_for(record['name']), record['digest'])
+        return jsonify({"digest": record['digest'], "metadata": meta})
+    except Exception as e:
+        logger.error(f"读取媒体元数据失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# 上传时的分析结果：镜头切换、缩略图、响度
+@app.route('/media/<digest>/analysis', methods=['GET', 'OPTIONS'])
+def media_ingest_analysis(digest):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        result = ingest_pipeline.result(digest)
+        if result is None:
+            return jsonify({"error": "分析结果尚未生成", "digest": digest}), 404
+        thumbnail_prefix = f"/uploads/{os.path.basename(ingest_pipeline.root)}/{result['digest']}"
+        return jsonify({
+            **result,
+            "thumbnail_urls": [f"{thumbnail_prefix}/{name}" for name in result['thumbnails']]
+        })
+    except Exception as e:
+        logger.error(f"读取上传分析结果失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# 时间轴雪碧图：?count=N 或 ?interval=秒，返回雪碧图地址与每格时间索引
+@app.route('/media/<digest>/sprites', methods=['GET', 'OPTIONS'])
+def media_sprites(digest):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        record = content_store.lookup(digest)
+        if record is None:
+            return jsonify({"error": "服务器上不存在该内容", "digest": digest}), 404
+        count = request.args.get('count', type=int)
+        interval = request.args.get('interval', type=float)
+        index = sprite_generator.get(content_store.path_for(record['name']), record['digest'],
+                                     count=count, interval=interval,
+                                     proxy_path=proxy_generator.proxy_path(record['digest']))
+        return jsonify(index)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"生成雪碧图失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# HLS 播放列表与分段（内容寻址目录，可长期缓存）
+@app.route('/hls/<key>/<filename>')
+def serve_hls(key, filename):
+    try:
+        path = hls_packager.resolve(key, filename)
+        if path is None:
+            return jsonify({"error": "文件不存在"}), 404
+        storage_manager.touch(key)
+        mimetype = HLS_MIMETYPES[os.path.splitext(filename)[1]]
+        return send_media_file(path, request.environ, request.headers, mimetype=mimetype,
+                               cache_control='public, max-age=31536000, immutable')
+    except Exception as e:
+        logger.error(f"访问 HLS 文件失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _render_parallel(video_path, actions, output_path, editor):
+    """长视频按区间分发到多个进程并行编码；不适用或失败时返回 False"""
+    clip = editor.video_clip
+    if not PARALLEL_RENDER_ENABLED or clip.duration < PARALLEL_RENDER_MIN_SECONDS:
+        return False
+    meta = get_metadata(video_path)
+    return parallel_renderer.render(video_path, actions, output_path, clip.duration, clip.fps,
+                                    keyframes=(meta or {}).get('keyframes'), profile=editor.render_profile)
+
+def _run_edit_chain(job, video_path, actions, cache_key, package_hls=True, editor_provider=None, profile=None):
+    """
+    在 video_path 上依次执行 actions，按渲染配置 profile 编码，输出写入渲染缓存；缓存已命中时直接返回。
+    editor_provider 返回已应用全部操作的编辑器（剪辑会话），此时直接编码且不关闭编辑器。
+    """
+    profile = profile or render_profiles.get(DEFAULT_RENDER_PROFILE)
+    output_simplified_name = render_cache.name_for(cache_key)
+    output_path = render_cache.path_for(cache_key)
+
+    with render_cache.lock_for(cache_key):
+        entry = render_cache.lookup(cache_key)
+        metrics.RENDER_CACHE_LOOKUPS.inc(result='hit' if entry is not None else 'miss')
+        if entry is not None:
+            logger.info(f"渲染缓存命中: {cache_key}")
+        else:
+            job.update(progress=0.2, stage='执行剪辑')
+            # 先写入临时文件，完成后再改名，避免客户端读到半成品
+            tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp.mp4"
+            fused = False
+            if editor_provider is None and FUSED_RENDER_ENABLED:
+                # 可融合的操作链直接编译为 ffmpeg 滤镜图，一次解码编码完成
+                with progress.current().span(0.2, 0.95):
+                    fused = render_fused(video_path, actions, tmp_path, OPERATIONS,
+                                         smart_cut_enabled=SMART_CUT_ENABLED, profile=profile)
+            if not fused and editor_provider is None and LOSSLESS_CONCAT_ENABLED:
+                # 无转场合并直接拼接码流
+                with progress.current().span(0.2, 0.95):
+                    fused = render_concat(video_path, actions, tmp_path, OPERATIONS, profile=profile)
+            if not fused:
+                # 合并前预先补边等中间文件写入本次渲染的工作目录，结束后删除
+                work_dir = f"{output_path}.{uuid.uuid4().hex}.work"
+                editor = editor_provider() if editor_provider else MoviePyVideoEditor(video_path, work_dir=work_dir)
+                try:
+                    if editor_provider is None:
+                        editor.render_profile = profile
+                        for action in actions:
+                            success = editor.execute_action(action, OPERATIONS)
+                            if not success:
+                                raise ValueError("操作执行失败，请检查参数是否正确")
+
+                    # 保存处理后的视频
+                    job.update(progress=0.3, stage='编码输出')
+                    editor.output_path = tmp_path
+                    editor.render_profile = profile
+                    # 编码过程中的帧进度映射到任务整体进度的 30%~95%
+                    with progress.current().span(0.3, 0.95):
+                        if not (editor_provider is None and _render_parallel(video_path, actions, tmp_path, editor)):
+                            editor.save()
+                finally:
+                    if editor_provider is None:
+                        editor.close()
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+            # 确保输出文件存在
+            if not os.path.exists(tmp_path):
+                raise Exception("处理后的视频文件未生成")
+            os.replace(tmp_path, output_path)
+            render_cache.put(cache_key, {'source': video_path, 'actions': actions})
+            storage_manager.request_sweep()
+
+    # 构建相对路径的URL
+    video_url = f"/uploads/{output_simplified_name}"
+    logger.info(f"视频处理完成，输出URL: {video_url}")
+    result = {
+        "output_path": video_url,
+        "simplified_name": output_simplified_name,
+        "cached": entry is not None,
+        "profile": profile.name
+    }
+
+    # 可选：打包为 HLS 分段，失败不影响 MP4 输出
+    if HLS_ENABLED and package_hls:
+        job.update(progress=0.95, stage='切片打包')
+        render_cache.pin(cache_key)
+        try:
+            result["hls_url"] = hls_packager.package(output_path, digest=cache_key)['playlist_url']
+        except Exception as e:
+            logger.warning(f"HLS 打包失败，仅返回 MP4: {e}")
+        finally:
+            render_cache.unpin(cache_key)
+    return result
+
+def _parse_instruction(record, instruction):
+    """解析指令；同一视频的同一指令（客户端重试）直接复用上次的解析结果"""
+    cached = render_cache.recall_instruction(record['digest'], instruction)
+    if cached is not None:
+        return cached
+    action, confirmation, _ = process_instruction(instruction)
+    if not action:
+        raise ValueError(confirmation or "未能解析处理指令")
+    render_cache.remember_instruction(record['digest'], instruction, action, confirmation)
+    return action, confirmation
+
+def _content_path(reference):
+    record = content_store.resolve(reference)
+    return content_store.path_for(record['name']) if record else None
+
+def _client_action(action):
+    """客户端直接提交的 action：操作须在 OPERATIONS 中，文件参数只能引用内容库中的对象（摘要或对象名）"""
+    if not isinstance(action, str):
+        raise ValueError(f"无效的操作: {action}")
+    return map_action_paths(action, OPERATIONS, _content_path)
+
+def _render_video_job(job, record, instruction, preview=False, profile_name=None):
+    """在工作线程中执行：LLM 解析指令 → 剪辑 → 编码输出；preview 时在代理文件上以草稿配置执行"""
+    job.update(progress=0.05, stage='解析指令')
+    action, confirmation = _parse_instruction(record, instruction)
+
+    if preview:
+        job.update(progress=0.1, stage='准备代理文件')
+        meta = proxy_generator.ensure_proxy(content_store.path_for(record['name']), record['digest'])
+        cache_key = RenderCache.make_key(record['digest'], [action], 'moviepy', PREVIEW_ENCODER_PROFILE)
+        result = _run_edit_chain(
+            job, proxy_generator.proxy_path(record['digest']),
+            [proxy_generator.action_for_proxy(action, meta)],
+            cache_key, package_hls=False, profile=preview_profile
+        )
+    else:
+        profile = render_profiles.get(profile_name)
+        cache_key = RenderCache.make_key(record['digest'], [action], 'moviepy', profile.cache_tag())
+        result = _run_edit_chain(job, content_store.path_for(record['name']), [action], cache_key, profile=profile)
+
+    # 记录原始分辨率下的剪辑链，供 /commit-video 在原始文件上重放
+    result.update({
+        "message": confirmation,
+        "digest": record['digest'],
+        "actions": [action],
+        "preview": preview
+    })
+    return result
+
+def _commit_video_job(job, record, actions, profile_name=None):
+    """在原始文件上重放预览时确定的剪辑链"""
+    profile = render_profiles.get(profile_name)
+    cache_key = RenderCache.make_key(record['digest'], actions, 'moviepy', profile.cache_tag())
+    result = _run_edit_chain(job, content_store.path_for(record['name']), actions, cache_key, profile=profile)
+    result.update({
+        "message": "已在原始视频上应用全部操作",
+        "digest": record['digest'],
+        "actions": actions,
+        "preview": False
+    })
+    return result
+
+def _render_session_job(job, session_id, preview=False, profile_name=None):
+    """渲染剪辑会话当前的操作链：预览在代理文件上重放，导出直接编码会话中的剪辑图"""
+    session = edit_sessions.get(session_id)
+    with session.lock:
+        actions = list(session.actions)
+        if not actions:
+            raise ValueError("会话中还没有任何操作")
+        record = content_store.lookup(session.digest)
+        if record is None:
+            raise FileNotFoundError("会话的源视频已不存在")
+
+        if preview:
+            job.update(progress=0.1, stage='准备代理文件')
+            meta = proxy_generator.ensure_proxy(content_store.path_for(record['name']), record['digest'])
+            cache_key = RenderCache.make_key(record['digest'], actions, 'moviepy', PREVIEW_ENCODER_PROFILE)
+            result = _run_edit_chain(
+                job, proxy_generator.proxy_path(record['digest']),
+                [proxy_generator.action_for_proxy(a, meta) for a in actions],
+                cache_key, package_hls=False, profile=preview_profile
+            )
+        else:
+            profile = render_profiles.get(profile_name)
+            cache_key = RenderCache.make_key(record['digest'], actions, 'moviepy', profile.cache_tag())
+            result = _run_edit_chain(
+                job, session.video_path, actions, cache_key,
+                editor_provider=lambda: edit_sessions.editor_for(session), profile=profile
+            )
+
+    result.update({
+        "message": f"已渲染 {len(actions)} 个操作",
+        "session_id": session_id,
+        "digest": record['digest'],
+        "actions": actions,
+        "preview": preview
+    })
+    return result
+
+def _batch_render_job(job, digests, instruction, profile_name=None):
+    """批量任务：指令只解析一次，各视频在进程池中并行渲染，逐项记录状态"""
+    job.update(progress=0.0, stage='解析指令')
+    profile = render_profiles.get(profile_name)
+    action, confirmation, _ = process_instruction(instruction)
+    if not action:
+        raise ValueError(confirmation or "未能解析处理指令")
+    editor_type = editor_type_for(action)
+
+    items, tasks = [], []
+    for digest in digests:
+        item = {"digest": digest, "status": ITEM_QUEUED}
+        items.append(item)
+        record = content_store.lookup(digest)
+        if record is None:
+            item.update(status=ITEM_FAILED, error="服务器上不存在该内容，请先上传视频")
+            continue
+        cache_key = RenderCache.make_key(digest, [action], editor_type, profile.cache_tag())
+        item["output_path"] = f"/uploads/{render_cache.name_for(cache_key)}"
+        if render_cache.lookup(cache_key) is not None:
+            metrics.RENDER_CACHE_LOOKUPS.inc(result='hit')
+            item.update(status=ITEM_SUCCEEDED, cached=True)
+            continue
+        metrics.RENDER_CACHE_LOOKUPS.inc(result='miss')
+        tasks.append({
+            "item": item,
+            "cache_key": cache_key,
+            "editor_type": editor_type,
+            "video_path": content_store.path_for(record['name']),
+            "action": action,
+            "output_path": f"{render_cache.path_for(cache_key)}.{uuid.uuid4().hex}.tmp.mp4",
+            "profile": profile
+        })
+
+    # 运行中即可通过 /jobs/<job_id> 查看每项状态
+    job.result = {"message": confirmation, "action": action, "items": items}
+
+    def commit_output(task):
+        os.replace(task["output_path"], render_cache.path_for(task["cache_key"]))
+        render_cache.put(task["cache_key"], {'source': task["video_path"], 'actions': [action]})
+        task["item"]["cached"] = False
+
+    job.update(stage=f"已完成 0/{len(tasks)}")
+    batch_renderer.run(job, tasks, on_success=commit_output)
+    for task in tasks:
+        if os.path.exists(task["output_path"]):
+            os.remove(task["output_path"])
+
+    return {
+        "message": confirmation,
+        "action": action,
+        "items": items,
+        "succeeded": sum(1 for i in items if i["status"] == ITEM_SUCCEEDED),
+        "failed": sum(1 for i in items if i["status"] == ITEM_FAILED)
+    }
+
+def _prepare_upload(job, record):
+    """探测媒体元数据（写入旁路文件），再生成代理文件（复用探测结果）"""
+    video_path = content_store.path_for(record['name'])
+    job.update(stage="探测媒体信息")
+    media_metadata.probe(video_path, record['digest'])
+    if PROXY_ENABLED:
+        job.update(stage="生成代理文件")
+        proxy_generator.ensure_proxy(video_path, record['digest'])
+    # 预先生成默认雪碧图，首次拖动预览无需等待
+    job.update(stage="生成时间轴缩略图")
+    try:
+        sprite_generator.get(video_path, record['digest'], proxy_path=proxy_generator.proxy_path(record['digest']))
+    except Exception as e:
+        logger.warning(f"雪碧图生成失败: {e}")
+
+def _start_ingest(key=None):
+    """为新上传启动流式分析；未启用或分析名额已满时返回 None（不影响上传）"""
+    if not INGEST_ANALYSIS_ENABLED:
+        return None
+    try:
+        ticket = admission.reserve('analyze')
+    except AdmissionRejected:
+        return None
+    if not ticket.acquire(timeout=0):
+        ticket.release()
+        return None
+    return ingest_pipeline.start(key, on_close=ticket.release)
+
+def _complete_ingest(ingest_key, record):
+    try:
+        ingest_pipeline.complete(ingest_key, record['digest'], content_store.path_for(record['name']))
+    except Exception as e:
+        logger.error(f"上传分析失败 {record['digest']}: {e}")
+
+def _after_upload(record, ingest_key=None):
+    """上传完成后收尾上传分析，并在后台探测元数据、生成代理文件与雪碧图"""
+    digest = record['digest']
+    if ingest_key and ingest_pipeline.get(ingest_key) is not None:
+        # 流式分析已基本完成，不进入渲染队列排队，直接收尾
+        threading.Thread(target=_complete_ingest, args=(ingest_key, record), daemon=True).start()
+    if media_metadata.lookup(digest) is None or (PROXY_ENABLED and not proxy_generator.has_proxy(digest)):
+        job_manager.submit('prepare', _prepare_upload, record, params={'digest': digest})
+    storage_manager.touch(digest)
+    storage_manager.request_sweep()
+
+# 处理视频编辑请求：登记渲染任务后立即返回任务 ID
 @app.route('/process-video', methods=['POST', 'OPTIONS'])
 def process_video():
     if request.method == 'OPTIONS':
@@ -282,113 +860,364 @@ def process_video():
     
     try:
         logger.info(f"收到视频处理请求，来自: {request.remote_addr}")
-        
-        # 检查文件和指令
-        if 'video' not in request.files:
-            return jsonify({"error": "请上传视频文件"}), 400
+
+        # 渲染名额已满时在解析表单（接收上传）之前就拒绝
+        admission.check('render')
+
+        # 检查指令
         if 'instruction' not in request.form:
             return jsonify({"error": "请提供处理指令"}), 400
-            
-        video_file = request.files['video']
         instruction = request.form['instruction']
-        
-        if video_file.filename == '':
-            return jsonify({"error": "未选择文件"}), 400
-            
-        # 获取或创建简化文件名
-        original_filename = video_file.filename
-        simplified_name = file_manager.get_simplified_name(original_filename)
-        
-        # 保存视频文件
-        upload_folder = 'uploads'
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        video_path = os.path.join(upload_folder, simplified_name)
-        
-        # 如果文件不存在才保存
-        if not os.path.exists(video_path):
-            video_file.save(video_path)
-            logger.info(f"视频保存成功: {video_path} (原始文件名: {original_filename})")
+        # sync=true 时保持旧行为：等待任务完成后再返回结果
+        wait_for_result = request.form.get('sync', 'false').lower() == 'true'
+        # 渲染配置（draft/share/archive/mobile_*），未指定时使用默认配置
+        profile_name = request.form.get('profile') or None
+        rejected = _unknown_profile(profile_name)
+        if rejected:
+            return rejected
+
+        # 客户端已知服务器存有该内容时，只需提交摘要，无需再次上传视频
+        digest = request.form.get('digest')
+        if digest:
+            record = content_store.lookup(digest)
+            if record is None:
+                return jsonify({"error": "服务器上不存在该内容，请先上传视频", "digest": digest}), 404
+        else:
+            if 'video' not in request.files:
+                return jsonify({"error": "请上传视频文件"}), 400
+            video_file = request.files['video']
+            if video_file.filename == '':
+                return jsonify({"error": "未选择文件"}), 400
+            record = _save_upload(video_file.stream, video_file.filename, 'process_video')
+            _after_upload(record)
+
+        simplified_name = record['name']
+        video_path = content_store.path_for(simplified_name)
             
-        # 处理视频
+        # preview=true 时在低分辨率代理上快速出预览，确认后通过 /commit-video 生成成片
+        preview = request.form.get('preview', 'false').lower() == 'true'
+
         dialogue_manager.set_current_video(video_path)
-        action, confirmation, _ = process_instruction(instruction)
-        
-        if action:
-            editor = MoviePyVideoEditor(video_path)
-            try:
-                success = editor.execute_action(action)
-                if not success:
-                    return jsonify({
-                        "status": "error",
-                        "message": "操作执行失败，请检查参数是否正确"
-                    }), 400
-            except Exception as e:
-                logger.error(f"执行操作时发生异常: {e}")
+        job = _submit_admitted(
+            'render', 'process_video', _render_video_job, record, instruction, preview, profile_name,
+            params={'video': simplified_name, 'instruction': instruction, 'preview': preview, 'profile': profile_name}
+        )
+
+        if wait_for_result:
+            job_manager.wait(job)
+            if job.status != 'succeeded':
                 return jsonify({
                     "status": "error",
-                    "message": f"操作执行失败: {str(e)}"
+                    "job_id": job.job_id,
+                    "message": f"操作执行失败: {job.error}"
                 }), 400
-            
-            # 为处理后的视频创建新的简化文件名
-            output_simplified_name = f"output_{simplified_name}"
-            output_path = os.path.join(upload_folder, output_simplified_name)
-            
-            # 保存处理后的视频
-            editor.output_path = output_path
-            editor.save()
-            editor.close()
+            return jsonify({"status": "success", "job_id": job.job_id, **job.result})
 
-            # 确保输出文件存在
-            if not os.path.exists(output_path):
-                raise Exception("处理后的视频文件未生成")
+        return jsonify({
+            "status": "accepted",
+            "message": "任务已提交，正在处理",
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
+        }), 202
 
-            # 构建相对路径的URL
-            video_url = f"/uploads/{output_simplified_name}"
-            
-            logger.info(f"视频处理完成，输出URL: {video_url}")
-            
-            return jsonify({
-                "status": "success",
-                "message": confirmation,
-                "output_path": video_url,
-                "simplified_name": output_simplified_name
-            })
-        else:
-            return jsonify({
-                "status": "error",
-                "message": confirmation
-            }), 400
-            
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         logger.error(f"处理请求时出错: {str(e)}")
         logger.exception("详细错误信息：")
         return jsonify({"error": str(e)}), 500
 
-# 检查文件是否已上传
+# 可选的渲染配置
+@app.route('/render-profiles', methods=['GET', 'OPTIONS'])
+def list_render_profiles():
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    return jsonify({
+        "status": "success",
+        "default": DEFAULT_RENDER_PROFILE,
+        "preview": PREVIEW_RENDER_PROFILE,
+        "profiles": render_profiles.to_dict()
+    })
+
+# 查询渲染任务状态
+@app.route('/jobs/<job_id>', methods=['GET', 'OPTIONS'])
+def get_job_status(job_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify({
+        "status": "success",
+        "job": job.to_dict()
+    })
+
+# 订阅任务进度（Server-Sent Events）：进度、速率、剩余时间与停滞状态变化时推送，任务结束后发送 end 事件
+@app.route('/jobs/<job_id>/events', methods=['GET', 'OPTIONS'])
+def job_events(job_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return Response(progress.job_event_stream(job), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# 批量处理：同一指令应用到多个已上传的视频
+@app.route('/process-batch', methods=['POST', 'OPTIONS'])
+def process_batch():
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        instruction = data.get('instruction')
+        digests = [d.lower() for d in data.get('digests') or []]
+        if not instruction or not digests:
+            return jsonify({"error": "请提供 instruction 和 digests"}), 400
+        # 去重并保持顺序，相同内容只渲染一次
+        digests = list(dict.fromkeys(digests))
+        if len(digests) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"单次最多处理 {BATCH_MAX_ITEMS} 个视频"}), 400
+        profile_name = data.get('profile')
+        rejected = _unknown_profile(profile_name)
+        if rejected:
+            return rejected
+
+        job = _submit_admitted(
+            'batch', 'process_batch', _batch_render_job, digests, instruction, profile_name,
+            params={'instruction': instruction, 'count': len(digests), 'digests': digests, 'profile': profile_name}
+        )
+        return jsonify({
+            "status": "accepted",
+            "message": "批量任务已提交，正在处理",
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
+        }), 202
+
+    except AdmissionRejected as e:
+        return _too_busy(e)
+    except Exception as e:
+        logger.error(f"提交批量任务失败: {str(e)}")
+        logger.exception("详细错误信息：")
+        return jsonify({"error": str(e)}), 500
+
+# 确认预览：在原始文件上重放剪辑链
+@app.route('/commit-video', methods=['POST', 'OPTIONS'])
+def commit_video():
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        # 可直接引用预览任务，也可显式提供 digest + actions
+        if data.get('preview_job_id'):
+            preview_job = job_manager.get(data['preview_job_id'])
+            if preview_job is None or preview_job.status != 'succeeded':
+                return jsonify({"error": "预览任务不存在或尚未完成"}), 404
+            digest = preview_job.result['digest']
+            actions = preview_job.result['actions']
+        else:
+            digest = data.get('digest')
+            actions = data.get('actions')
+            if actions is not None and not isinstance(actions, list):
+                return jsonify({"error": "actions 必须是操作列表"}), 400
+            try:
+                actions = [_client_action(action) for action in actions or []]
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        if not digest or not actions:
+            return jsonify({"error": "请提供 preview_job_id 或 digest + actions"}), 400
+        profile_name = data.get('profile')
+        rejected = _unknown_profile(profile_name)
+        if rejected:
+            return rejected
+
+        record = content_store.lookup(digest)
+        if record is None:
+            return jsonify({"error": "服务器上不存在该内容，请先上传视频", "digest": digest}), 404
+
+        job = _submit_admitted(
+            'render', 'commit_video', _commit_video_job, record, list(actions), profile_name,
+            params={'video': record['name'], 'actions': actions, 'profile': profile_name}
+        )
+        return jsonify({
+            "status": "accepted",
+            "message": "任务已提交，正在处理",
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
+        }), 202
+
+    except AdmissionRejected as e:
+        return _too_busy(e)
+    except Exception as e:
+        logger.error(f"提交成片任务失败: {str(e)}")
+        logger.exception("详细错误信息：")
+        return jsonify({"error": str(e)}), 500
+
+# 多步剪辑会话：追加操作只修改内存中的剪辑图，预览/导出时才编码
+@app.route('/edit-sessions', methods=['POST', 'OPTIONS'])
+def create_edit_session():
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        record = content_store.lookup(data.get('digest'))
+        if record is None:
+            return jsonify({"error": "服务器上不存在该内容，请先上传视频", "digest": data.get('digest')}), 404
+        session = edit_sessions.create(record['digest'], content_store.path_for(record['name']), data.get('user_id'))
+        return jsonify({"status": "success", "session": session.to_dict()}), 201
+
+    except Exception as e:
+        logger.error(f"创建剪辑会话失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/edit-sessions/<session_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+def edit_session(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        if request.method == 'DELETE':
+            edit_sessions.delete(session_id)
+            return jsonify({"status": "success", "message": "剪辑会话已删除"})
+        return jsonify({"status": "success", "session": edit_sessions.get(session_id).to_dict()})
+
+    except EditSessionError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"访问剪辑会话失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/edit-sessions/<session_id>/actions', methods=['POST', 'OPTIONS'])
+def append_edit_action(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        session = edit_sessions.get(session_id)
+        # 可直接提交 action 字符串，也可提交自然语言指令由 LLM 解析
+        if data.get('action'):
+            try:
+                action, confirmation = _client_action(data['action']), "操作已添加"
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        elif data.get('instruction'):
+            record = content_store.lookup(session.digest) or {'digest': session.digest}
+            action, confirmation = _parse_instruction(record, data['instruction'])
+        else:
+            return jsonify({"error": "请提供 instruction 或 action"}), 400
+
+        session = edit_sessions.append(session_id, action)
+        return jsonify({
+            "status": "success",
+            "message": confirmation,
+            "action": action,
+            "session": session.to_dict()
+        })
+
+    except EditSessionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"追加剪辑操作失败: {str(e)}")
+        logger.exception("详细错误信息：")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/edit-sessions/<session_id>/undo', methods=['POST', 'OPTIONS'])
+def undo_edit_action(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        session = edit_sessions.undo(session_id)
+        return jsonify({"status": "success", "session": session.to_dict()})
+
+    except EditSessionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"撤销剪辑操作失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/edit-sessions/<session_id>/render', methods=['POST', 'OPTIONS'])
+def render_edit_session(session_id):
+    if request.method == 'OPTIONS':
+        return make_response('', 200)
+
+    try:
+        data = request.get_json() or {}
+        preview = bool(data.get('preview', False))
+        profile_name = data.get('profile')
+        rejected = _unknown_profile(profile_name)
+        if rejected:
+            return rejected
+        session = edit_sessions.get(session_id)
+        job = _submit_admitted(
+            'render', 'render_session', _render_session_job, session_id, preview, profile_name,
+            params={'session_id': session_id, 'actions': list(session.actions), 'preview': preview,
+                    'profile': profile_name}
+        )
+        return jsonify({
+            "status": "accepted",
+            "message": "任务已提交，正在处理",
+            "job_id": job.job_id,
+            "status_url": f"/jobs/{job.job_id}"
+        }), 202
+
+    except EditSessionError as e:
+        return jsonify({"error": str(e)}), 404
+    except AdmissionRejected as e:
+        return _too_busy(e)
+    except Exception as e:
+        logger.error(f"提交会话渲染任务失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# 检查文件是否已上传（按内容摘要判断）
 @app.route('/check-file', methods=['POST'])
 def check_file():
     try:
         data = request.json
-        if not data or 'filename' not in data:
-            return jsonify({"error": "未提供文件名"}), 400
-            
-        original_filename = data['filename']
-        is_uploaded = file_manager.has_file(original_filename)
-        
-        if is_uploaded:
-            simplified_name = file_manager.get_simplified_name(original_filename)
+        if not data:
+            return jsonify({"error": "未提供文件信息"}), 400
+
+        # 完整摘要：可直接确认是否已存在
+        if data.get('digest'):
+            record = content_store.lookup(data['digest'])
+            if record:
+                return jsonify({
+                    "status": "success",
+                    "exists": True,
+                    "simplified_name": record['name'],
+                    "digest": record['digest'],
+                    "file_size": record['size']
+                })
+            return jsonify({"status": "success", "exists": False})
+
+        # 部分哈希 + 大小：快速预检，命中候选时提示客户端补充完整摘要确认
+        if data.get('partial_hash') and data.get('size') is not None:
+            candidates = content_store.lookup_partial(data['partial_hash'], data['size'])
             return jsonify({
                 "status": "success",
-                "exists": True,
-                "simplified_name": simplified_name
+                "exists": False,
+                "maybe_exists": bool(candidates),
+                "need_full_digest": bool(candidates)
             })
-        else:
+
+        # 仅有文件名时无法区分不同设备上的同名文件，按未上传处理
+        if data.get('filename'):
             return jsonify({
                 "status": "success",
-                "exists": False
+                "exists": False,
+                "need_full_digest": True
             })
+
+        return jsonify({"error": "请提供 digest 或 partial_hash+size"}), 400
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -484,14 +1313,17 @@ def analyze_video_preferences():
         if not persona:
             return jsonify({'error': 'Persona not found'}), 404
         
-        # 分析视频偏好
-        analysis_result = clip_persona_studio.analyze_video_preferences(persona, video_path)
+        # 分析视频偏好（同步执行，受并发上限约束）
+        with admission.admit('analyze', timeout=ADMISSION_WAIT_SECONDS):
+            analysis_result = clip_persona_studio.analyze_video_preferences(persona, video_path)
         
         return jsonify({
             'success': True,
             'analysis': analysis_result
         })
     
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         logger.error(f"分析视频偏好失败: {e}")
         return jsonify({'error': str(e)}), 500
@@ -632,14 +1464,25 @@ def analyze_video():
         if not video_path:
             return jsonify({'error': 'video_path is required'}), 400
         
-        # 分析视频
-        analysis_result = enhanced_video_comprehension.comprehensive_analysis(video_path, analysis_level)
+        # 上传时已缓存的分析结果（按内容摘要），对应步骤不再重复读取视频
+        digest = os.path.basename(video_path).split('.', 1)[0]
+        ingest_result = ingest_pipeline.result(digest)
+        precomputed = {'scene_analysis': ingest_pipeline.scene_analysis(digest)} if ingest_result else None
+
+        # 分析视频（同步执行，受并发上限约束）
+        with admission.admit('analyze', timeout=ADMISSION_WAIT_SECONDS):
+            analysis_result = enhanced_video_comprehension.comprehensive_analysis(
+                video_path, analysis_level, precomputed=precomputed)
+        if ingest_result:
+            analysis_result['ingest_analysis'] = ingest_result
         
         return jsonify({
             'success': True,
             'analysis': analysis_result
         })
     
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         logger.error(f"视频分析失败: {e}")
         return jsonify({'error': str(e)}), 500
@@ -654,22 +1497,16 @@ def list_personas():
         data = request.get_json()
         user_id = data.get('user_id', 'default_user')
         
-        # 获取人格列表（这里需要实现从文件系统读取）
-        persona_dir = f"persona_models"
-        personas = []
-        
-        if os.path.exists(persona_dir):
-            for item in os.listdir(persona_dir):
-                if item.startswith(f"{user_id}_") and os.path.isdir(os.path.join(persona_dir, item)):
-                    persona_name = item.replace(f"{user_id}_", "")
-                    persona = clip_persona_studio.get_persona(user_id, persona_name)
-                    if persona:
-                        personas.append({
-                            'persona_name': persona.persona_name,
-                            'creation_date': persona.creation_date.isoformat(),
-                            'last_updated': persona.last_updated.isoformat(),
-                            'style_summary': persona.get_style_summary()
-                        })
+        # 人格摘要由 save_persona 维护在索引中，无需扫描目录
+        personas = [
+            {
+                'persona_name': summary['persona_name'],
+                'creation_date': summary['creation_date'],
+                'last_updated': summary['last_updated'],
+                'style_summary': summary['style_summary']
+            }
+            for summary in clip_persona_studio.list_personas(user_id)
+        ]
         
         return jsonify({
             'success': True,
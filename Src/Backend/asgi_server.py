@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+异步服务模式（ASGI）
+在 uvicorn 事件循环上运行现有的 Flask 应用：
+- 请求体由事件循环边接收边交给 WSGI 应用读取（缓冲有上限，读取跟不上时暂停接收），
+  分块上传、上传中分析与上传前的准入检查都能在数据到达时立即进行；客户端中途断开时应用读到的是已到达的部分
+- Flask 处理函数（LLM 调用、写盘等阻塞操作）在有界线程池中执行，事件循环始终不被阻塞
+- 响应体逐块在线程池中读取、在事件循环中发送，慢速客户端下载视频时不长期占用线程；
+  客户端断开后立即停止读取（uvicorn 对已关闭连接的 send 不会抛出异常，需单独监听 http.disconnect）
+- /jobs/<job_id>?wait=N 原生异步长轮询：等待中的连接只是一个协程，单进程可同时挂起数千个轮询连接
+- /jobs/<job_id>/events 原生异步进度事件流（SSE），订阅期间同样不占用线程
+- CPU 密集的剪辑与编码仍由 JobManager 的工作线程执行
+
+启动方式：
+    python asgi_server.py [--host 0.0.0.0] [--port 8000]
+或：
+    uvicorn asgi_server:create_app --factory --host 0.0.0.0 --port 8000
+"""
+
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any
+
+from progress import format_sse, SSE_KEEPALIVE_SECONDS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 请求体在内存中等待应用读取的缓冲上限，超过后暂停接收（背压）
+INPUT_BUFFER_BYTES = 1024 * 1024
+# 长轮询最长等待时间（秒）
+MAX_LONG_POLL_SECONDS = 60.0
+# 进度事件流检查任务状态变化的间隔（秒）
+EVENT_POLL_SECONDS = 0.5
+
+
+async def wait_for_disconnect(receive: Callable):
+    """等待客户端断开（http.disconnect）；请求体消息被丢弃。"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+class StreamingInput:
+    """
+    wsgi.input：事件循环一侧写入收到的请求体块，工作线程一侧阻塞读取。
+    缓冲达到上限时 feed() 等待应用读取后再继续，内存占用不随上传大小增长。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffer: int = INPUT_BUFFER_BYTES):
+        self._loop = loop
+        self._max_buffer = max_buffer
+        self._chunks: deque = deque()
+        self._buffered = 0
+        self._cond = threading.Condition()
+        self._eof = False
+        self._closed = False
+        self._space = asyncio.Event()
+        self._space.set()
+
+    # ---------- 事件循环侧 ----------
+    async def feed(self, chunk: bytes):
+        await self._space.wait()
+        with self._cond:
+            if self._closed:
+                # 应用已结束、不再读取请求体，丢弃剩余数据
+                return
+            self._chunks.append(chunk)
+            self._buffered += len(chunk)
+            if self._buffered >= self._max_buffer:
+                self._space.clear()
+            self._cond.notify_all()
+
+    def finish(self):
+        """请求体结束（正常结束或客户端断开），读取方读完缓冲后得到 EOF。"""
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def close(self):
+        """应用已结束：丢弃缓冲，之后收到的数据直接丢弃。"""
+        with self._cond:
+            self._closed = True
+            self._chunks.clear()
+            self._buffered = 0
+        self._space.set()
+
+    def _resume(self):
+        with self._cond:
+            if self._buffered < self._max_buffer:
+                self._space.set()
+
+    # ---------- 工作线程侧 ----------
+    def read(self, size: int = -1) -> bytes:
+        """size 为负数或 None 时阻塞直到请求体结束并返回全部内容；否则返回至多 size 字节的已到达数据。"""
+        if size is None or size < 0:
+            parts = []
+            while True:
+                chunk = self._read_available(self._max_buffer)
+                if not chunk:
+                    return b''.join(parts)
+                parts.append(chunk)
+        if size == 0:
+            return b''
+        return self._read_available(size)
+
+    def _read_available(self, size: int) -> bytes:
+        """等到有数据或请求体结束，取出至多 size 字节。"""
+        with self._cond:
+            while not self._chunks and not self._eof:
+                self._cond.wait()
+            parts, taken = [], 0
+            while self._chunks and taken < size:
+                chunk = self._chunks.popleft()
+                if taken + len(chunk) > size:
+                    keep = size - taken
+                    chunk, rest = chunk[:keep], chunk[keep:]
+                    self._chunks.appendleft(rest)
+                parts.append(chunk)
+                taken += len(chunk)
+            self._buffered -= taken
+        if taken:
+            self._loop.call_soon_threadsafe(self._resume)
+        return b''.join(parts)
+
+    def readline(self, size: int = -1) -> bytes:
+        line = bytearray()
+        while size is None or size < 0 or len(line) < size:
+            byte = self.read(1)
+            if not byte:
+                break
+            line += byte
+            if byte == b'\n':
+                break
+        return bytes(line)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class WSGIBridge:
+    """把 WSGI 应用包装为 ASGI 应用，阻塞部分全部交给有界线程池"""
+
+    def __init__(self, wsgi_app: Callable, max_workers: int = 64, input_buffer_bytes: int = INPUT_BUFFER_BYTES):
+        """
+        Args:
+            wsgi_app: WSGI 应用（Flask app）
+            max_workers: 同时执行 WSGI 处理函数的线程数上限
+            input_buffer_bytes: 请求体在内存中等待应用读取的缓冲上限
+        """
+        self.wsgi_app = wsgi_app
+        self.input_buffer_bytes = input_buffer_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope['type'] != 'http':
+            return
+        loop = asyncio.get_running_loop()
+
+        # 1. 后台接收请求体并交给 wsgi.input，请求体结束后继续监听客户端断开
+        body = StreamingInput(loop, self.input_buffer_bytes)
+        disconnected = asyncio.Event()
+        receiver = asyncio.ensure_future(self._receive_body(receive, body, disconnected))
+
+        # 2. 在线程池中执行 WSGI 应用（应用边读取请求体边处理），并取出第一个响应块
+        environ = self._build_environ(scope, body)
+        response: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        def call_app():
+            iterable = self.wsgi_app(environ, start_response)
+            iterator = iter(iterable)
+            return iterable, iterator, next(iterator, None)
+
+        iterable = None
+        try:
+            iterable, iterator, chunk = await loop.run_in_executor(self.executor, call_app)
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            # 3. 逐块读取（线程池）与发送（事件循环），每块之间不占用线程；客户端断开后不再读取
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            if disconnected.is_set():
+                logger.info(f"客户端已断开，停止发送响应: {scope['path']}")
+            else:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            body.close()
+            receiver.cancel()
+            if iterable is not None and hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+    @staticmethod
+    async def _receive_body(receive: Callable, body: StreamingInput, disconnected: asyncio.Event):
+        """把请求体逐块送入 body；请求体结束后继续等待 http.disconnect。"""
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+                chunk = message.get('body', b'')
+                if chunk:
+                    await body.feed(chunk)
+                if not message.get('more_body', False):
+                    break
+            body.finish()
+            await wait_for_disconnect(receive)
+            disconnected.set()
+        finally:
+            # 客户端中途断开时应用读完已到达的部分后得到 EOF
+            body.finish()
+
+    @staticmethod
+    def _build_environ(scope: Dict[str, Any], body) -> Dict[str, Any]:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            # 没有 Content-Length（分块传输）时读到 EOF 即为请求体结束
+            'wsgi.input_terminated': True,
+        }
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'CONTENT_LENGTH':
+                environ['CONTENT_LENGTH'] = value
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+class AsyncAPIServer:
+    """ASGI 入口：原生处理长轮询与进度事件流，其余请求交给 WSGIBridge"""
+
+    def __init__(self, wsgi_app: Callable, job_manager=None, max_workers: int = 64):
+        self.bridge = WSGIBridge(wsgi_app, max_workers=max_workers)
+        self.job_manager = job_manager
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if self.job_manager is not None and scope['method'] == 'GET' and scope['path'].startswith('/jobs/'):
+            if scope['path'].endswith('/events'):
+                await self._stream_job_events(scope['path'][len('/jobs/'):-len('/events')], receive, send)
+                return
+            wait = self._query_float(scope, 'wait')
+            if wait:
+                await self._long_poll_job(scope['path'][len('/jobs/'):], wait, receive, send)
+                return
+        await self.bridge(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.bridge.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _query_float(scope: Dict[str, Any], name: str) -> Optional[float]:
+        for pair in scope.get('query_string', b'').decode('latin-1').split('&'):
+            key, _, value = pair.partition('=')
+            if key == name:
+                try:
+                    return max(0.0, min(float(value), MAX_LONG_POLL_SECONDS))
+                except ValueError:
+                    return None
+        return None
+
+    async def _long_poll_job(self, job_id: str, wait: float, receive: Callable, send: Callable):
+        """任务结束或等待超时后返回任务状态，等待期间不占用任何线程；客户端断开时提前结束。"""
+        job = self.job_manager.get(job_id)
+        if job is None:
+            await self._send_json(send, 404, {"error": "任务不存在"})
+            return
+        if not job.done and job.future is not None:
+            loop = asyncio.get_running_loop()
+            finished = asyncio.Event()
+            job.future.add_done_callback(lambda _: loop.call_soon_threadsafe(finished.set))
+            waiter = asyncio.ensure_future(finished.wait())
+            disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+            try:
+                await asyncio.wait({waiter, disconnect}, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+                disconnect.cancel()
+            if disconnect.done() and not disconnect.cancelled():
+                return
+        await self._send_json(send, 200, {"status": "success", "job": job.to_dict()})
+
+    async def _stream_job_events(self, job_id: str, receive: Callable, send: Callable):
+        """
+        推送任务进度事件直到任务结束。
+        uvicorn 对已断开连接的 send 不会抛出异常，因此另起任务监听 http.disconnect，断开后立即停止推送。
+        """
+        job = self.job_manager.get(job_id)
+        if job is None:
+            await self._send_json(send, 404, {"error": "任务不存在"})
+            return
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            await self._push_job_events(job, disconnect, send)
+        finally:
+            disconnect.cancel()
+
+    async def _push_job_events(self, job, disconnect: asyncio.Future, send: Callable):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        loop = asyncio.get_running_loop()
+        version, stalled = job.version, job.stalled
+        last_sent = loop.time()
+        await send({'type': 'http.response.body', 'body': format_sse(job.to_dict()).encode('utf-8'), 'more_body': True})
+        while not job.done:
+            # 轮询间隔内客户端断开则结束（shield 避免超时时取消监听任务）
+            try:
+                await asyncio.wait_for(asyncio.shield(disconnect), EVENT_POLL_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if job.version != version or job.stalled != stalled:
+                version, stalled = job.version, job.stalled
+                message = format_sse(job.to_dict())
+            elif loop.time() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                message = ": keep-alive\n\n"
+            else:
+                continue
+            last_sent = loop.time()
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': format_sse(job.to_dict(), event='end').encode('utf-8'),
+                    'more_body': False})
+
+    @staticmethod
+    async def _send_json(send: Callable, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+def create_app() -> AsyncAPIServer:
+    """导入 Flask 应用并构建 ASGI 入口。"""
+    from api_server import app, job_manager
+    from config import ASYNC_WSGI_WORKERS
+    return AsyncAPIServer(app, job_manager=job_manager, max_workers=ASYNC_WSGI_WORKERS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ClipPersona API 异步服务模式')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level='info',
+                timeout_keep_alive=75, backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
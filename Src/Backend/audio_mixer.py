@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+音频混合引擎
+按整块（MoviePy 传入的时间数组）计算混音结果，替代逐个时间点分支判断的 combined_frame 闭包：
+- 每个音频片段记录在视频中的区间、音量与对原音频的处理方式（覆盖 / 叠加 / 压低）
+- 原音频的增益包络在添加片段时预先确定，计算时用 NumPy 掩码与插值一次求出整块增益
+- 单声道自动复制为立体声，多声道取前两个声道，全部以 (n, 2) 的数组运算
+- 同一音轨上多次添加片段时追加到同一个混音器，不层层嵌套；后加入片段的覆盖 / 压低对更早的片段同样生效
+"""
+
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 片段对原音频的处理方式
+MODE_OVERWRITE = 'overwrite'
+MODE_MIX = 'mix'
+MODE_DUCK = 'duck'
+
+# 压低原音频时的渐变时长（秒），避免音量突变产生爆音
+DUCK_RAMP_SECONDS = 0.2
+
+
+def to_channels(frames: np.ndarray, channels: int = 2) -> np.ndarray:
+    """把 (n,) / (n, c) 的音频块转换为 (n, channels)：单声道复制，多余声道丢弃。"""
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 1:
+        frames = frames[:, None]
+    if frames.shape[1] == channels:
+        return frames
+    if frames.shape[1] == 1:
+        return np.repeat(frames, channels, axis=1)
+    if frames.shape[1] > channels:
+        return frames[:, :channels]
+    # 声道数不足时用最后一个声道补齐
+    return np.concatenate([frames, np.repeat(frames[:, -1:], channels - frames.shape[1], axis=1)], axis=1)
+
+
+class AudioLayer:
+    """混音器中的一个音频片段"""
+
+    def __init__(self, source: Callable[[np.ndarray], np.ndarray], source_duration: float,
+                 start: float, end: float, gain: float = 1.0, mode: str = MODE_MIX,
+                 duck_gain: float = 1.0, ramp: float = 0.0):
+        """
+        Args:
+            source: 片段取样函数，参数为片段内的时间数组，返回 (n,) 或 (n, c)
+            source_duration: 片段时长（秒）
+            start / end: 片段在视频中的区间（秒）
+            gain: 片段音量倍数
+            mode: 对区间内原音频的处理：overwrite 静音、mix 保持、duck 压低到 duck_gain
+            duck_gain: duck 模式下原音频的音量倍数
+            ramp: duck 模式下原音频音量的渐变时长（秒）
+        """
+        if mode not in (MODE_OVERWRITE, MODE_MIX, MODE_DUCK):
+            raise ValueError(f"不支持的混音模式: {mode}")
+        self.source = source
+        self.source_duration = source_duration
+        self.start = start
+        self.end = end
+        self.gain = gain
+        self.mode = mode
+        self.duck_gain = 0.0 if mode == MODE_OVERWRITE else (duck_gain if mode == MODE_DUCK else 1.0)
+        self.ramp = ramp if mode == MODE_DUCK else 0.0
+
+    def base_gain(self, tt: np.ndarray) -> Optional[np.ndarray]:
+        """该片段施加在此前声音（原音频与更早的片段）上的增益包络；不影响时返回 None。"""
+        if self.duck_gain == 1.0:
+            return None
+        if self.ramp <= 0:
+            region = (tt >= self.start) & (tt <= self.end)
+            return np.where(region, self.duck_gain, 1.0)
+        ramp = min(self.ramp, (self.end - self.start) / 2)
+        return np.interp(tt, [self.start - ramp, self.start, self.end, self.end + ramp],
+                         [1.0, self.duck_gain, self.duck_gain, 1.0])
+
+    def active(self, tt: np.ndarray) -> np.ndarray:
+        """片段有声音的时间点掩码。"""
+        return (tt >= self.start) & (tt <= self.end) & (tt - self.start < self.source_duration)
+
+
+class AudioMixer:
+    """原音频 + 若干片段的整块混音"""
+
+    def __init__(self, base: Optional[Callable[[np.ndarray], np.ndarray]], duration: float,
+                 base_duration: Optional[float] = None, channels: int = 2):
+        """
+        Args:
+            base: 原音频取样函数（None 表示静音）
+            duration: 输出时长（秒）
+            base_duration: 原音频时长，超出部分视为静音
+            channels: 输出声道数
+        """
+        self.base = base
+        self.duration = duration
+        self.base_duration = duration if base_duration is None else base_duration
+        self.channels = channels
+        self.layers: List[AudioLayer] = []
+
+    def add_layer(self, layer: AudioLayer) -> AudioLayer:
+        self.layers.append(layer)
+        return layer
+
+    def make_frame(self, t):
+        """MoviePy 的 make_frame：t 为标量时返回 (channels,)，为数组时返回 (n, channels)。"""
+        scalar = np.ndim(t) == 0
+        tt = np.atleast_1d(np.asarray(t, dtype=np.float64))
+        out = np.zeros((len(tt), self.channels), dtype=np.float32)
+        inside = (tt >= 0) & (tt <= self.duration)
+
+        # 后加入的片段对之前的全部声音（原音频与更早的片段）生效，与逐次包裹音轨的结果一致：
+        # suffix[i] 为第 i 个片段之后所有片段增益包络的乘积
+        suffix = [None] * (len(self.layers) + 1)
+        suffix[-1] = np.ones(len(tt), dtype=np.float32)
+        for i in range(len(self.layers) - 1, -1, -1):
+            layer_gain = self.layers[i].base_gain(tt)
+            suffix[i] = suffix[i + 1] if layer_gain is None else suffix[i + 1] * layer_gain.astype(np.float32)
+
+        if self.base is not None:
+            base_mask = inside & (tt < self.base_duration) & (suffix[0] > 0)
+            if base_mask.any():
+                out[base_mask] = to_channels(self.base(tt[base_mask]), self.channels) * suffix[0][base_mask, None]
+
+        for i, layer in enumerate(self.layers):
+            gain = suffix[i + 1] * np.float32(layer.gain)
+            mask = inside & layer.active(tt) & (gain > 0)
+            if mask.any():
+                out[mask] += to_channels(layer.source(tt[mask] - layer.start), self.channels) * gain[mask, None]
+
+        return out[0] if scalar else out
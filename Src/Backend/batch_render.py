@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+批量渲染
+同一条指令应用到多个视频：指令只解析一次，解析出的操作分发到渲染进程池（process_pool，与并行分段渲染共用）中并行执行：
+- 每个视频在独立进程中解码/编码，吞吐量随 CPU 核数扩展，不受 GIL 限制
+- 按操作中的 editor= 参数选择 MoviePyVideoEditor 或 FFmpegVideoEditor；可融合的 MoviePy 操作直接以 ffmpeg 滤镜图渲染
+- 每个视频单独记录状态，单个失败不影响其他视频
+"""
+
+import os
+import logging
+from concurrent.futures import as_completed
+from typing import Dict, Any, List, Optional, Callable
+
+import process_pool
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 单项状态
+ITEM_QUEUED = 'queued'
+ITEM_SUCCEEDED = 'succeeded'
+ITEM_FAILED = 'failed'
+
+
+def editor_type_for(action_str: str, default: str = 'moviepy') -> str:
+    """读取操作中的 editor= 参数。"""
+    for part in (action_str or '').split()[2:]:
+        key, sep, value = part.partition('=')
+        if sep and key == 'editor' and value:
+            return value
+    return default
+
+
+def render_item(editor_type: str, video_path: str, action: str, output_path: str, profile=None) -> str:
+    """
+    在工作进程中执行：对单个视频应用操作并按渲染配置 profile 编码输出。
+    编辑器在子进程内导入，父进程无需加载 MoviePy。
+    """
+    from nlp_parser import OPERATIONS
+    from config import FUSED_RENDER_ENABLED, SMART_CUT_ENABLED, LOSSLESS_CONCAT_ENABLED
+    if editor_type == 'moviepy' and FUSED_RENDER_ENABLED:
+        from fused_render import render_fused
+        if render_fused(video_path, [action], output_path, OPERATIONS, smart_cut_enabled=SMART_CUT_ENABLED,
+                        profile=profile):
+            return output_path
+    if editor_type == 'moviepy' and LOSSLESS_CONCAT_ENABLED:
+        from concat_render import render_concat
+        if render_concat(video_path, [action], output_path, OPERATIONS, profile=profile):
+            return output_path
+    if editor_type == 'ffmpeg':
+        from ffmpeg_editor import FFmpegVideoEditor
+        editor = FFmpegVideoEditor(video_path)
+    elif editor_type == 'moviepy':
+        from moviepy_editor import MoviePyVideoEditor
+        editor = MoviePyVideoEditor(video_path)
+    else:
+        raise ValueError(f"不支持的编辑器类型: {editor_type}")
+    try:
+        if profile is not None:
+            editor.render_profile = profile
+        if not editor.execute_action(action, OPERATIONS):
+            raise ValueError("操作执行失败，请检查参数是否正确")
+        editor.output_path = output_path
+        editor.save()
+    finally:
+        editor.close()
+    if not os.path.exists(output_path):
+        raise Exception("处理后的视频文件未生成")
+    return output_path
+
+
+class BatchRenderer:
+    """共用进程池上的批量渲染执行器"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: 工作进程数，默认取 CPU 核数（共用进程池由首次使用的一方按该值创建）
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self, job, tasks: List[Dict[str, Any]],
+            on_success: Optional[Callable[[Dict[str, Any]], None]] = None,
+            worker: Callable[..., str] = render_item) -> List[Dict[str, Any]]:
+        """
+        并行执行 tasks，并把每项状态写入 task['item']。
+
+        Args:
+            job: RenderJob，用于上报整体进度
+            tasks: [{'item', 'editor_type', 'video_path', 'action', 'output_path', 'profile'(可选)}, ...]
+            on_success: 单项成功后在父进程中调用（如登记渲染缓存），其异常计为该项失败
+            worker: 子进程中执行的函数（需可被 pickle）
+        """
+        items = [task['item'] for task in tasks]
+        if not tasks:
+            return items
+        executor = process_pool.get_executor(self.max_workers)
+        futures = {
+            executor.submit(worker, t['editor_type'], t['video_path'], t['action'], t['output_path'],
+                            **({'profile': t['profile']} if t.get('profile') is not None else {})): t
+            for t in tasks
+        }
+        finished = 0
+        for future in as_completed(futures):
+            task = futures[future]
+            item = task['item']
+            try:
+                future.result()
+                if on_success is not None:
+                    on_success(task)
+                item['status'] = ITEM_SUCCEEDED
+            except Exception as e:
+                item['status'] = ITEM_FAILED
+                item['error'] = str(e)
+                logger.error(f"批量渲染失败 {task['video_path']}: {e}")
+            finished += 1
+            job.update(progress=finished / len(tasks), stage=f"已完成 {finished}/{len(tasks)}")
+        return items
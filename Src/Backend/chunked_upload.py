@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+可续传的分块上传
+面向移动网络的大视频上传协议：
+1. 创建会话：声明文件名、总大小与（可选）内容摘要，服务器预分配文件
+2. 上传分块：按任意顺序或并行 PUT 字节区间，直接流式写入对应偏移，不在内存中缓冲整个文件
+3. 查询进度：返回已收到的区间与缺失区间，断线后只需补传缺失部分
+4. 完成上传：确认所有区间到齐并校验摘要，文件移入内容寻址存储
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from typing import Dict, Any, List, Optional, BinaryIO
+
+from content_store import ContentStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionError(ValueError):
+    """上传会话相关的错误（会话不存在、区间越界、摘要不匹配等）"""
+
+
+def merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """合并半开区间 [start, end)，相邻或重叠的区间合为一个。"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(received: List[List[int]], size: int) -> List[List[int]]:
+    """根据已收到的区间计算缺失区间。"""
+    missing = []
+    cursor = 0
+    for start, end in received:
+        if start > cursor:
+            missing.append([cursor, start])
+        cursor = max(cursor, end)
+    if cursor < size:
+        missing.append([cursor, size])
+    return missing
+
+
+class UploadSessionManager:
+    """管理分块上传会话，会话数据保存在 root 目录下，服务重启后可继续上传"""
+
+    def __init__(self, content_store: ContentStore, root: str = 'uploads/.sessions',
+                 chunk_size: int = 1024 * 1024, max_age: float = 24 * 3600):
+        """
+        Args:
+            content_store: 完成上传后写入的内容存储
+            root: 会话数据目录
+            chunk_size: 流式写盘时每次读取的字节数
+            max_age: 未完成会话的保留时长（秒），超时后清理
+        """
+        self.content_store = content_store
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_age = max_age
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- 会话文件 ----------
+    def _session_dir(self, session_id: str) -> str:
+        # 会话 ID 只允许十六进制字符，防止路径穿越
+        if not session_id or not all(c in '0123456789abcdef' for c in session_id):
+            raise UploadSessionError(f"无效的会话 ID: {session_id}")
+        return os.path.join(self.root, session_id)
+
+    def _data_path(self, session_id: str) -> str:
+        return os.path.join(self._session_dir(session_id), 'data.part')
+
+    def data_path(self, session_id: str) -> str:
+        """会话数据文件（预分配为完整大小，已收到的区间见 status）。"""
+        return self._data_path(session_id)
+
+    def _meta_path(self, session_id: str) -> str:
+        return os.path.join(self._session_dir(session_id), 'meta.json')
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def _load_meta(self, session_id: str) -> Dict[str, Any]:
+        meta_path = self._meta_path(session_id)
+        if not os.path.exists(meta_path):
+            raise UploadSessionError(f"上传会话不存在: {session_id}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_meta(self, session_id: str, meta: Dict[str, Any]):
+        meta_path = self._meta_path(session_id)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    # ---------- 协议操作 ----------
+    @staticmethod
+    def _parse_size(size: Any) -> int:
+        """客户端给出的文件大小：接受正整数或整数字符串，其他值（含布尔值、小数）报错。"""
+        if isinstance(size, bool) or (isinstance(size, float) and not size.is_integer()):
+            raise UploadSessionError(f"size 必须为正整数: {size}")
+        try:
+            value = int(size)
+        except (TypeError, ValueError, OverflowError):
+            raise UploadSessionError(f"size 必须为正整数: {size}")
+        if value <= 0:
+            raise UploadSessionError(f"size 必须为正整数: {size}")
+        return value
+
+    def create(self, filename: str, size: Any, digest: Optional[str] = None) -> Dict[str, Any]:
+        """创建上传会话并预分配目标文件。"""
+        size = self._parse_size(size)
+        self.expire_stale()
+        session_id = uuid.uuid4().hex
+        os.makedirs(self._session_dir(session_id))
+        with open(self._data_path(session_id), 'wb') as f:
+            f.truncate(size)
+        meta = {
+            'session_id': session_id,
+            'filename': filename,
+            'size': size,
+            'digest': digest.lower() if digest else None,
+            'received': [],
+            'created_at': time.time(),
+            'updated_at': time.time(),
+        }
+        self._save_meta(session_id, meta)
+        logger.info(f"创建上传会话 {session_id}: {filename} ({size} bytes)")
+        return self._describe(meta)
+
+    def write_range(self, session_id: str, start: int, stream: BinaryIO,
+                    length: Optional[int] = None) -> Dict[str, Any]:
+        """
+        将请求体流式写入 [start, start+length)。
+        连接中途断开时，只记录实际写入的部分，客户端可据此续传。
+        """
+        meta = self._load_meta(session_id)
+        size = meta['size']
+        if start < 0 or start >= size:
+            raise UploadSessionError(f"起始偏移 {start} 超出文件大小 {size}")
+        if length is not None and start + length > size:
+            raise UploadSessionError(f"区间结束 {start + length} 超出文件大小 {size}")
+        limit = size - start if length is None else length
+
+        written = 0
+        try:
+            with open(self._data_path(session_id), 'r+b') as f:
+                f.seek(start)
+                while written < limit:
+                    chunk = stream.read(min(self.chunk_size, limit - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+        finally:
+            # 无论是否中断，已写入的字节都记为已收到
+            if written:
+                with self._lock_for(session_id):
+                    meta = self._load_meta(session_id)
+                    meta['received'] = merge_ranges(meta['received'] + [[start, start + written]])
+                    meta['updated_at'] = time.time()
+                    self._save_meta(session_id, meta)
+
+        if length is not None and written < length:
+            logger.warning(f"会话 {session_id} 区间 {start}+{length} 只收到 {written} bytes")
+        return self.status(session_id)
+
+    def status(self, session_id: str) -> Dict[str, Any]:
+        return self._describe(self._load_meta(session_id))
+
+    def finalize(self, session_id: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """确认所有区间到齐、校验摘要并移入内容存储。"""
+        with self._lock_for(session_id):
+            meta = self._load_meta(session_id)
+            missing = missing_ranges(meta['received'], meta['size'])
+            if missing:
+                raise UploadSessionError(f"仍有 {len(missing)} 个区间未上传: {missing[:5]}")
+
+            data_path = self._data_path(session_id)
+            actual = ContentStore.file_digest(data_path, self.chunk_size)
+            expected = (digest or meta.get('digest') or '').lower()
+            if expected and expected != actual:
+                raise UploadSessionError(f"内容摘要不匹配: 期望 {expected}，实际 {actual}")
+
+            record = self.content_store.add_file(data_path, meta['filename'], digest=actual)
+            shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+        with self._locks_guard:
+            self._locks.pop(session_id, None)
+        logger.info(f"上传会话 {session_id} 已完成: {record['name']}")
+        return record
+
+    def abort(self, session_id: str):
+        shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+        with self._locks_guard:
+            self._locks.pop(session_id, None)
+
+    def expire_stale(self):
+        """清理超过保留时长仍未完成的会话。"""
+        now = time.time()
+        for session_id in os.listdir(self.root):
+            try:
+                meta = self._load_meta(session_id)
+            except (UploadSessionError, OSError, ValueError):
+                continue
+            if now - meta.get('updated_at', 0) > self.max_age:
+                logger.info(f"清理过期上传会话: {session_id}")
+                self.abort(session_id)
+
+    def _describe(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        received = meta['received']
+        return {
+            'session_id': meta['session_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'received': received,
+            'received_bytes': sum(end - start for start, end in received),
+            'missing': missing_ranges(received, meta['size']),
+            'complete': not missing_ranges(received, meta['size']),
+        }
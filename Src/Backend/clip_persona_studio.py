@@ -10,6 +10,9 @@ from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+from persona_index import get_persona_index
+import media_probe
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -219,6 +222,21 @@ class ClipPersona:
             'scaler': StandardScaler().fit([self.style_vector.to_vector()])
         }
         joblib.dump(vector_model, f"{self.model_dir}/style_model.pkl")
+
+        # 同步更新人格索引，列表接口无需再读取 persona.json
+        get_persona_index().update(self.user_id, self.persona_name, self.index_summary())
+
+    def index_summary(self) -> Dict[str, Any]:
+        """人格索引中保存的摘要（不含剪辑历史与训练数据）"""
+        style_summary = self.get_style_summary()
+        style_summary['average_rating'] = float(style_summary['average_rating'])
+        return {
+            'user_id': self.user_id,
+            'persona_name': self.persona_name,
+            'creation_date': self.creation_date.isoformat(),
+            'last_updated': self.last_updated.isoformat(),
+            'style_summary': style_summary
+        }
     
     def load_persona(self):
         """加载人格数据"""
@@ -280,6 +298,11 @@ class ClipPersonaStudio:
         # 创建必要的目录
         os.makedirs("persona_models", exist_ok=True)
         os.makedirs("training_data", exist_ok=True)
+
+        # 首次启用索引时，从已有的人格目录重建一次
+        self.persona_index = get_persona_index("persona_models")
+        if not self.persona_index.exists:
+            self.rebuild_persona_index()
     
     def create_persona(self, user_id: str, persona_name: str) -> ClipPersona:
         """创建新的人格"""
@@ -296,6 +319,28 @@ class ClipPersonaStudio:
             self.personas[key] = persona
         return self.personas[key]
     
+    def list_personas(self, user_id: str) -> List[Dict[str, Any]]:
+        """从人格索引列出用户的全部人格摘要"""
+        return self.persona_index.list(user_id)
+
+    def rebuild_persona_index(self):
+        """扫描 persona_models 目录，重建人格索引"""
+        summaries = []
+        for item in os.listdir("persona_models"):
+            persona_file = os.path.join("persona_models", item, "persona.json")
+            if not os.path.isfile(persona_file):
+                continue
+            try:
+                with open(persona_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                persona = ClipPersona(data['user_id'], data['persona_name'])
+                persona.load_persona()
+                summaries.append(persona.index_summary())
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"跳过无法读取的人格 {item}: {e}")
+        self.persona_index.update_many(summaries)
+        logger.info(f"人格索引已重建: {len(summaries)} 个人格")
+
     def analyze_video_preferences(self, persona: ClipPersona, video_path: str) -> Dict[str, Any]:
         """分析视频偏好"""
         logger.info(f"开始分析视频偏好: {video_path}")
@@ -508,7 +553,7 @@ class VideoAnalyzer:
         cap = cv2.VideoCapture(video_path)
         
         analysis = {
-            'basic_info': self._get_basic_info(cap),
+            'basic_info': self._get_basic_info(cap, video_path),
             'rhythm_analysis': self._analyze_rhythm(cap),
             'visual_analysis': self._analyze_visual_features(cap),
             'content_analysis': self._analyze_content(cap)
@@ -517,8 +562,12 @@ class VideoAnalyzer:
         cap.release()
         return analysis
     
-    def _get_basic_info(self, cap) -> Dict[str, Any]:
-        """获取基本信息"""
+    def _get_basic_info(self, cap, video_path: Optional[str] = None) -> Dict[str, Any]:
+        """获取基本信息（优先读取上传时探测的元数据）"""
+        if video_path:
+            info = media_probe.basic_info(media_probe.get_metadata(video_path))
+            if info:
+                return info
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+无损合并
+只由无转场的 concatenate / concatenate_multiple 组成的操作链，不再把每个输入作为 VideoFileClip 打开、
+在画布上合成后整体重新编码：
+- 所有输入的编码、分辨率、帧率、像素格式与音频布局一致时（同一部手机拍摄的片段），用 concat 分离器直接复制码流
+- 不一致时以第一个视频为准确定目标格式（画面取最大宽高并居中补黑边、帧率取最大值，与 MoviePy 的 compose 一致），
+  只按渲染配置转码不符合的输入，其余输入只做封装转换，再以 MPEG-TS 无损拼接
+- 带旋转信息的输入格式不一致、操作链中有转场、或渲染配置限制分辨率 / 码率时不适用，仍走 MoviePy
+MoviePy 合并（MoviePyVideoEditor）共用这里的画布尺寸与补边逻辑：尺寸一致时直接首尾相接，
+不一致时先用 ffmpeg 把输入文件一次性补边到统一尺寸（写入该次渲染的工作目录），不再逐帧在画布上合成。
+"""
+
+import os
+import shutil
+import tempfile
+import logging
+import subprocess
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import media_probe
+import progress
+from fused_render import parse_action
+from render_profiles import RenderProfile, default_profile, source_h264_args
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CONCAT_OPERATIONS = {'concatenate', 'concatenate_multiple'}
+# 转码后可与 H.264 码流直接拼接的像素格式
+NORMALIZE_PIX_FMTS = {'yuv420p', 'yuvj420p'}
+
+
+def concat_inputs(video_path: str, actions: List[str], operations: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    操作链可走无损合并时返回按顺序排列的输入文件，否则返回 None。
+    缺失文件的处理与 MoviePyVideoEditor 相同：concatenate 报错，concatenate_multiple 跳过。
+    """
+    if not actions:
+        return None
+    inputs = [video_path]
+    for action in actions:
+        item = parse_action(action, operations, allowed=CONCAT_OPERATIONS)
+        if item is None:
+            return None
+        name, params = item
+        if params.get('transition', 'none') != 'none':
+            return None
+        if name == 'concatenate':
+            if not os.path.exists(params['second_video']):
+                raise FileNotFoundError(f"第二个视频文件 {params['second_video']} 不存在")
+            inputs.append(params['second_video'])
+        else:
+            for path in params['video_files']:
+                if os.path.exists(path):
+                    inputs.append(path)
+                else:
+                    logger.warning(f"视频文件不存在，跳过: {path}")
+    return inputs if len(inputs) > 1 else None
+
+
+def _video_format(meta: Dict[str, Any]) -> tuple:
+    video = meta['video']
+    return (video['codec'], video['width'], video['height'], round(video['fps'], 3),
+            video['pix_fmt'], video['rotation'])
+
+
+def _h264_format(meta: Dict[str, Any]) -> tuple:
+    return meta['video'].get('profile'), meta['video'].get('level')
+
+
+def _audio_format(meta: Dict[str, Any]) -> Optional[tuple]:
+    audio = meta.get('audio')
+    if not audio:
+        return None
+    return (audio['codec'], audio['sample_rate'], audio['channels'])
+
+
+def plan_concat(metas: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    决定合并方式：
+    - {'mode': 'copy'}：全部一致，直接复制
+    - {'mode': 'normalize', 'target': {...}, 'transcode': [bool, ...]}：只转码不符合目标格式的输入
+    - None：不适用
+    """
+    signatures = [(_video_format(m), _h264_format(m), _audio_format(m)) for m in metas]
+    if all(sig == signatures[0] for sig in signatures):
+        return {'mode': 'copy'}
+
+    reference = metas[0]['video']
+    if any(m['video']['rotation'] for m in metas) or reference['pix_fmt'] not in NORMALIZE_PIX_FMTS:
+        return None
+    audio_ref = next((m['audio'] for m in metas if m.get('audio')), None)
+    width, height = canvas_size([(m['video']['width'], m['video']['height']) for m in metas])
+    target = {
+        'codec': 'h264',
+        'width': width,
+        'height': height,
+        'fps': max(m['video']['fps'] for m in metas),
+        'pix_fmt': reference['pix_fmt'],
+        'audio': ('aac', audio_ref['sample_rate'], audio_ref['channels']) if audio_ref else None,
+    }
+    video_target = (target['codec'], target['width'], target['height'], round(target['fps'], 3),
+                    target['pix_fmt'], 0)
+    # 转码部分沿用第一个可直接复制的输入的 profile / level，使拼接后的码流参数一致；
+    # 没有可复制的输入时全部转码，由 x264 决定
+    copyable = next((m for m in metas if _video_format(m) == video_target), None)
+    target['profile'], target['level'] = _h264_format(copyable) if copyable else (None, None)
+    transcode = [_video_format(m) != video_target or _h264_format(m) != (target['profile'], target['level'])
+                 or _audio_format(m) != target['audio'] for m in metas]
+    return {'mode': 'normalize', 'target': target, 'transcode': transcode}
+
+
+def canvas_size(sizes: Sequence[Tuple[int, int]]) -> Tuple[int, int]:
+    """合并后的画面尺寸：与 MoviePy 的 compose 相同，取各输入的最大宽高。"""
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
+def pad_frame(frame: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """把 (h, w, c) 画面居中放到 size 的黑色画布上（与 compose 的 'center' 位置一致）。"""
+    w, h = size
+    if frame.shape[1] == w and frame.shape[0] == h:
+        return frame
+    out = np.zeros((h, w) + frame.shape[2:], dtype=frame.dtype)
+    x, y = (w - frame.shape[1]) // 2, (h - frame.shape[0]) // 2
+    out[y:y + frame.shape[0], x:x + frame.shape[1]] = frame
+    return out
+
+
+def pad_command(path: str, size: Tuple[int, int], output_path: str,
+                profile: Optional[RenderProfile] = None) -> List[str]:
+    """把输入文件补边到 size 的 ffmpeg 命令（视频按渲染配置的 preset / CRF 编码，音频直接复制），供 MoviePy 合并前一次性规范化。"""
+    profile = profile or default_profile()
+    w, h = size
+    return ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', path,
+            '-vf', f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:color=black",
+            '-c:v', 'libx264', '-preset', profile.preset, '-crf', str(profile.crf), '-pix_fmt', 'yuv420p',
+            '-c:a', 'copy', output_path]
+
+
+def _concat_line(path: str) -> str:
+    escaped = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def _video_args(target: Dict[str, Any], profile: RenderProfile) -> List[str]:
+    """
+    按渲染配置的 preset / CRF 转码的视频参数；像素格式与 H.264 profile / level 保持目标格式，
+    以便与直接复制的输入拼接。
+    """
+    params = profile.video_params(target['fps'])
+    params[params.index('-pix_fmt') + 1] = target['pix_fmt']
+    for flag in ('-profile:v', '-level'):
+        if flag in params:
+            index = params.index(flag)
+            del params[index:index + 2]
+    args = ['-c:v', 'libx264', '-preset', profile.preset] + params + source_h264_args(
+        {'codec': 'h264', 'profile': target.get('profile'), 'level': target.get('level')})
+    if profile.threads:
+        args += ['-threads', str(profile.threads)]
+    return args
+
+
+def _normalize_command(path: str, meta: Dict[str, Any], target: Dict[str, Any], transcode: bool,
+                       output_path: str, profile: RenderProfile) -> List[str]:
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', path]
+    if not transcode:
+        maps = ['-map', '0:v:0'] + (['-map', '0:a:0'] if target['audio'] else [])
+        return command + maps + ['-c', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts', output_path]
+
+    maps = ['-map', '0:v:0']
+    if target['audio']:
+        _, sample_rate, channels = target['audio']
+        if meta.get('audio'):
+            maps += ['-map', '0:a:0']
+        else:
+            # 没有音轨的输入补静音（与 MoviePy 的 _ensure_audio_track 一致）
+            duration = meta.get('duration') or meta['video']['duration']
+            command += ['-f', 'lavfi', '-t', f"{duration:.6f}", '-i', f"anullsrc=r={sample_rate}:cl=stereo"]
+            maps += ['-map', '1:a:0']
+    # 小于画布的输入居中补黑边，与 compose 的效果相同
+    video_filter = (f"pad={target['width']}:{target['height']}:(ow-iw)/2:(oh-ih)/2:color=black,"
+                    f"fps={target['fps']:.6f},format={target['pix_fmt']}")
+    command += maps + ['-vf', video_filter] + _video_args(target, profile)
+    if target['audio']:
+        command += ['-c:a', 'aac', '-b:a', f"{profile.audio_bitrate}k", '-ar', str(sample_rate), '-ac', str(channels)]
+    return command + ['-f', 'mpegts', output_path]
+
+
+def build_commands(inputs: List[str], metas: List[Dict[str, Any]], plan: Dict[str, Any],
+                   work_dir: str, output_path: str, profile: Optional[RenderProfile] = None) -> List[List[str]]:
+    """生成合并所需的 ffmpeg 命令（最后一条为拼接），需要转码的输入按渲染配置编码。"""
+    profile = profile or default_profile()
+    list_path = os.path.join(work_dir, 'inputs.txt')
+    commands, entries = [], []
+    if plan['mode'] == 'copy':
+        entries = inputs
+    else:
+        for i, (path, meta) in enumerate(zip(inputs, metas)):
+            part_path = os.path.join(work_dir, f"part_{i:02d}.ts")
+            commands.append(_normalize_command(path, meta, plan['target'], plan['transcode'][i], part_path,
+                                               profile))
+            entries.append(part_path)
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.writelines(_concat_line(path) for path in entries)
+
+    concat = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+              '-map', '0:v', '-map', '0:a?', '-c', 'copy']
+    if plan['mode'] == 'normalize' and plan['target']['audio']:
+        concat += ['-bsf:a', 'aac_adtstoasc']
+    commands.append(concat + profile.container_params() + [output_path])
+    return commands
+
+
+def render_concat(video_path: str, actions: List[str], output_path: str, operations: Dict[str, Any],
+                  profile: Optional[RenderProfile] = None) -> bool:
+    """
+    尝试以无损合并执行操作链。
+
+    Returns:
+        bool: True 表示已输出到 output_path；False 表示不适用或执行失败，调用方应改用 MoviePy
+    """
+    profile = profile or default_profile()
+    if not profile.allows_stream_copy:
+        return False
+    inputs = concat_inputs(video_path, actions, operations)
+    if inputs is None:
+        return False
+    metas = [media_probe.get_metadata(path) for path in inputs]
+    if any(not meta or not meta.get('video') for meta in metas):
+        return False
+    plan = plan_concat(metas)
+    if plan is None:
+        return False
+
+    work_dir = tempfile.mkdtemp(prefix='concat_', dir=os.path.dirname(os.path.abspath(output_path)))
+    tmp_path = os.path.join(work_dir, 'output.mp4')
+    try:
+        commands = build_commands(inputs, metas, plan, work_dir, tmp_path, profile)
+        reporter = progress.current()
+        reporter.begin('合并视频', len(commands), 'steps')
+        for command in commands:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+            reporter.advance()
+        os.replace(tmp_path, output_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"无损合并失败，改用 MoviePy: {getattr(e, 'stderr', None) or e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    transcoded = sum(plan.get('transcode', []))
+    logger.info(f"已合并 {len(inputs)} 段视频（{plan['mode']}，转码 {transcoded} 段）: {output_path}")
+    return True
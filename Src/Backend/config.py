@@ -5,6 +5,65 @@ URI = '/vivogpt/completions'
 DOMAIN = 'api-ai.vivo.com.cn'
 METHOD = 'POST'
 
+# 渲染任务队列配置：None 表示按 CPU 核数限制并发编码数
+RENDER_MAX_WORKERS = None
+# 仅由 trim/speed/音量/旋转/裁剪画面/亮度/对比度组成的操作链编译为单个 ffmpeg 滤镜图渲染，不经 MoviePy 逐帧处理
+FUSED_RENDER_ENABLED = True
+# 只有时间裁剪（trim）时使用智能剪切：完整 GOP 直接复制码流，仅重新编码切点所在的 GOP
+SMART_CUT_ENABLED = True
+# 无转场合并时直接拼接码流（格式一致时全部复制，不一致时只转码不符合的输入）
+LOSSLESS_CONCAT_ENABLED = True
+# 渲染配置：未指定时成片使用的配置、预览使用的配置，以及基准测试推荐参数的覆盖文件（见 render_profiles.py）
+DEFAULT_RENDER_PROFILE = 'share'
+PREVIEW_RENDER_PROFILE = 'draft'
+RENDER_PROFILES_FILE = 'uploads/.render_profiles.json'
+# 长视频导出时把时间轴切成多段，在多个进程中并行编码后无损拼接；工作进程数（None 表示 CPU 核数）、
+# 启用并行的最短时长（秒）与每段最短时长（秒）
+PARALLEL_RENDER_ENABLED = True
+PARALLEL_RENDER_WORKERS = None
+PARALLEL_RENDER_MIN_SECONDS = 60.0
+PARALLEL_SEGMENT_MIN_SECONDS = 10.0
+# 运行中的任务超过该秒数没有任何进度上报即标记为停滞（stalled），用于告警与客户端提示
+JOB_STALL_SECONDS = 120
+
+# 是否为每个编辑输出额外生成 HLS 分段（fMP4 + m3u8），以及目标分段时长（秒）
+HLS_ENABLED = True
+HLS_SEGMENT_SECONDS = 4.0
+
+# 上传后生成低分辨率代理文件，用于快速预览（preview=true）
+PROXY_ENABLED = True
+PROXY_HEIGHT = 360
+
+# 渲染结果缓存的磁盘容量上限（字节），超出后按最近访问时间淘汰
+RENDER_CACHE_MAX_BYTES = 10 * 1024 ** 3
+
+# 磁盘容量管理：uploads 等目录下受管文件的总字节预算，超出后先淘汰派生文件、最后淘汰原始视频
+STORAGE_BUDGET_BYTES = 50 * 1024 ** 3
+# 后台检查间隔（秒），以及修改时间在多少秒内的文件视为仍在写入、不淘汰
+STORAGE_SWEEP_SECONDS = 300
+STORAGE_MIN_AGE_SECONDS = 600
+
+# 边上传边分析：镜头切换、缩略图与响度在上传过程中由 ffmpeg 流式完成
+INGEST_ANALYSIS_ENABLED = True
+INGEST_SCENE_THRESHOLD = 0.3
+INGEST_THUMBNAIL_INTERVAL = 5.0
+# 单个上传等待送入分析的最大缓冲（字节），超出时改为上传完成后分析
+INGEST_MAX_BUFFER_BYTES = 64 * 1024 * 1024
+
+# 异步服务模式（asgi_server.py）下执行 Flask 处理函数的线程数
+ASYNC_WSGI_WORKERS = 64
+
+# 批量处理：工作进程数（None 表示 CPU 核数）与单次最多视频数
+BATCH_MAX_WORKERS = None
+BATCH_MAX_ITEMS = 200
+
+# 准入控制：各类请求（render/analyze/segment/batch）的并发上限，未指定的按 CPU 核数与内存推算
+ADMISSION_LIMITS = {}
+# 各类请求的等待队列长度，队列满时直接返回 429
+ADMISSION_MAX_QUEUE = {'render': 32, 'analyze': 8, 'segment': 2, 'batch': 4}
+# 同步接口（视频分析）等待运行名额的最长时间（秒）
+ADMISSION_WAIT_SECONDS = 30.0
+
 # 系统提示词配置
 SYSTEM_PROMPT = (
     # 1) 角色 & 输出格式 --------------------------------------------------
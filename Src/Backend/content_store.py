@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+内容寻址的上传存储
+按文件内容的 SHA256 摘要存放上传视频，取代按原始文件名分配 001.mp4 的方式：
+- 不同设备上传同名文件不会互相覆盖
+- 相同内容只存一份，不论原始文件名是什么
+- 摘要索引持久化到磁盘，服务重启后仍可判断“已上传”
+- 额外记录“部分哈希 + 文件大小”，可在计算完整摘要前做快速预检
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, BinaryIO
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 部分哈希参数：与遗物/Code/web.py::_get_partial_file_hash 保持一致（前 10 个 4KB 块）
+PARTIAL_CHUNK_SIZE = 4096
+PARTIAL_NUM_CHUNKS = 10
+
+
+class ContentStore:
+    """以内容摘要为键的视频存储，索引保存在 root 目录下的 JSON 文件中"""
+
+    def __init__(self, root: str = 'uploads', index_name: str = 'content_index.json',
+                 chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            root: 存储目录
+            index_name: 索引文件名（位于 root 下）
+            chunk_size: 流式写盘时每次读取的字节数
+        """
+        self.root = root
+        self.index_path = os.path.join(root, index_name)
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    # ---------- 索引持久化 ----------
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('objects', {})
+                data.setdefault('partial', {})
+                logger.info(f"已加载内容索引: {len(data['objects'])} 个对象")
+                return data
+            except (OSError, ValueError) as e:
+                logger.error(f"读取内容索引失败，将重建: {e}")
+        return {'objects': {}, 'partial': {}}
+
+    def _save_index_locked(self):
+        # 先写临时文件再替换，避免进程中断时留下半个索引
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    # ---------- 哈希 ----------
+    @staticmethod
+    def partial_hash(file: BinaryIO, chunk_size: int = PARTIAL_CHUNK_SIZE,
+                     num_chunks: int = PARTIAL_NUM_CHUNKS) -> str:
+        """计算文件开头若干块的 SHA256，用于快速预检（需配合文件大小使用）。"""
+        file.seek(0)
+        hash_object = hashlib.sha256()
+        for _ in range(num_chunks):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            hash_object.update(chunk)
+        file.seek(0)
+        return hash_object.hexdigest()
+
+    @staticmethod
+    def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+        """计算整个文件的 SHA256 摘要。"""
+        hash_object = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hash_object.update(chunk)
+        return hash_object.hexdigest()
+
+    @staticmethod
+    def _partial_key(partial_hash: str, size: int) -> str:
+        return f"{int(size)}:{partial_hash}"
+
+    # ---------- 存取 ----------
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def lookup(self, digest: str) -> Optional[Dict[str, Any]]:
+        """按完整摘要查找对象，文件已被删除时视为不存在。"""
+        digest = (digest or '').lower()
+        with self._lock:
+            record = self._index['objects'].get(digest)
+            if record is None:
+                return None
+            if not os.path.exists(self.path_for(record['name'])):
+                return None
+            record['last_access'] = time.time()
+            return dict(record)
+
+    def resolve(self, reference: str) -> Optional[Dict[str, Any]]:
+        """
+        按客户端给出的引用（完整摘要、对象名或 path_for 返回的路径）查找对象。
+        其他任何路径都视为不存在，客户端不能借此引用存储目录以外的文件。
+        """
+        reference = reference or ''
+        record = self.lookup(os.path.splitext(os.path.basename(reference))[0])
+        if record is None or reference not in (record['digest'], record['name'], self.path_for(record['name'])):
+            return None
+        return record
+
+    def lookup_partial(self, partial_hash: str, size: int) -> List[Dict[str, Any]]:
+        """按部分哈希与大小查找候选对象（可能存在碰撞，需以完整摘要确认）。"""
+        key = self._partial_key((partial_hash or '').lower(), size)
+        with self._lock:
+            digests = self._index['partial'].get(key, [])
+            return [dict(self._index['objects'][d]) for d in digests if d in self._index['objects']]
+
+    def save_upload(self, stream: BinaryIO, original_filename: str) -> Dict[str, Any]:
+        """
+        流式保存上传内容，边写盘边计算摘要；已有相同内容时丢弃新副本。
+
+        Returns:
+            Dict: 对象记录，附加 deduplicated 字段表示是否命中已有内容
+        """
+        ext = os.path.splitext(original_filename or '')[1].lower() or '.mp4'
+        tmp_path = self.path_for(f".incoming_{uuid.uuid4().hex}.part")
+        full_hash = hashlib.sha256()
+        head_hash = hashlib.sha256()
+        head_limit = PARTIAL_CHUNK_SIZE * PARTIAL_NUM_CHUNKS
+        head_seen = 0
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    full_hash.update(chunk)
+                    if head_seen < head_limit:
+                        head = chunk[:head_limit - head_seen]
+                        head_hash.update(head)
+                        head_seen += len(head)
+                    size += len(chunk)
+            return self._commit(tmp_path, full_hash.hexdigest(), head_hash.hexdigest(),
+                                size, ext, original_filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_file(self, path: str, original_filename: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """将磁盘上已有的文件移入存储（文件会被移动，或在内容重复时删除）。"""
+        ext = os.path.splitext(original_filename or path)[1].lower() or '.mp4'
+        digest = digest or self.file_digest(path)
+        with open(path, 'rb') as f:
+            partial = self.partial_hash(f)
+        size = os.path.getsize(path)
+        try:
+            return self._commit(path, digest, partial, size, ext, original_filename)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _commit(self, tmp_path: str, digest: str, partial: str, size: int,
+                ext: str, original_filename: str) -> Dict[str, Any]:
+        with self._lock:
+            record = self._index['objects'].get(digest)
+            deduplicated = record is not None and os.path.exists(self.path_for(record['name']))
+            if not deduplicated:
+                name = f"{digest}{ext}"
+                os.replace(tmp_path, self.path_for(name))
+                record = {
+                    'digest': digest,
+                    'name': name,
+                    'size': size,
+                    'partial_hash': partial,
+                    'original_filenames': [],
+                    'created_at': time.time(),
+                }
+                key = self._partial_key(partial, size)
+                bucket = self._index['partial'].setdefault(key, [])
+                if digest not in bucket:
+                    bucket.append(digest)
+                self._index['objects'][digest] = record
+            if original_filename and original_filename not in record['original_filenames']:
+                record['original_filenames'].append(original_filename)
+            record['last_access'] = time.time()
+            self._save_index_locked()
+            result = dict(record)
+        result['deduplicated'] = deduplicated
+        logger.info(
+            f"{'命中已有内容' if deduplicated else '已存储新内容'}: {result['name']} "
+            f"(原始文件名: {original_filename}, 大小: {size} bytes)"
+        )
+        return result
+
+    # ---------- 清理 ----------
+    def objects(self) -> List[Dict[str, Any]]:
+        """返回全部对象记录（副本）。"""
+        with self._lock:
+            return [dict(r) for r in self._index['objects'].values()]
+
+    def remove(self, digest: str) -> bool:
+        """删除对象文件及其索引记录（用于磁盘容量淘汰）。"""
+        digest = (digest or '').lower()
+        with self._lock:
+            record = self._index['objects'].pop(digest, None)
+            if record is None:
+                return False
+            key = self._partial_key(record.get('partial_hash', ''), record.get('size', 0))
+            bucket = self._index['partial'].get(key, [])
+            if digest in bucket:
+                bucket.remove(digest)
+                if not bucket:
+                    del self._index['partial'][key]
+            try:
+                os.remove(self.path_for(record['name']))
+            except FileNotFoundError:
+                pass
+            self._save_index_locked()
+        logger.info(f"已删除内容: {record['name']}")
+        return True
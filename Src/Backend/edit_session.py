@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+多步剪辑会话
+为每个用户/视频保留一个剪辑会话，多轮指令只追加到内存中的剪辑图上，不立即编码：
+- MoviePy 的剪辑操作本身是惰性的，只有保存时才逐帧解码/编码
+- 会话在客户端请求预览或导出时才渲染一次，N 条指令只需一次编码，也不会累积多代压缩损失
+- 操作链持久化到磁盘；服务重启或编辑器被回收后，按操作链重放即可重建剪辑图（不涉及编码）
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class EditSessionError(ValueError):
+    """剪辑会话相关的错误（会话不存在、操作执行失败等）"""
+
+
+class EditSession:
+    """单个剪辑会话：源视频 + 已确认的操作链 + （按需创建的）编辑器"""
+
+    def __init__(self, session_id: str, digest: str, video_path: str,
+                 user_id: Optional[str] = None, actions: Optional[List[str]] = None,
+                 created_at: Optional[float] = None, updated_at: Optional[float] = None):
+        self.session_id = session_id
+        self.digest = digest
+        self.video_path = video_path
+        self.user_id = user_id
+        self.actions: List[str] = list(actions or [])
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.last_used = time.time()
+        # 持有编辑器期间，剪辑图保留在内存中
+        self.editor = None
+        self.lock = threading.RLock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'digest': self.digest,
+            'video_path': self.video_path,
+            'user_id': self.user_id,
+            'actions': list(self.actions),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class EditSessionManager:
+    """管理剪辑会话，会话元数据保存在 root 目录下，空闲编辑器按需关闭以释放内存"""
+
+    def __init__(self, editor_factory: Callable[[str], Any], operations: Dict[str, Any],
+                 root: str = 'uploads/.edit_sessions', max_open_editors: int = 8,
+                 editor_idle_seconds: float = 600, max_age: float = 7 * 24 * 3600):
+        """
+        Args:
+            editor_factory: 以视频路径创建编辑器的函数（如 MoviePyVideoEditor）
+            operations: 支持的操作字典（传给 execute_action）
+            root: 会话元数据目录
+            max_open_editors: 同时保留在内存中的编辑器数量上限
+            editor_idle_seconds: 编辑器空闲超过该时长后关闭
+            max_age: 会话保留时长（秒），超时未更新的会话被删除
+        """
+        self.editor_factory = editor_factory
+        self.operations = operations
+        self.root = root
+        self.max_open_editors = max_open_editors
+        self.editor_idle_seconds = editor_idle_seconds
+        self.max_age = max_age
+        self._sessions: Dict[str, EditSession] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- 持久化 ----------
+    def _meta_path(self, session_id: str) -> str:
+        # 会话 ID 只允许十六进制字符，防止路径穿越
+        if not session_id or not all(c in '0123456789abcdef' for c in session_id):
+            raise EditSessionError(f"无效的会话 ID: {session_id}")
+        return os.path.join(self.root, f"{session_id}.json")
+
+    def _save(self, session: EditSession):
+        meta_path = self._meta_path(session.session_id)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def _load(self, session_id: str) -> EditSession:
+        meta_path = self._meta_path(session_id)
+        if not os.path.exists(meta_path):
+            raise EditSessionError(f"剪辑会话不存在: {session_id}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return EditSession(**data)
+
+    # ---------- 会话 ----------
+    def create(self, digest: str, video_path: str, user_id: Optional[str] = None) -> EditSession:
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"视频文件 {video_path} 不存在")
+        self.expire_stale()
+        session = EditSession(uuid.uuid4().hex, digest, video_path, user_id)
+        self._save(session)
+        with self._lock:
+            self._sessions[session.session_id] = session
+        logger.info(f"创建剪辑会话 {session.session_id}: {video_path}")
+        return session
+
+    def get(self, session_id: str) -> EditSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id)
+                self._sessions[session_id] = session
+            session.last_used = time.time()
+            return session
+
+    def delete(self, session_id: str):
+        session = self.get(session_id)
+        with session.lock:
+            self._close_editor(session)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        try:
+            os.remove(self._meta_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    # ---------- 剪辑图 ----------
+    def _close_editor(self, session: EditSession):
+        if session.editor is not None:
+            try:
+                session.editor.close()
+            except Exception as e:
+                logger.warning(f"关闭会话 {session.session_id} 的编辑器失败: {e}")
+            session.editor = None
+
+    def _build_editor(self, session: EditSession, actions: List[str]):
+        """按操作链重放，重建内存中的剪辑图（惰性操作，不编码）。"""
+        editor = self.editor_factory(session.video_path)
+        try:
+            for action in actions:
+                if not editor.execute_action(action, self.operations):
+                    raise EditSessionError(f"重放操作失败: {action}")
+        except Exception:
+            editor.close()
+            raise
+        return editor
+
+    def editor_for(self, session: EditSession):
+        """返回会话的编辑器，未打开时按操作链重建。调用方需持有 session.lock。"""
+        if session.editor is None:
+            session.editor = self._build_editor(session, session.actions)
+            self._trim_open_editors(keep=session.session_id)
+        session.last_used = time.time()
+        return session.editor
+
+    def append(self, session_id: str, action: str) -> EditSession:
+        """在剪辑图上追加一个操作，只修改内存中的剪辑图，不渲染。"""
+        session = self.get(session_id)
+        with session.lock:
+            editor = self.editor_for(session)
+            try:
+                success = editor.execute_action(action, self.operations)
+            except Exception as e:
+                # 执行中途失败时剪辑图状态不可信，丢弃后下次按操作链重建
+                self._close_editor(session)
+                raise EditSessionError(f"操作执行失败: {e}")
+            if not success:
+                self._close_editor(session)
+                raise EditSessionError("操作执行失败，请检查参数是否正确")
+            session.actions.append(action)
+            session.updated_at = time.time()
+            self._save(session)
+        return session
+
+    def undo(self, session_id: str) -> EditSession:
+        """撤销最后一个操作：丢弃当前剪辑图，按剩余操作链重建。"""
+        session = self.get(session_id)
+        with session.lock:
+            if not session.actions:
+                raise EditSessionError("没有可撤销的操作")
+            session.actions.pop()
+            session.updated_at = time.time()
+            self._close_editor(session)
+            self._save(session)
+        return session
+
+    def _trim_open_editors(self, keep: Optional[str] = None):
+        """关闭空闲过久或超出数量上限的编辑器（只关闭未被占用的会话）。"""
+        now = time.time()
+        with self._lock:
+            open_sessions = [s for s in self._sessions.values()
+                             if s.editor is not None and s.session_id != keep]
+        open_sessions.sort(key=lambda s: s.last_used)
+        excess = len(open_sessions) + 1 - self.max_open_editors
+        for session in open_sessions:
+            idle = now - session.last_used > self.editor_idle_seconds
+            if not idle and excess <= 0:
+                continue
+            if session.lock.acquire(blocking=False):
+                try:
+                    self._close_editor(session)
+                    excess -= 1
+                finally:
+                    session.lock.release()
+
+    def _stored_sessions(self):
+        """逐个读取磁盘上的会话元数据（不载入缓存，也不更新 last_used），返回 (会话 ID, 元数据)。"""
+        for filename in os.listdir(self.root):
+            session_id, ext = os.path.splitext(filename)
+            if ext != '.json':
+                continue
+            try:
+                with open(self._meta_path(session_id), 'r', encoding='utf-8') as f:
+                    yield session_id, json.load(f)
+            except (EditSessionError, OSError, ValueError):
+                continue
+
+    def _is_stale(self, data: Dict[str, Any], now: float) -> bool:
+        updated_at = data.get('updated_at') or data.get('created_at') or 0
+        return now - updated_at > self.max_age
+
+    def referenced_digests(self) -> List[str]:
+        """未过期会话引用的源视频摘要（这些源视频不可被磁盘清理删除）。"""
+        now = time.time()
+        return [data['digest'] for _, data in self._stored_sessions()
+                if data.get('digest') and not self._is_stale(data, now)]
+
+    def expire_stale(self):
+        """删除超过保留时长未更新的会话。"""
+        now = time.time()
+        for session_id, data in list(self._stored_sessions()):
+            if self._is_stale(data, now):
+                logger.info(f"清理过期剪辑会话: {session_id}")
+                try:
+                    self.delete(session_id)
+                except EditSessionError:
+                    continue
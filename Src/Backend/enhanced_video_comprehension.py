@@ -12,6 +12,8 @@ from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+import media_probe
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -34,8 +36,14 @@ class EnhancedVideoComprehension:
         self.content_analyzer = ContentAnalyzer()
         self.style_analyzer = StyleAnalyzer()
     
-    def comprehensive_analysis(self, video_path: str, analysis_level: str = 'full') -> Dict[str, Any]:
-        """综合视频分析"""
+    def comprehensive_analysis(self, video_path: str, analysis_level: str = 'full',
+                               precomputed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        综合视频分析
+
+        Args:
+            precomputed: 已缓存的分析结果（如上传时得到的 scene_analysis），对应步骤不再重复读取视频
+        """
         logger.info(f"开始综合视频分析: {video_path}")
         
         if not os.path.exists(video_path):
@@ -45,7 +53,7 @@ class EnhancedVideoComprehension:
         basic_info = self._get_basic_info(video_path)
         
         # 场景检测
-        scene_analysis = self.scene_detector.detect_scenes(video_path)
+        scene_analysis = (precomputed or {}).get('scene_analysis') or self.scene_detector.detect_scenes(video_path)
         
         # 运动分析
         motion_analysis = self.motion_analyzer.analyze_motion(video_path)
@@ -83,7 +91,12 @@ class EnhancedVideoComprehension:
         return result
     
     def _get_basic_info(self, video_path: str) -> Dict[str, Any]:
-        """获取视频基本信息"""
+        """获取视频基本信息（优先读取上传时探测的元数据，避免再次打开视频）"""
+        info = media_probe.basic_info(media_probe.get_metadata(video_path))
+        if info:
+            info['file_size_mb'] = os.path.getsize(video_path) / (1024 * 1024)
+            return info
+
         cap = cv2.VideoCapture(video_path)
         
         fps = cap.get(cv2.CAP_PROP_FPS)
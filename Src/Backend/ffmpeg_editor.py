@@ -17,6 +17,10 @@ import subprocess
 from typing import Optional, List, Tuple, Union
 
 from moviepy_editor import AbstractVideoEditor  # 复用抽象接口，便于在现有流程中替换
+import metrics
+import media_probe
+import progress
+from render_profiles import RenderProfile, default_profile
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,11 +38,17 @@ class FFmpegVideoEditor(AbstractVideoEditor):
         self.output_path: str = f"ffmpeg_output_{uuid.uuid4()}.mp4"
         self._duration: Optional[float] = None
         self._has_scale: bool = False
+        # 编码参数，可在 save() 前按请求替换
+        self.render_profile: RenderProfile = default_profile()
 
     def _get_video_duration(self) -> float:
-        """使用 ffprobe 获取视频总时长（秒），结果缓存。"""
+        """获取视频总时长（秒）：优先读取上传时探测的元数据，否则使用 ffprobe，结果缓存。"""
         if self._duration is not None:
             return self._duration
+        meta = media_probe.get_metadata(self.input_video)
+        if meta and meta.get('duration'):
+            self._duration = float(meta['duration'])
+            return self._duration
         input_ff = self.input_video.replace("\\", "/")
         cmd = f'ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "{input_ff}"'
         try:
@@ -304,14 +314,26 @@ class FFmpegVideoEditor(AbstractVideoEditor):
             raise ValueError("未设置输出路径")
 
         logger.info(f"[DEBUG] 当前 filters: {self.filters}")
-        vf = ",".join(self.filters) if self.filters else "null"
+        filters = list(self.filters)
+        if self.render_profile.scale_filter():
+            filters.append(self.render_profile.scale_filter())
+        vf = ",".join(filters) if filters else "null"
         input_ff = self.input_video.replace("\\", "/")
         output_ff = os.path.abspath(self.output_path).replace("\\", "/")
 
-        cmd = f'ffmpeg -y -i "{input_ff}" -vf "{vf}" -c:a copy "{output_ff}"'
+        # 滤镜不改变时长，按源视频的时长与帧率计算编码进度
+        meta = media_probe.get_metadata(self.input_video) or {}
+        fps = (meta.get('video') or {}).get('fps')
+        encode_args = " ".join(shlex.quote(arg) for arg in self.render_profile.ffmpeg_args(fps))
+        cmd = f'ffmpeg -y -i "{input_ff}" -vf "{vf}" {encode_args} "{output_ff}"'
         logger.info(f"运行 ffmpeg 命令: {cmd}")
         try:
-            subprocess.run(shlex.split(cmd), check=True)
+            duration = self._get_video_duration()
+        except ValueError:
+            duration = None
+        try:
+            with metrics.ENCODE_SECONDS.time(editor='ffmpeg'):
+                progress.run_ffmpeg(shlex.split(cmd), stage='编码视频', duration=duration, fps=fps)
         except subprocess.CalledProcessError as e:
             logger.error(f"ffmpeg 执行失败: {e}")
             raise
@@ -352,7 +374,8 @@ class FFmpegVideoEditor(AbstractVideoEditor):
         position = params.get('position', 'center')  # 目前忽略，统一底部居中
         start_time = float(params.get('start_time', 0.0)) if 'start_time' in params else 0.0
 
-        self.add_text(text=text, fontsize=fontsize, duration=duration, position=position, start_time=start_time)
+        with metrics.EDITOR_OP_SECONDS.time(editor='ffmpeg', operation=action, status='ok'):
+            self.add_text(text=text, fontsize=fontsize, duration=duration, position=position, start_time=start_time)
         return True
 
 
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+操作链融合渲染
+由 trim / speed / adjust_volume / rotate / crop / adjust_brightness / adjust_contrast 组成的操作链，
+不再经 MoviePy 逐帧在 Python 中变换，而是编译为一个 ffmpeg 滤镜图，一次解码、一次编码完成：
+- 每个操作按 MoviePyVideoEditor 的语义逐一翻译（参数校验与报错信息相同），滤镜按顺序串联
+- 输出编码参数取自渲染配置（与 MoviePyVideoEditor.save 相同），帧率与源视频一致
+- 操作链中含有其他操作（转场、合并、配乐等）或非 90 度整数倍的旋转时不融合，仍走 MoviePy
+- 只有 trim 的操作链优先使用智能剪切（smart_cut），完整 GOP 直接复制码流（配置限制分辨率或码率时除外）
+"""
+
+import os
+import time
+import uuid
+import logging
+import subprocess
+from typing import Dict, Any, List, Optional, Callable
+
+import metrics
+import media_probe
+import progress
+import smart_cut
+from render_profiles import RenderProfile, default_profile
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 可融合为 ffmpeg 滤镜的操作
+FUSIBLE_OPERATIONS = {'trim', 'speed', 'adjust_volume', 'rotate', 'crop', 'adjust_brightness', 'adjust_contrast'}
+# 指向输入文件的操作参数（concatenate / concatenate_multiple / add_background_music / add_audio_segment）
+PATH_PARAMS = {'second_video', 'video_files', 'audio_file'}
+
+def parse_action(action_str: str, operations: Dict[str, Any], allowed=FUSIBLE_OPERATIONS) -> Optional[tuple]:
+    """
+    解析 'action: name k=v ...'，参数类型转换与报错与 MoviePyVideoEditor.execute_action 相同
+    （列表参数形如 [a,b] 或 a,b，按逗号分隔）。返回 (操作名, 参数)；操作不在 allowed 中时返回 None。
+    """
+    if not action_str:
+        raise ValueError("未收到有效的操作指令")
+    parts = action_str.strip().split()
+    if not parts or parts[0] != 'action:':
+        raise ValueError("无效的 action 格式")
+    if len(parts) < 2 or parts[1] not in allowed or parts[1] not in operations:
+        return None
+    action = parts[1]
+    params = {}
+    for param in parts[2:]:
+        key, value = param.split('=')
+        params[key] = value
+
+    parsed = {}
+    for name, info in operations[action]['params'].items():
+        if name in params:
+            try:
+                if info['type'] is bool:
+                    parsed[name] = params[name].lower() == 'true'
+                elif info['type'] is list:
+                    parsed[name] = [item for item in params[name].strip('[]').split(',') if item]
+                else:
+                    parsed[name] = info['type'](params[name])
+            except ValueError:
+                raise ValueError(f"参数 {name} 格式错误: {params[name]}")
+        elif info['required']:
+            raise ValueError(f"缺少必需参数: {name}")
+        else:
+            parsed[name] = info['default']
+    return action, parsed
+
+
+def map_action_paths(action_str: str, operations: Dict[str, Any], resolve: Callable[[str], Optional[str]]) -> str:
+    """
+    校验客户端直接提交的 action：操作必须在 operations 中，文件参数（PATH_PARAMS）的每一项经 resolve
+    映射为服务器上的路径，resolve 返回 None 时报错。返回改写后的 action。
+    """
+    item = parse_action(action_str, operations, allowed=operations)
+    if item is None:
+        raise ValueError(f"不支持的操作: {action_str}")
+    name, _ = item
+    parts = ['action:', name]
+    for param in action_str.split()[2:]:
+        key, value = param.split('=')
+        if key in PATH_PARAMS:
+            is_list = key in operations[name]['params'] and operations[name]['params'][key]['type'] is list
+            items = [v for v in value.strip('[]').split(',') if v] if is_list else [value]
+            paths = [resolve(v) for v in items]
+            if not paths or None in paths:
+                raise ValueError(f"参数 {key} 只能引用已上传的文件: {value}")
+            value = f"[{','.join(paths)}]" if is_list else paths[0]
+        parts.append(f"{key}={value}")
+    return ' '.join(parts)
+
+
+def _num(value: float) -> str:
+    return f"{value:.6f}".rstrip('0').rstrip('.')
+
+
+class FilterGraphCompiler:
+    """按顺序把操作翻译为视频 / 音频滤镜，同时跟踪当前时长与画面尺寸以完成参数校验"""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.meta = meta
+        video = meta['video']
+        audio = meta.get('audio')
+        self.duration: float = video['duration'] or meta.get('duration') or 0.0
+        self.width: int = video['display_width']
+        self.height: int = video['display_height']
+        self.fps: float = video['fps']
+        self.sample_rate: Optional[int] = (audio or {}).get('sample_rate')
+        self.has_audio = audio is not None
+        # 时间戳从 0 开始，后续 trim 的时间点与 MoviePy 的剪辑时间轴一致
+        self.video_filters: List[str] = ['setpts=PTS-STARTPTS']
+        self.audio_filters: List[str] = ['asetpts=PTS-STARTPTS']
+        # 操作链只含 trim 时，输出对应源视频中的 [source_start, source_end] 区间，可用智能剪切
+        self.trim_only = True
+        self.source_start = 0.0
+        self.source_end = self.duration
+
+    def apply(self, action: str, params: Dict[str, Any]) -> bool:
+        """翻译单个操作；该操作无法用滤镜表达时返回 False。"""
+        if action != 'trim':
+            self.trim_only = False
+        return getattr(self, f"_{action}")(**params)
+
+    def _trim(self, start: float = 0.0, end: Optional[float] = None) -> bool:
+        end = end if end is not None else self.duration
+        if start >= self.duration:
+            raise ValueError("起始时间超出视频时长")
+        if end <= start:
+            raise ValueError("结束时间必须大于起始时间")
+        end = min(end, self.duration)
+        self.source_start, self.source_end = self.source_start + start, self.source_start + end
+        self.video_filters.append(f"trim=start={_num(start)}:end={_num(end)},setpts=PTS-STARTPTS")
+        self.audio_filters.append(f"atrim=start={_num(start)}:end={_num(end)},asetpts=PTS-STARTPTS")
+        self.duration = end - start
+        return True
+
+    def _speed(self, factor: float = 1.0) -> bool:
+        if factor <= 0:
+            raise ValueError("速度倍数必须大于 0")
+        self.video_filters.append(f"setpts=PTS/{_num(factor)}")
+        # MoviePy 的 speedx 同时按时间缩放音轨（音高随之改变），用重设采样率实现同样效果
+        if self.has_audio and self.sample_rate:
+            self.audio_filters.append(
+                f"asetrate={int(round(self.sample_rate * factor))},aresample={self.sample_rate}")
+        self.duration = self.duration / factor
+        return True
+
+    def _adjust_volume(self, factor: float = 1.0) -> bool:
+        if factor < 0:
+            raise ValueError("音量倍数必须非负")
+        self.audio_filters.append(f"volume={_num(factor)}")
+        return True
+
+    def _rotate(self, angle: float = 90.0) -> bool:
+        if angle % 90 != 0:
+            return False
+        # 与 MoviePy 的 rotate 一致：正角度为逆时针
+        turns = int(angle // 90) % 4
+        if turns == 1:
+            self.video_filters.append('transpose=2')
+        elif turns == 2:
+            self.video_filters.append('hflip,vflip')
+        elif turns == 3:
+            self.video_filters.append('transpose=1')
+        if turns % 2:
+            self.width, self.height = self.height, self.width
+        return True
+
+    def _crop(self, x1: float = 0.0, y1: float = 0.0, x2: float = None, y2: float = None) -> bool:
+        if x2 is None or y2 is None:
+            raise ValueError("x2 和 y2 必须指定")
+        if x1 < 0 or y1 < 0 or x2 <= x1 or y2 <= y1:
+            raise ValueError("裁剪坐标无效")
+        if x2 > self.width or y2 > self.height:
+            raise ValueError("裁剪坐标超出视频尺寸")
+        # MoviePy 按整数下标切片
+        left, top, right, bottom = int(x1), int(y1), int(x2), int(y2)
+        self.video_filters.append(f"crop={right - left}:{bottom - top}:{left}:{top}")
+        self.width, self.height = right - left, bottom - top
+        return True
+
+    def _adjust_brightness(self, factor: float = 1.0) -> bool:
+        if factor <= 0:
+            raise ValueError("亮度倍数必须大于 0")
+        # 与 vfx.colorx 相同：RGB 各通道乘以倍数并截断到 255
+        expr = f"min(val*{_num(factor)},maxval)"
+        self.video_filters.append(f"lutrgb=r='{expr}':g='{expr}':b='{expr}'")
+        return True
+
+    def _adjust_contrast(self, factor: float = 1.0) -> bool:
+        if factor <= 0:
+            raise ValueError("对比度倍数必须大于 0")
+        # 与 vfx.lum_contrast(contrast=factor) 相同：im + factor * (im - 127)，截断到 0~255
+        expr = f"clip(val+{_num(factor)}*(val-127),0,maxval)"
+        self.video_filters.append(f"lutrgb=r='{expr}':g='{expr}':b='{expr}'")
+        return True
+
+    def build_command(self, input_path: str, output_path: str, profile: Optional[RenderProfile] = None) -> List[str]:
+        """生成单次解码-编码的 ffmpeg 命令。"""
+        profile = profile or default_profile()
+        video_filters = self.video_filters + ([profile.scale_filter()] if profile.scale_filter() else [])
+        graph = f"[0:v]{','.join(video_filters)}[v]"
+        command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', input_path]
+        maps = ['-map', '[v]']
+        if self.has_audio:
+            graph += f";[0:a]{','.join(self.audio_filters)}[a]"
+            maps += ['-map', '[a]']
+        return command + [
+            '-filter_complex', graph,
+            *maps,
+            '-r', _num(self.fps),
+            *profile.ffmpeg_args(self.fps, audio=self.has_audio),
+            output_path,
+        ]
+
+
+def compile_actions(video_path: str, actions: List[str], operations: Dict[str, Any]) -> Optional[FilterGraphCompiler]:
+    """操作链可以整体融合时返回编译结果，否则返回 None（由调用方改用 MoviePy）。"""
+    if not actions:
+        return None
+    parsed = []
+    for action in actions:
+        item = parse_action(action, operations)
+        if item is None:
+            return None
+        parsed.append(item)
+    meta = media_probe.get_metadata(video_path)
+    if not meta or not meta.get('video') or not meta['video'].get('fps'):
+        return None
+    compiler = FilterGraphCompiler(meta)
+    for action, params in parsed:
+        if not compiler.apply(action, params):
+            return None
+    return compiler
+
+
+def render_fused(video_path: str, actions: List[str], output_path: str, operations: Dict[str, Any],
+                 smart_cut_enabled: bool = True, profile: Optional[RenderProfile] = None) -> bool:
+    """
+    尝试以单个 ffmpeg 滤镜图渲染操作链；只有 trim 时优先尝试智能剪切。
+    profile 为渲染配置，默认 share。
+
+    Returns:
+        bool: True 表示已输出到 output_path；False 表示操作链不可融合或 ffmpeg 执行失败，调用方应改用 MoviePy
+    Raises:
+        ValueError: 操作参数无效（与 MoviePyVideoEditor 的报错一致）
+    """
+    compiler = compile_actions(video_path, actions, operations)
+    if compiler is None:
+        return False
+    profile = profile or default_profile()
+    if smart_cut_enabled and compiler.trim_only and profile.allows_stream_copy and smart_cut.smart_trim(
+            video_path, compiler.meta, compiler.source_start, compiler.source_end, output_path, profile):
+        return True
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.fused.mp4"
+    command = compiler.build_command(video_path, tmp_path, profile)
+    logger.info(f"操作链已融合为单个 ffmpeg 滤镜图: {' '.join(command)}")
+    start_time = time.perf_counter()
+    try:
+        with metrics.ENCODE_SECONDS.time(editor='fused'):
+            progress.run_ffmpeg(command, stage='编码视频', duration=compiler.duration, fps=compiler.fps)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"融合渲染失败，改用 MoviePy: {getattr(e, 'stderr', None) or e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    elapsed = time.perf_counter() - start_time
+    if elapsed > 0:
+        metrics.ENCODE_FPS.observe(compiler.duration * compiler.fps / elapsed, editor='fused')
+    os.replace(tmp_path, output_path)
+    logger.info(f"融合渲染完成: {output_path}，耗时 {elapsed:.2f}秒")
+    return True
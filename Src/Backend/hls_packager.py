@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+HLS 分段打包
+将编辑输出的 MP4 以流拷贝方式切分为 fMP4 分段和 VOD 播放列表：
+- 手机端拿到首个分段即可开始播放，拖动进度只拉取需要的分段
+- 不重新编码，耗时接近一次磁盘拷贝
+- 输出目录以源文件内容摘要命名，内容不变则地址不变，可长期缓存
+"""
+
+import os
+import shutil
+import logging
+import subprocess
+from typing import Dict, Any, Optional
+
+from content_store import ContentStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = 'index.m3u8'
+
+# 分段与播放列表的 MIME 类型
+HLS_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.ts': 'video/mp2t',
+}
+
+
+class HLSPackager:
+    """将 MP4 输出打包为 HLS（fMP4 分段）"""
+
+    def __init__(self, root: str = 'uploads/hls', segment_seconds: float = 4.0,
+                 url_prefix: str = '/hls'):
+        """
+        Args:
+            root: HLS 输出根目录
+            segment_seconds: 目标分段时长（秒），实际切点落在关键帧上
+            url_prefix: 对外访问的 URL 前缀
+        """
+        self.root = root
+        self.segment_seconds = segment_seconds
+        self.url_prefix = url_prefix
+        os.makedirs(root, exist_ok=True)
+
+    def package(self, video_path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """
+        打包单个视频。目录已存在（相同内容已打包）时直接复用。
+
+        Args:
+            video_path: 输入 MP4 路径
+            digest: 输入文件的内容摘要，未提供时现场计算
+
+        Returns:
+            Dict: {'key', 'playlist_path', 'playlist_url'}
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"视频文件 {video_path} 不存在")
+        key = (digest or ContentStore.file_digest(video_path))[:32]
+        out_dir = os.path.join(self.root, key)
+        playlist_path = os.path.join(out_dir, PLAYLIST_NAME)
+        result = {
+            'key': key,
+            'playlist_path': playlist_path,
+            'playlist_url': f"{self.url_prefix}/{key}/{PLAYLIST_NAME}",
+        }
+        if os.path.exists(playlist_path):
+            logger.info(f"HLS 已存在，直接复用: {playlist_path}")
+            return result
+
+        # 先写入临时目录，成功后再整体改名，避免客户端读到半成品
+        tmp_dir = f"{out_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        command = [
+            'ffmpeg', '-y',
+            '-i', video_path,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c', 'copy',
+            '-f', 'hls',
+            '-hls_time', str(self.segment_seconds),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(tmp_dir, 'seg_%05d.m4s'),
+            os.path.join(tmp_dir, PLAYLIST_NAME),
+        ]
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.error(f"HLS 打包失败: {e.stderr}")
+            raise
+        if os.path.exists(out_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, out_dir)
+        logger.info(f"HLS 打包完成: {playlist_path}")
+        return result
+
+    def resolve(self, key: str, filename: str) -> Optional[str]:
+        """将请求的 key/filename 解析为磁盘路径，非法路径返回 None。"""
+        if not key or not all(c in '0123456789abcdef' for c in key):
+            return None
+        if os.path.basename(filename) != filename or os.path.splitext(filename)[1] not in HLS_MIMETYPES:
+            return None
+        path = os.path.join(self.root, key, filename)
+        return path if os.path.isfile(path) else None
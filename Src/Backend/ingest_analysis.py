@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+边上传边分析
+上传的字节在写盘的同时送入一个 ffmpeg 进程（标准输入），一次解码完成：
+- 镜头切换检测（select=gt(scene) + showinfo）
+- 按固定间隔抽取缩略图
+- 音频响度（EBU R128：整体响度、响度范围、真峰值）
+上传结束时分析也基本完成，结果与媒体元数据一起保存为 uploads/.analysis/<digest>.json。
+无法流式解码的文件（如 moov 在文件末尾的 MP4）或分析跟不上上传速度时，
+在上传完成后对完整文件执行同一条 ffmpeg 命令。
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional, BinaryIO, Callable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_HEIGHT = 180
+THUMBNAIL_PATTERN = 'thumb_%04d.jpg'
+
+_SHOWINFO_RE = re.compile(r'Parsed_showinfo.*pts_time:\s*(-?[\d.]+)')
+_LOUDNESS_RE = re.compile(r'^I:\s+(-?[\d.]+|-inf)\s+LUFS')
+_LRA_RE = re.compile(r'^LRA:\s+(-?[\d.]+)\s+LU')
+_PEAK_RE = re.compile(r'^Peak:\s+(-?[\d.]+|-inf)\s+dBFS')
+
+
+def build_command(input_spec: str, thumbnail_dir: str, scene_threshold: float = 0.3,
+                  thumbnail_interval: float = 5.0) -> List[str]:
+    """构造一次解码、同时输出镜头切换、缩略图与响度的 ffmpeg 命令。"""
+    return [
+        'ffmpeg', '-hide_banner', '-nostats', '-y',
+        '-i', input_spec,
+        # 输出 1：镜头切换（视频）+ 响度（音频，可选），不写文件
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f"select='gt(scene,{scene_threshold})',showinfo",
+        '-af', 'ebur128=peak=true',
+        '-f', 'null', '-',
+        # 输出 2：缩略图
+        '-map', '0:v:0',
+        '-vf', f"fps=1/{thumbnail_interval},scale=-2:{THUMBNAIL_HEIGHT}",
+        '-q:v', '5',
+        os.path.join(thumbnail_dir, THUMBNAIL_PATTERN),
+    ]
+
+
+def _to_float(value: str) -> Optional[float]:
+    return None if value == '-inf' else float(value)
+
+
+def parse_ffmpeg_log(lines: List[str]) -> Dict[str, Any]:
+    """从 ffmpeg 日志中提取镜头切换时间点与响度统计。"""
+    scene_cuts = []
+    loudness: Dict[str, Optional[float]] = {}
+    for line in lines:
+        match = _SHOWINFO_RE.search(line)
+        if match:
+            scene_cuts.append(round(float(match.group(1)), 3))
+            continue
+        stripped = line.strip()
+        for key, pattern in (('integrated_lufs', _LOUDNESS_RE), ('lra_lu', _LRA_RE), ('true_peak_dbfs', _PEAK_RE)):
+            match = pattern.match(stripped)
+            if match:
+                # 汇总信息在日志末尾，取最后一次出现的值
+                loudness[key] = _to_float(match.group(1))
+    return {'scene_cuts': sorted(set(scene_cuts)), 'loudness': loudness or None}
+
+
+def scene_analysis_from_cuts(scene_cuts: List[float], duration: float, fps: float) -> Dict[str, Any]:
+    """将镜头切换时间点转换为 SceneDetector.detect_scenes 的结果结构。"""
+    boundaries = [0.0] + [t for t in scene_cuts if 0 < t < duration] + [duration]
+    scenes = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        if end <= start:
+            continue
+        scenes.append({
+            'start_frame': int(round(start * fps)),
+            'end_frame': max(int(round(end * fps)) - 1, int(round(start * fps))),
+            'start_time': start,
+            'end_time': end,
+            'duration': end - start,
+        })
+    return {
+        'scene_count': len(scenes),
+        'scenes': scenes,
+        'scene_change_rate': len(scenes) / duration if duration > 0 else 0,
+        'average_scene_duration': sum(s['duration'] for s in scenes) / len(scenes) if scenes else 0,
+    }
+
+
+class TeeReader:
+    """包装上传流：每次 read 的数据同时交给 callback"""
+
+    def __init__(self, stream: BinaryIO, callback: Callable[[bytes], None]):
+        self.stream = stream
+        self.callback = callback
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        if data:
+            self.callback(data)
+        return data
+
+
+class IngestAnalysis:
+    """单个上传的流式分析：字节到达时写入 ffmpeg 标准输入"""
+
+    def __init__(self, work_dir: str, scene_threshold: float = 0.3, thumbnail_interval: float = 5.0,
+                 max_buffer_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            work_dir: 临时目录（缩略图先写到这里，完成后移到摘要目录）
+            scene_threshold: 镜头切换阈值（0~1，ffmpeg scene 分数）
+            thumbnail_interval: 缩略图间隔（秒）
+            max_buffer_bytes: 等待写入 ffmpeg 的最大缓冲，超出说明分析跟不上上传，改为上传后分析
+        """
+        self.work_dir = work_dir
+        self.scene_threshold = scene_threshold
+        self.thumbnail_interval = thumbnail_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.fed_bytes = 0
+        self.streaming = False
+        self.last_fed = time.time()
+        # 分析结束（完成或取消）时调用，如释放准入名额
+        self.on_close: Optional[Callable[[], None]] = None
+        self._queue: 'queue.Queue[Optional[bytes]]' = queue.Queue()
+        self._buffered = 0
+        self._lock = threading.Lock()
+        # 并行上传的分块可能同时触发 feed_file，按顺序送入
+        self._feed_lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr: List[str] = []
+        self._threads: List[threading.Thread] = []
+        os.makedirs(work_dir, exist_ok=True)
+
+    def start(self):
+        try:
+            self._process = subprocess.Popen(
+                build_command('pipe:0', self.work_dir, self.scene_threshold, self.thumbnail_interval),
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            logger.warning(f"无法启动流式分析，将在上传完成后分析: {e}")
+            return
+        self.streaming = True
+        self._threads = [
+            threading.Thread(target=self._write_loop, daemon=True),
+            threading.Thread(target=self._read_stderr, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _write_loop(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            with self._lock:
+                self._buffered -= len(data)
+            if not self.streaming:
+                continue
+            try:
+                self._process.stdin.write(data)
+            except (BrokenPipeError, OSError, ValueError):
+                # ffmpeg 提前退出（如无法从管道解析容器），改为上传后分析
+                self._abandon("ffmpeg 无法流式解码")
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _read_stderr(self):
+        for raw in self._process.stderr:
+            self._stderr.append(raw.decode('utf-8', errors='replace'))
+
+    def _abandon(self, reason: str):
+        if self.streaming:
+            self.streaming = False
+            logger.info(f"放弃流式分析（{reason}），上传完成后再分析")
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+
+    def feed(self, data: bytes):
+        """送入新到达的字节（按文件顺序），不阻塞上传。"""
+        if not self.streaming or not data:
+            return
+        with self._lock:
+            if self._buffered + len(data) > self.max_buffer_bytes:
+                overflow = True
+            else:
+                overflow = False
+                self._buffered += len(data)
+                self.fed_bytes += len(data)
+        if overflow:
+            self._abandon("分析速度跟不上上传速度")
+            return
+        self.last_fed = time.time()
+        self._queue.put(data)
+
+    def feed_file(self, path: str, end: int, chunk_size: int = 1024 * 1024):
+        """分块上传：把文件中 [fed_bytes, end) 的连续部分送入分析。"""
+        with self._feed_lock:
+            start = self.fed_bytes
+            if not self.streaming or end <= start:
+                return
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0 and self.streaming:
+                    data = f.read(min(chunk_size, remaining))
+                    if not data:
+                        break
+                    self.feed(data)
+                    remaining -= len(data)
+
+    def finish(self, video_path: str) -> Dict[str, Any]:
+        """上传完成：等待流式分析结束；未能流式完成时对完整文件分析。"""
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        streamed = False
+        if self._process is not None:
+            returncode = self._process.wait()
+            streamed = self.streaming and returncode == 0
+        if streamed:
+            lines = self._stderr
+        else:
+            for name in os.listdir(self.work_dir):
+                os.remove(os.path.join(self.work_dir, name))
+            command = build_command(video_path, self.work_dir, self.scene_threshold, self.thumbnail_interval)
+            result = subprocess.run(command, check=True, capture_output=True, text=True)
+            lines = result.stderr.splitlines()
+        parsed = parse_ffmpeg_log(lines)
+        parsed['streamed'] = streamed
+        return parsed
+
+    def close(self):
+        if self.on_close is not None:
+            callback, self.on_close = self.on_close, None
+            callback()
+
+    def abort(self):
+        self._abandon("上传已取消")
+        self._queue.put(None)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.close()
+
+
+class IngestPipeline:
+    """管理进行中的流式分析，并保存按内容摘要命名的分析结果"""
+
+    def __init__(self, root: str = 'uploads/.analysis', scene_threshold: float = 0.3,
+                 thumbnail_interval: float = 5.0, max_buffer_bytes: int = 64 * 1024 * 1024,
+                 metadata_store=None, max_idle_seconds: float = 3600):
+        """
+        Args:
+            root: 分析结果目录（<digest>.json 与 <digest>/ 缩略图目录）
+            scene_threshold: 镜头切换阈值
+            thumbnail_interval: 缩略图间隔（秒）
+            max_buffer_bytes: 单个上传等待写入 ffmpeg 的最大缓冲
+            metadata_store: MediaMetadataStore，结果中附带媒体元数据
+            max_idle_seconds: 超过该时长没有新数据的分析被取消
+        """
+        self.root = root
+        self.scene_threshold = scene_threshold
+        self.thumbnail_interval = thumbnail_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.metadata_store = metadata_store
+        self.max_idle_seconds = max_idle_seconds
+        self._active: Dict[str, IngestAnalysis] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def result_path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest}.json")
+
+    def thumbnail_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def result(self, digest: str) -> Optional[Dict[str, Any]]:
+        path = self.result_path((digest or '').lower())
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ---------- 进行中的分析 ----------
+    def start(self, key: Optional[str] = None, on_close: Optional[Callable[[], None]] = None) -> str:
+        """开始一个流式分析，返回其键（分块上传使用会话 ID）。on_close 在分析结束或取消时调用。"""
+        self.expire_idle()
+        key = key or uuid.uuid4().hex
+        analysis = IngestAnalysis(os.path.join(self.root, f".work_{key}"), self.scene_threshold,
+                                  self.thumbnail_interval, self.max_buffer_bytes)
+        analysis.on_close = on_close
+        analysis.start()
+        with self._lock:
+            self._active[key] = analysis
+        return key
+
+    def get(self, key: str) -> Optional[IngestAnalysis]:
+        with self._lock:
+            return self._active.get(key)
+
+    def feed(self, key: str, data: bytes):
+        analysis = self.get(key)
+        if analysis is not None:
+            analysis.feed(data)
+
+    def feed_file(self, key: str, path: str, end: int):
+        analysis = self.get(key)
+        if analysis is not None:
+            analysis.feed_file(path, end)
+
+    def abort(self, key: str):
+        with self._lock:
+            analysis = self._active.pop(key, None)
+        if analysis is not None:
+            analysis.abort()
+
+    def expire_idle(self):
+        """取消长时间没有新数据的分析（上传已放弃），释放 ffmpeg 进程。"""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, a in self._active.items() if now - a.last_fed > self.max_idle_seconds]
+        for key in stale:
+            logger.info(f"取消空闲的上传分析: {key}")
+            self.abort(key)
+
+    def complete(self, key: Optional[str], digest: str, video_path: str) -> Dict[str, Any]:
+        """
+        上传完成后调用：收尾流式分析（或对完整文件分析），保存结果。
+        相同内容已有分析结果时直接返回。
+        """
+        with self._lock:
+            analysis = self._active.pop(key, None) if key else None
+        existing = self.result(digest)
+        if existing is not None:
+            if analysis is not None:
+                analysis.abort()
+            return existing
+        if analysis is None:
+            analysis = IngestAnalysis(os.path.join(self.root, f".work_{uuid.uuid4().hex}"),
+                                      self.scene_threshold, self.thumbnail_interval, self.max_buffer_bytes)
+        try:
+            parsed = analysis.finish(video_path)
+            thumbnail_dir = self.thumbnail_dir(digest)
+            shutil.rmtree(thumbnail_dir, ignore_errors=True)
+            os.replace(analysis.work_dir, thumbnail_dir)
+        finally:
+            shutil.rmtree(analysis.work_dir, ignore_errors=True)
+            analysis.close()
+
+        metadata = self.metadata_store.probe(video_path, digest) if self.metadata_store else None
+        result = {
+            'digest': digest,
+            'scene_threshold': self.scene_threshold,
+            'scene_cuts': parsed['scene_cuts'],
+            'loudness': parsed['loudness'],
+            'thumbnail_interval': self.thumbnail_interval,
+            'thumbnails': sorted(os.listdir(thumbnail_dir)),
+            'streamed': parsed['streamed'],
+            'metadata': metadata,
+        }
+        tmp_path = f"{self.result_path(digest)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, self.result_path(digest))
+        logger.info(f"上传分析完成: {digest}（{'边上传边分析' if parsed['streamed'] else '上传后分析'}，"
+                    f"{len(result['scene_cuts'])} 个镜头切换）")
+        return result
+
+    def scene_analysis(self, digest: str) -> Optional[Dict[str, Any]]:
+        """按已缓存的镜头切换生成场景分析结果，无缓存时返回 None。"""
+        result = self.result(digest)
+        video = ((result or {}).get('metadata') or {}).get('video')
+        if not video or not video.get('fps'):
+            return None
+        duration = video.get('duration') or result['metadata'].get('duration') or 0.0
+        return scene_analysis_from_cuts(result['scene_cuts'], duration, video['fps'])
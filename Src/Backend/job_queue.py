@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+渲染任务队列
+将耗时的 LLM 解析、剪辑与编码放到有界工作线程池中执行：
+- 接口只负责登记任务并立即返回 job_id
+- 工作线程数默认等于 CPU 核数，限制同时进行的编码数量
+- 客户端通过任务 ID 轮询状态、进度与最终输出地址，或订阅进度事件流（速率、剩余时间、是否停滞）
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, List, Optional, Callable
+
+import metrics
+import progress
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+class RenderJob:
+    """单个渲染任务，记录状态、进度与结果"""
+
+    def __init__(self, kind: str, params: Optional[Dict[str, Any]] = None):
+        self.job_id: str = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = JOB_QUEUED
+        self.progress: float = 0.0
+        self.stage: str = '排队中'
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        # 当前阶段的实时计量（由 progress.ProgressReporter 上报）
+        self.rate: Optional[float] = None
+        self.eta: Optional[float] = None
+        self.unit: Optional[str] = None
+        self.units_done: Optional[float] = None
+        self.units_total: Optional[float] = None
+        self.last_progress_at = self.created_at
+        # 超过该秒数没有任何进度上报的运行中任务视为停滞（由 JobManager 设置）
+        self.stall_seconds: Optional[float] = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def update(self, progress: Optional[float] = None, stage: Optional[str] = None,
+               rate: Optional[float] = None, eta: Optional[float] = None, unit: Optional[str] = None,
+               done: Optional[float] = None, total: Optional[float] = None):
+        """更新任务进度（0~1）、当前阶段描述与阶段计量，并通知等待进度的订阅者。"""
+        with self._changed:
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, float(progress)))
+            if stage is not None:
+                if stage != self.stage and unit is None:
+                    # 进入新阶段且没有计量时清除上一阶段的速率与剩余时间
+                    self.rate = self.eta = self.unit = self.units_done = self.units_total = None
+                self.stage = stage
+            if unit is not None:
+                self.rate, self.eta, self.unit = rate, eta, unit
+                self.units_done, self.units_total = done, total
+            self.last_progress_at = time.time()
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_update(self, version: int, timeout: Optional[float] = None) -> int:
+        """阻塞直到任务状态版本号不同于 version（或超时），返回当前版本号。"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    @property
+    def stalled(self) -> bool:
+        """运行中且超过 stall_seconds 没有进度上报。"""
+        return (self.status == JOB_RUNNING and self.stall_seconds is not None
+                and time.time() - self.last_progress_at > self.stall_seconds)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'stage': self.stage,
+            'rate': self.rate,
+            'unit': self.unit,
+            'units_done': self.units_done,
+            'units_total': self.units_total,
+            'eta_seconds': self.eta,
+            'stalled': self.stalled,
+            'last_progress_at': self.last_progress_at,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.result is not None:
+            data.update(self.result)
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """有界线程池上的任务管理器"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_finished_jobs: int = 500,
+                 stall_seconds: Optional[float] = None):
+        """
+        Args:
+            max_workers: 最大并发任务数，默认取 CPU 核数
+            max_finished_jobs: 内存中保留的已结束任务数量上限，超出后按完成顺序淘汰
+            stall_seconds: 运行中任务超过该秒数没有进度上报即标记为停滞，None 表示不检测
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_finished_jobs = max_finished_jobs
+        self.stall_seconds = stall_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render')
+        self._jobs: 'OrderedDict[str, RenderJob]' = OrderedDict()
+        self._lock = threading.Lock()
+        logger.info(f"渲染任务队列已启动，工作线程数: {self.max_workers}")
+
+    def submit(self, kind: str, func: Callable[..., Dict[str, Any]], *args,
+               params: Optional[Dict[str, Any]] = None, **kwargs) -> RenderJob:
+        """
+        提交任务。func 的第一个参数为 RenderJob，用于上报进度；返回值（dict）合并进任务状态。
+        func 抛出的异常会被记录为任务失败。
+        """
+        job = self.register(kind, params)
+        self.start(job, func, *args, **kwargs)
+        logger.info(f"已提交任务 {job.job_id} ({kind})，当前排队: {self.queue_depth()}")
+        return job
+
+    def register(self, kind: str, params: Optional[Dict[str, Any]] = None) -> RenderJob:
+        """
+        只登记任务（可查询、可等待），暂不占用工作线程；之后由 start 交给线程池执行。
+        用于需要先等到准入名额的任务，等待期间工作线程留给其他任务。
+        """
+        job = RenderJob(kind, params)
+        job.stall_seconds = self.stall_seconds
+        job.future = Future()
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_locked()
+        return job
+
+    def start(self, job: RenderJob, func: Callable[..., Dict[str, Any]], *args, **kwargs):
+        """把已登记的任务交给线程池执行。"""
+        inner = self._executor.submit(self._run, job, func, args, kwargs)
+        inner.add_done_callback(lambda f: job.future.set_result(job) if f.exception() is None
+                                else job.future.set_exception(f.exception()))
+
+    def _run(self, job: RenderJob, func: Callable, args: tuple, kwargs: dict):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        metrics.JOB_WAIT_SECONDS.observe(job.started_at - job.created_at, kind=job.kind)
+        job.update(stage='处理中')
+        try:
+            with progress.bind(progress.ProgressReporter(job)):
+                result = func(job, *args, **kwargs)
+            job.result = result or {}
+            job.status = JOB_SUCCEEDED
+            job.update(progress=1.0, stage='已完成')
+            logger.info(f"任务 {job.job_id} 完成，耗时 {time.time() - job.started_at:.2f}秒")
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            job.update(stage='失败')
+            logger.error(f"任务 {job.job_id} 失败: {e}")
+            logger.exception("详细错误信息：")
+        finally:
+            job.finished_at = time.time()
+            job.update()
+            metrics.JOB_SECONDS.observe(job.finished_at - job.started_at, kind=job.kind)
+            metrics.JOBS_TOTAL.inc(kind=job.kind, status=job.status)
+        return job
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: RenderJob, timeout: Optional[float] = None) -> RenderJob:
+        """阻塞等待任务结束（用于兼容同步调用方）。"""
+        if job.future is not None:
+            job.future.result(timeout=timeout)
+        return job
+
+    def queue_depth(self) -> int:
+        """排队中（尚未开始）的任务数。"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == JOB_QUEUED)
+
+    def in_flight(self) -> int:
+        """正在执行的任务数。"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == JOB_RUNNING)
+
+    def stalled_count(self) -> int:
+        """停滞（长时间没有进度上报）的运行中任务数。"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.stalled)
+
+    def active_jobs(self) -> List[RenderJob]:
+        """排队中或执行中的任务。"""
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.done]
+
+    def _prune_locked(self):
+        finished = [jid for jid, j in self._jobs.items() if j.done]
+        excess = len(finished) - self.max_finished_jobs
+        for jid in finished[:max(0, excess)]:
+            del self._jobs[jid]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+媒体元数据探测
+上传时用 ffprobe 探测一次（流、时长、帧率、分辨率、旋转、编码、关键帧位置、音频布局），
+结果以 JSON 旁路文件保存，之后编辑器与分析器统一通过 get_metadata 读取：
+- 不再为每个编辑器实例单独运行 ffprobe，或为了读时长打开 cv2.VideoCapture
+- 内容寻址存储中的文件按摘要命名旁路文件；其他文件按 路径 + 大小 + 修改时间 命名
+- 进程内另有 LRU 缓存，同一文件的重复查询不读磁盘
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 元数据格式版本，格式变化时旧旁路文件自动失效
+PROBE_VERSION = 2
+SHA256_HEX_LENGTH = 64
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """解析 ffprobe 的帧率字符串，如 '30000/1001'。"""
+    if not rate:
+        return 0.0
+    num, _, den = str(rate).partition('/')
+    try:
+        num, den = float(num), float(den or 1)
+    except ValueError:
+        return 0.0
+    return num / den if den else 0.0
+
+
+def _to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _rotation(stream: Dict[str, Any]) -> int:
+    """读取视频流的旋转角度（新版 ffprobe 在 side_data_list，旧版在 tags.rotate）。"""
+    for side_data in stream.get('side_data_list') or []:
+        if 'rotation' in side_data:
+            return int(round(_to_float(side_data['rotation'], 0))) % 360
+    return _to_int((stream.get('tags') or {}).get('rotate'), 0) % 360
+
+
+def parse_probe_output(probe: Dict[str, Any], keyframes: Optional[List[float]] = None) -> Dict[str, Any]:
+    """将 ffprobe -show_streams -show_format 的 JSON 输出整理为统一的元数据结构。"""
+    fmt = probe.get('format') or {}
+    streams = probe.get('streams') or []
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'
+                         and not (s.get('disposition') or {}).get('attached_pic')), None)
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    video = None
+    if video_stream:
+        width = _to_int(video_stream.get('width'), 0)
+        height = _to_int(video_stream.get('height'), 0)
+        rotation = _rotation(video_stream)
+        fps = _parse_rate(video_stream.get('avg_frame_rate')) or _parse_rate(video_stream.get('r_frame_rate'))
+        duration = _to_float(video_stream.get('duration')) or _to_float(fmt.get('duration'), 0.0)
+        frame_count = _to_int(video_stream.get('nb_frames')) or int(round(duration * fps))
+        rotated = rotation in (90, 270)
+        video = {
+            'codec': video_stream.get('codec_name'),
+            'profile': video_stream.get('profile'),
+            # H.264 level × 10（41 表示 4.1），未知时为 None
+            'level': _to_int(video_stream.get('level')),
+            'pix_fmt': video_stream.get('pix_fmt'),
+            'width': width,
+            'height': height,
+            'rotation': rotation,
+            # 播放时实际显示的宽高（已考虑旋转）
+            'display_width': height if rotated else width,
+            'display_height': width if rotated else height,
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration': duration,
+            'bit_rate': _to_int(video_stream.get('bit_rate')),
+        }
+
+    audio = None
+    if audio_stream:
+        audio = {
+            'codec': audio_stream.get('codec_name'),
+            'sample_rate': _to_int(audio_stream.get('sample_rate')),
+            'channels': _to_int(audio_stream.get('channels')),
+            'channel_layout': audio_stream.get('channel_layout'),
+            'duration': _to_float(audio_stream.get('duration')),
+            'bit_rate': _to_int(audio_stream.get('bit_rate')),
+        }
+
+    return {
+        'version': PROBE_VERSION,
+        'format': fmt.get('format_name'),
+        'duration': _to_float(fmt.get('duration')) or (video or {}).get('duration') or 0.0,
+        'size': _to_int(fmt.get('size')),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'video': video,
+        'audio': audio,
+        'streams': [
+            {'index': s.get('index'), 'type': s.get('codec_type'), 'codec': s.get('codec_name')}
+            for s in streams
+        ],
+        'keyframes': keyframes or [],
+        'probed_at': time.time(),
+    }
+
+
+def basic_info(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """转换为分析器使用的基本信息结构（与原 cv2.VideoCapture 读取的字段一致）。"""
+    video = (meta or {}).get('video')
+    if not video:
+        return None
+    width, height = video['display_width'], video['display_height']
+    return {
+        'fps': video['fps'],
+        'frame_count': video['frame_count'],
+        'width': width,
+        'height': height,
+        'duration': video['duration'] or meta.get('duration', 0.0),
+        'aspect_ratio': width / height if height > 0 else 0,
+        'codec': video['codec'],
+        'rotation': video['rotation'],
+    }
+
+
+def probe_keyframes(video_path: str) -> List[float]:
+    """读取视频流中关键帧的时间点（只读包头，不解码）。"""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path,
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            value = _to_float(pts_time)
+            if value is not None:
+                keyframes.append(round(value, 6))
+    return sorted(keyframes)
+
+
+def probe_media(video_path: str) -> Dict[str, Any]:
+    """使用 ffprobe 探测媒体文件。"""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-show_streams', '-show_format',
+        '-of', 'json',
+        video_path,
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    probe = json.loads(result.stdout or '{}')
+    keyframes = probe_keyframes(video_path) if any(
+        s.get('codec_type') == 'video' for s in probe.get('streams') or []) else []
+    return parse_probe_output(probe, keyframes)
+
+
+class MediaMetadataStore:
+    """元数据旁路文件 + 进程内 LRU 缓存"""
+
+    def __init__(self, root: str = 'uploads/.meta', probe_func: Callable[[str], Dict[str, Any]] = probe_media,
+                 max_cached: int = 512):
+        """
+        Args:
+            root: 旁路文件目录
+            probe_func: 探测函数（默认 ffprobe）
+            max_cached: 进程内缓存的条目数
+        """
+        self.root = root
+        self.probe_func = probe_func
+        self.max_cached = max_cached
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key_for(video_path: str, digest: Optional[str] = None) -> str:
+        """内容寻址文件使用摘要；其他文件使用 路径 + 大小 + 修改时间 的哈希。"""
+        if digest:
+            return digest.lower()
+        stem = os.path.splitext(os.path.basename(video_path))[0].lower()
+        if len(stem) == SHA256_HEX_LENGTH and all(c in '0123456789abcdef' for c in stem):
+            return stem
+        stat = os.stat(video_path)
+        raw = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return 'p' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def sidecar_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _remember(self, key: str, meta: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = meta
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _read_sidecar(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.sidecar_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('version') == PROBE_VERSION else None
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """只读取已有的元数据，不探测。"""
+        with self._lock:
+            meta = self._cache.get(key)
+            if meta is not None:
+                self._cache.move_to_end(key)
+                return meta
+        meta = self._read_sidecar(key)
+        if meta is not None:
+            self._remember(key, meta)
+        return meta
+
+    def forget(self, key: str):
+        """删除元数据（源文件被删除时调用）。"""
+        with self._lock:
+            self._cache.pop(key, None)
+        try:
+            os.remove(self.sidecar_path(key))
+        except FileNotFoundError:
+            pass
+
+    def probe(self, video_path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """返回元数据；没有旁路文件时探测一次并保存（同一文件同时只探测一次）。"""
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"视频文件 {video_path} 不存在")
+        key = self.key_for(video_path, digest)
+        meta = self.lookup(key)
+        if meta is not None:
+            return meta
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            meta = self.lookup(key)
+            if meta is not None:
+                return meta
+            meta = self.probe_func(video_path)
+            tmp_path = f"{self.sidecar_path(key)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self.sidecar_path(key))
+            self._remember(key, meta)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        logger.info(f"已探测媒体元数据: {video_path}")
+        return meta
+
+
+_default_store: Optional[MediaMetadataStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_metadata_store(root: str = 'uploads/.meta') -> MediaMetadataStore:
+    """返回共享的元数据存储。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MediaMetadataStore(root)
+        return _default_store
+
+
+def get_metadata(video_path: str) -> Optional[Dict[str, Any]]:
+    """
+    编辑器与分析器读取元数据的统一入口。
+    探测失败（如未安装 ffprobe）时返回 None，调用方回退到原有方式。
+    """
+    try:
+        return get_metadata_store().probe(video_path)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        logger.warning(f"读取媒体元数据失败，回退到原有方式: {e}")
+        return None
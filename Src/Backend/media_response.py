@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+媒体文件响应
+以有界内存流式返回视频文件，支持：
+- 单区间 / 多区间（multipart/byteranges）Range 请求，按固定大小分块读取，不把整段数据读入内存
+- 完整文件走 wsgi.file_wrapper，服务器支持时可使用 sendfile 零拷贝
+- ETag / Last-Modified 条件请求（If-None-Match、If-Modified-Since → 304）
+- If-Range：资源已变化时忽略 Range，返回完整文件
+"""
+
+import os
+import uuid
+import logging
+from typing import List, Optional, Tuple, Iterator
+
+from flask import Response
+from werkzeug.http import http_date, parse_date
+from werkzeug.wsgi import wrap_file
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 每次读取的块大小，决定单个请求的内存上限
+STREAM_CHUNK_SIZE = 256 * 1024
+# 单个请求允许的最大区间数，超过时忽略 Range 返回完整文件
+MAX_RANGES = 16
+
+
+def parse_range_header(value: Optional[str], file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    解析 Range 请求头，返回闭区间列表 [(start, end), ...]。
+
+    Returns:
+        None: 请求头缺失或格式无法识别（按规范忽略 Range）
+        []: 所有区间都不可满足（应返回 416）
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if not value.startswith('bytes='):
+        return None
+    ranges = []
+    for spec in value[len('bytes='):].split(','):
+        spec = spec.strip()
+        if '-' not in spec:
+            return None
+        first, last = spec.split('-', 1)
+        first, last = first.strip(), last.strip()
+        try:
+            if first == '':
+                # 后缀区间：bytes=-N 表示最后 N 个字节
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                ranges.append((max(0, file_size - suffix), file_size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else file_size - 1
+        except ValueError:
+            return None
+        if start < 0 or (last and end < start):
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+    return ranges
+
+
+def coalesce_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠或相邻的区间，避免重复传输同一段字节。"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def make_etag(stat: os.stat_result) -> str:
+    """由文件大小与修改时间生成强 ETag。"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def iter_file_range(path: str, start: int, length: int,
+                    chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读取文件的 [start, start+length) 部分。"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def send_media_file(path: str, environ: dict, headers, mimetype: str = 'video/mp4',
+                    cache_control: str = 'public, max-age=0, must-revalidate') -> Response:
+    """
+    构建流式媒体响应。
+
+    Args:
+        path: 文件路径
+        environ: WSGI environ（用于 wsgi.file_wrapper）
+        headers: 请求头
+        mimetype: 内容类型
+        cache_control: Cache-Control 响应头
+    """
+    stat = os.stat(path)
+    file_size = stat.st_size
+    etag = make_etag(stat)
+    last_modified = http_date(int(stat.st_mtime))
+    base_headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': cache_control,
+        'Access-Control-Allow-Headers': 'Range, If-Range, If-None-Match',
+        'Access-Control-Expose-Headers': 'Content-Range, Content-Length, Accept-Ranges, ETag',
+    }
+
+    # 条件请求：客户端缓存仍然有效时返回 304，不再传输内容
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        if _etag_matches(if_none_match, etag):
+            return Response(status=304, headers=base_headers)
+    else:
+        since = parse_date(headers.get('If-Modified-Since'))
+        if since is not None and int(stat.st_mtime) <= since.timestamp():
+            return Response(status=304, headers=base_headers)
+
+    ranges = parse_range_header(headers.get('Range'), file_size)
+
+    # If-Range：资源已变化则忽略 Range，返回完整的新文件
+    if_range = headers.get('If-Range')
+    if ranges is not None and if_range:
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            still_valid = if_range == etag
+        else:
+            date = parse_date(if_range)
+            still_valid = date is not None and int(stat.st_mtime) == int(date.timestamp())
+        if not still_valid:
+            ranges = None
+
+    if ranges is not None and not ranges:
+        return Response(status=416, headers={**base_headers, 'Content-Range': f'bytes */{file_size}'})
+
+    if ranges is not None:
+        ranges = coalesce_ranges(ranges)
+        if len(ranges) > MAX_RANGES:
+            logger.warning(f"Range 区间数 {len(ranges)} 超过上限 {MAX_RANGES}，返回完整文件")
+            ranges = None
+
+    # 完整文件：交给 wsgi.file_wrapper，支持时可零拷贝发送
+    if ranges is None:
+        f = open(path, 'rb')
+        body = wrap_file(environ, f, STREAM_CHUNK_SIZE)
+        response = Response(body, status=200, mimetype=mimetype, headers=base_headers, direct_passthrough=True)
+        response.content_length = file_size
+        return response
+
+    # 单区间
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        response = Response(
+            iter_file_range(path, start, length), status=206, mimetype=mimetype,
+            headers={**base_headers, 'Content-Range': f'bytes {start}-{end}/{file_size}'},
+            direct_passthrough=True,
+        )
+        response.content_length = length
+        return response
+
+    # 多区间：multipart/byteranges，逐段流式输出
+    boundary = uuid.uuid4().hex
+    parts = []
+    total = 0
+    for start, end in ranges:
+        part_header = (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+        ).encode('ascii')
+        parts.append((part_header, start, end - start + 1))
+        total += len(part_header) + end - start + 1
+    closing = f"\r\n--{boundary}--\r\n".encode('ascii')
+    total += len(closing)
+
+    def generate():
+        for part_header, start, length in parts:
+            yield part_header
+            yield from iter_file_range(path, start, length)
+        yield closing
+
+    response = Response(
+        generate(), status=206, content_type=f'multipart/byteranges; boundary={boundary}',
+        headers=base_headers, direct_passthrough=True,
+    )
+    response.content_length = total
+    return response
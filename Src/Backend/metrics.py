@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+运行指标
+进程内的计数器、仪表与直方图，以 Prometheus 文本格式通过 /metrics 暴露：
+- 不依赖 prometheus_client，各模块直接 import 本模块的指标对象记录数据
+- 直方图按标签分组，记录各阶段耗时（上传、LLM、指令解析、剪辑操作、编码、SAM2、E2FGVI）
+- 仪表支持回调取值，用于队列深度、执行中任务数等实时状态
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, List, Callable, Optional, Iterator
+
+# 耗时类直方图的默认分桶（秒），覆盖毫秒级解析到十分钟级编码
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 字节数直方图分桶：64KB ~ 4GB
+BYTES_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(10))
+# 吞吐量（帧/秒）直方图分桶
+FPS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 240, 480)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.collect()
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表；设置 callback 时在采集时实时取值"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], float]):
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                return [f"{self.name} {_format_value(self.callback())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图，同时记录总和与样本数"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # key -> [各分桶计数..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录 with 代码块的耗时（秒），代码块抛出异常时同样记录。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return int(series[-1]) if series else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {int(series[-1])}")
+        return lines
+
+
+class Registry:
+    """指标注册表，负责生成 /metrics 输出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = Registry()
+
+# ---------- 上传 ----------
+UPLOAD_BYTES = REGISTRY.histogram(
+    'upload_bytes', '单次上传请求写入的字节数', ('kind',), buckets=BYTES_BUCKETS)
+UPLOAD_SECONDS = REGISTRY.histogram(
+    'upload_duration_seconds', '上传请求处理耗时（含写盘与摘要计算）', ('kind',))
+UPLOAD_DEDUPLICATED = REGISTRY.counter(
+    'upload_deduplicated_total', '内容已存在、未重复存储的上传次数')
+
+# ---------- LLM 与指令解析 ----------
+LLM_SECONDS = REGISTRY.histogram(
+    'llm_request_duration_seconds', 'LLM 请求往返耗时', ('status',))
+PARSE_SECONDS = REGISTRY.histogram(
+    'action_parse_duration_seconds', '从 LLM 响应解析操作指令并生成确认消息的耗时')
+
+# ---------- 剪辑与编码 ----------
+EDITOR_OP_SECONDS = REGISTRY.histogram(
+    'editor_operation_duration_seconds', '单个剪辑操作的耗时', ('editor', 'operation', 'status'))
+ENCODE_SECONDS = REGISTRY.histogram(
+    'encode_duration_seconds', '视频编码输出耗时', ('editor',))
+ENCODE_FPS = REGISTRY.histogram(
+    'encode_frames_per_second', '视频编码吞吐量（帧/秒）', ('editor',), buckets=FPS_BUCKETS)
+
+# ---------- 目标分割与消除 ----------
+SAM2_PROPAGATE_SECONDS = REGISTRY.histogram(
+    'sam2_propagation_duration_seconds', 'SAM2 掩码在视频中传播的耗时')
+SAM2_PROPAGATE_FPS = REGISTRY.histogram(
+    'sam2_propagation_frames_per_second', 'SAM2 掩码传播吞吐量（帧/秒）', buckets=FPS_BUCKETS)
+E2FGVI_SECONDS = REGISTRY.histogram(
+    'e2fgvi_inpainting_duration_seconds', 'E2FGVI 目标消除（视频修复）耗时')
+E2FGVI_FPS = REGISTRY.histogram(
+    'e2fgvi_inpainting_frames_per_second', 'E2FGVI 目标消除吞吐量（帧/秒）', buckets=FPS_BUCKETS)
+
+# ---------- 任务队列 ----------
+JOBS_TOTAL = REGISTRY.counter(
+    'render_jobs_total', '已结束的后台任务数', ('kind', 'status'))
+JOB_SECONDS = REGISTRY.histogram(
+    'render_job_duration_seconds', '后台任务从开始执行到结束的耗时', ('kind',))
+JOB_WAIT_SECONDS = REGISTRY.histogram(
+    'render_job_queue_wait_seconds', '后台任务在队列中等待的时间', ('kind',))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'render_queue_depth', '排队中（尚未开始执行）的任务数')
+JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'render_jobs_in_flight', '正在执行的任务数')
+JOBS_STALLED = REGISTRY.gauge(
+    'render_jobs_stalled', '长时间没有进度上报的运行中任务数')
+
+# ---------- 准入控制 ----------
+ADMISSION_REJECTED = REGISTRY.counter(
+    'admission_rejected_total', '因系统繁忙被拒绝（429）的请求数', ('resource_class',))
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    'admission_wait_seconds', '已接纳的请求等待运行名额的时间', ('resource_class',))
+
+# ---------- 磁盘容量 ----------
+STORAGE_BYTES = REGISTRY.gauge(
+    'storage_bytes', '受管文件按类别占用的字节数（最近一次检查）', ('kind',))
+STORAGE_EVICTED = REGISTRY.counter(
+    'storage_evicted_total', '因超出磁盘预算被淘汰的文件数', ('kind',))
+
+# ---------- 渲染缓存 ----------
+RENDER_CACHE_LOOKUPS = REGISTRY.counter(
+    'render_cache_lookups_total', '渲染缓存查询次数', ('result',))
+
+
+def render_latest() -> str:
+    """生成 Prometheus 文本格式的全部指标。"""
+    return REGISTRY.render()
@@ -6,8 +6,12 @@ MoviePy 视频编辑器实现
 
 import os
 import gc
+import time
 import uuid
+import shutil
 import logging
+import tempfile
+import subprocess
 import psutil
 import numpy as np
 import retrying
@@ -19,10 +23,16 @@ from moviepy.editor import (
     vfx, 
     TextClip, 
     CompositeVideoClip, 
-    AudioFileClip, 
-    CompositeAudioClip
+    AudioFileClip
 )
 
+import metrics
+import media_probe
+import progress
+from render_profiles import RenderProfile, default_profile
+from concat_render import canvas_size, pad_frame, pad_command
+from audio_mixer import AudioMixer, AudioLayer, MODE_OVERWRITE, MODE_MIX, MODE_DUCK, DUCK_RAMP_SECONDS
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -103,19 +113,29 @@ class AbstractVideoEditor(ABC):
 class MoviePyVideoEditor(AbstractVideoEditor):
     """基于 MoviePy 的视频编辑器实现"""
     
-    def __init__(self, input_video: str):
+    def __init__(self, input_video: str, work_dir: Optional[str] = None):
         """
         初始化视频编辑器。
 
         Args:
             input_video: 输入视频文件路径。
+            work_dir: 中间文件目录（由调用方创建并在渲染结束后删除）；未指定时在输入视频所在目录下
+                按需创建，close() 时删除。
         """
         if not os.path.exists(input_video):
             raise FileNotFoundError(f"视频文件 {input_video} 不存在")
         self.video_clip = VideoFileClip(input_video)
         self.output_path = f"output_video_{uuid.uuid4()}.mp4"
+        # 编码参数，可在 save() 前按请求替换
+        self.render_profile: RenderProfile = default_profile()
         # 持有子剪辑引用，避免在渲染前被关闭
         self._child_clips = []
+        # 当前音轨若由混音器生成，后续片段直接追加到同一混音器
+        self._audio_mixer: Optional[AudioMixer] = None
+        self._mixed_audio = None
+        self.work_dir = work_dir
+        self._owned_work_dir: Optional[str] = None
+        self._input_dir = os.path.dirname(os.path.abspath(input_video))
         logger.info(f"已加载视频: {input_video}, 时长: {self.video_clip.duration}秒")
 
     def trim(self, start: float = 0.0, end: Optional[float] = None):
@@ -176,6 +196,17 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             return clip.set_audio(silent)
         return clip
 
+    def _audio_duration(self, audio_file: str) -> float:
+        """音频文件时长：优先读取探测元数据，避免仅为取时长而启动一个音频读取进程。"""
+        meta = media_probe.get_metadata(audio_file)
+        if meta and meta.get('duration'):
+            return float(meta['duration'])
+        temp_audio = AudioFileClip(audio_file)
+        try:
+            return temp_audio.duration
+        finally:
+            temp_audio.close()
+
     def _silent_audio(self, duration: float, fps: int = 44100, channels: int = 2):
         """构造指定时长的静音音轨。"""
         from moviepy.audio.AudioClip import AudioClip
@@ -191,6 +222,52 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         # 确保音频格式正确
         return silent_clip
 
+    def _get_work_dir(self) -> str:
+        if self.work_dir:
+            os.makedirs(self.work_dir, exist_ok=True)
+            return self.work_dir
+        if self._owned_work_dir is None:
+            self._owned_work_dir = tempfile.mkdtemp(prefix='.concat_', dir=self._input_dir)
+        return self._owned_work_dir
+
+    def _normalize_inputs(self, clips: list, paths: list) -> list:
+        """
+        合并前用 ffmpeg 把尺寸与合并画布不一致的输入文件一次性居中补边（与 compose 的效果相同），
+        按渲染配置的 preset / CRF 编码，输出写入本次渲染的工作目录。合并时即可直接串联。
+        ffmpeg 失败时保留原剪辑，由 _concat_clips 逐帧补边。
+        """
+        size = canvas_size([tuple(self.video_clip.size)] + [tuple(c.size) for c in clips])
+        normalized = []
+        for clip, path in zip(clips, paths):
+            if tuple(clip.size) == size:
+                normalized.append(clip)
+                continue
+            output = os.path.join(self._get_work_dir(), f"pad_{uuid.uuid4().hex}.mp4")
+            try:
+                subprocess.run(pad_command(path, size, output, self.render_profile),
+                               check=True, capture_output=True, text=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"预先补边失败，改为逐帧补边: {getattr(e, 'stderr', None) or e}")
+                normalized.append(clip)
+                continue
+            padded = VideoFileClip(output)
+            self._child_clips.append(padded)
+            normalized.append(padded)
+            logger.info(f"已预先补边到 {size[0]}x{size[1]}: {path}")
+        return normalized
+
+    def _concat_clips(self, clips: list, padding: float = 0.0):
+        """
+        首尾相接合并剪辑：尺寸一致时直接串联（method="chain"），不分配合成画布、不逐帧合成。
+        输入文件已由 _normalize_inputs 预先补边，只有内存中的当前剪辑（或预先补边失败的输入）
+        尺寸仍不一致时才逐帧补边。交叉淡化等需要混合重叠画面的情况仍使用 compose。
+        """
+        if padding < 0 or any(c.mask is not None for c in clips):
+            return concatenate_videoclips(clips, method="compose", padding=padding)
+        size = canvas_size([tuple(c.size) for c in clips])
+        clips = [c if tuple(c.size) == size else c.fl_image(lambda frame: pad_frame(frame, size)) for c in clips]
+        return concatenate_videoclips(clips, method="chain", padding=padding)
+
     def concatenate(self, second_video: str, transition: str = "none", transition_duration: float = 1.0):
         """
         合并另一个视频，支持转场效果。
@@ -205,8 +282,11 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         if not os.path.exists(second_video):
             raise FileNotFoundError(f"第二个视频文件 {second_video} 不存在")
         
-        # 加载并规范化音轨
+        # 加载并规范化音轨；尺寸不一致时预先补边，合并时即可直接串联
         second_clip = VideoFileClip(second_video)
+        if transition != "crossfade":
+            self._child_clips.append(second_clip)
+            second_clip = self._normalize_inputs([second_clip], [second_video])[0]
         try:
             # 确保两个视频都有音频轨道
             clip1 = self._ensure_audio_track(self.video_clip)
@@ -222,7 +302,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 self._child_clips.extend([clip1_fadeout, clip2_fadein])
                 
                 # 合并视频，确保音频轨道完整
-                result = concatenate_videoclips([clip1_fadeout, clip2_fadein], method="compose")
+                result = self._concat_clips([clip1_fadeout, clip2_fadein])
                 
                 # 验证合并后的音频轨道
                 if result.audio is None:
@@ -241,7 +321,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                     result = result.set_audio(self._silent_audio(result.duration))
             else:
                 # 无转场效果，直接合并
-                result = concatenate_videoclips([clip1, clip2], method="compose")
+                result = self._concat_clips([clip1, clip2])
                 
                 # 验证合并后的音频轨道
                 if result.audio is None:
@@ -266,7 +346,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 clip1 = self._ensure_audio_track(self.video_clip)
                 clip2 = self._ensure_audio_track(second_clip)
                 self._child_clips.extend([second_clip, clip1, clip2])
-                result = concatenate_videoclips([clip1, clip2], method="compose")
+                result = self._concat_clips([clip1, clip2])
                 
                 if result.audio is None:
                     result = result.set_audio(self._silent_audio(result.duration))
@@ -296,13 +376,18 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             return
         
         # 收集并规范化片段
-        loaded = []
+        loaded, loaded_paths = [], []
         for path in video_files:
             if not os.path.exists(path):
                 logger.warning(f"视频文件不存在，跳过: {path}")
                 continue
             c = VideoFileClip(path)
             loaded.append(c)
+            loaded_paths.append(path)
+        # 尺寸不一致的输入预先补边，合并时即可直接串联
+        if transition != "crossfade":
+            self._child_clips.extend(loaded)
+            loaded = self._normalize_inputs(loaded, loaded_paths)
 
         try:
             clips = [self._ensure_audio_track(self.video_clip)] + [self._ensure_audio_track(c) for c in loaded]
@@ -311,7 +396,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             self._child_clips.extend(clips)
 
             if transition == "none":
-                result = concatenate_videoclips(clips, method="compose")
+                result = self._concat_clips(clips)
             elif transition == "fade":
                 proc = []
                 for i, c in enumerate(clips):
@@ -321,7 +406,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                         c = c.fadeout(transition_duration)
                     proc.append(c)
                 self._child_clips.extend(proc)
-                result = concatenate_videoclips(proc, method="compose")
+                result = self._concat_clips(proc)
             elif transition == "crossfade":
                 proc = [clips[0]]
                 for i in range(1, len(clips)):
@@ -329,7 +414,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 self._child_clips.extend(proc)
                 result = concatenate_videoclips(proc, method="compose", padding=-transition_duration)
             else:
-                result = concatenate_videoclips(clips, method="compose")
+                result = self._concat_clips(clips)
 
             # 验证合并后的音频轨道
             if result.audio is None:
@@ -351,7 +436,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 clips = [self._ensure_audio_track(self.video_clip)] + [self._ensure_audio_track(c) for c in loaded]
                 self._child_clips.extend(loaded)
                 self._child_clips.extend(clips)
-                result = concatenate_videoclips(clips, method="compose")
+                result = self._concat_clips(clips)
                 
                 if result.audio is None:
                     result = result.set_audio(self._silent_audio(result.duration))
@@ -394,6 +479,35 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         self.video_clip = self.video_clip.crop(x1=x1, y1=y1, x2=x2, y2=y2)
         logger.info(f"已裁剪画面: x1={x1}, y1={y1}, x2={x2}, y2={y2}")
 
+    def _mix_segment(self, segment_clip, video_start_time: float, video_end_time: float,
+                     volume: float, overwrite: bool, duck: float):
+        """
+        把音频片段加入当前音轨的混音器，混音按整块数组计算。
+        当前音轨已由混音器生成时追加到同一混音器，否则以当前音轨（或静音）为原音频新建。
+        """
+        if not 0.0 <= duck <= 1.0:
+            raise ValueError(f"压低倍数 {duck} 无效，应在 0 到 1 之间")
+        audio = self.video_clip.audio
+        if audio is None or audio is not self._mixed_audio:
+            self._audio_mixer = AudioMixer(
+                audio.get_frame if audio is not None else None,
+                self.video_clip.duration,
+                base_duration=audio.duration if audio is not None else None,
+            )
+        if overwrite:
+            mode = MODE_OVERWRITE
+        elif duck < 1.0:
+            mode = MODE_DUCK
+        else:
+            mode = MODE_MIX
+        self._audio_mixer.add_layer(AudioLayer(
+            segment_clip.get_frame, segment_clip.duration, video_start_time, video_end_time,
+            gain=volume, mode=mode, duck_gain=duck, ramp=DUCK_RAMP_SECONDS,
+        ))
+        from moviepy.audio.AudioClip import AudioClip
+        self._mixed_audio = AudioClip(self._audio_mixer.make_frame, duration=self.video_clip.duration).set_fps(44100)
+        self.video_clip = self.video_clip.set_audio(self._mixed_audio)
+
     def add_background_music(
         self, 
         audio_file: str, 
@@ -403,6 +517,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         audio_end_time: float = None,
         mix: bool = False,
         overwrite: bool = False,
+        duck: float = 1.0,
     ):
         """
         添加背景音乐，支持精确的时间控制。
@@ -415,6 +530,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             audio_end_time: 音频文件的结束时间（秒），None表示到音频结尾
             mix: 是否与原音频混合（向后兼容，若提供 overwrite 则以 overwrite 为准）
             overwrite: 是否覆盖选中视频时间段的原音频（True=覆盖，仅保留新音频；False=共存）
+            duck: 共存时区间内原音频的音量倍数（0~1，小于 1 时压低原声，默认不变）
         """
         if self.video_clip is None:
             raise ValueError("视频剪辑未初始化或已被关闭")
@@ -425,9 +541,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         if video_end_time is None:
             video_end_time = self.video_clip.duration
         if audio_end_time is None:
-            audio_probe = AudioFileClip(audio_file)
-            audio_end_time = audio_probe.duration
-            audio_probe.close()
+            audio_end_time = self._audio_duration(audio_file)
         
         # 验证时间参数
         if video_start_time < 0 or video_start_time >= self.video_clip.duration:
@@ -445,61 +559,12 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         
         # 加载并裁剪音频片段
         segment_clip = AudioFileClip(audio_file).subclip(audio_start_time, audio_end_time)
-        
-        # 基础音频（原音频或静音）
-        base_audio = self.video_clip.audio if self.video_clip.audio is not None else self._silent_audio(self.video_clip.duration)
-        
-        if overwrite:
-            # 覆盖模式：区间内仅保留新音频，区间外保留原音频
-            def combined_frame(t):
-                if t < 0 or t > self.video_clip.duration:
-                    return np.zeros((2,), dtype=np.float32)  # 返回立体声静音帧
-                if video_start_time <= t <= video_end_time:
-                    nt = t - video_start_time
-                    if nt < segment_clip.duration:
-                        try:
-                            frame = segment_clip.get_frame(nt)
-                            # 确保返回正确的音频帧格式
-                            if frame is None:
-                                return np.zeros((2,), dtype=np.float32)
-                            # 如果是单声道，转换为立体声
-                            if len(frame.shape) == 1 or frame.shape[0] == 1:
-                                return np.tile(frame, (2,))
-                            return frame
-                        except Exception as e:
-                            logger.warning(f"获取音频片段帧失败: {e}")
-                            return np.zeros((2,), dtype=np.float32)
-                    else:
-                        return np.zeros((2,), dtype=np.float32)
-                # 区间外：保留原音频
-                try:
-                    if base_audio is not None and t < base_audio.duration:
-                        frame = base_audio.get_frame(t)
-                        if frame is None:
-                            return np.zeros((2,), dtype=np.float32)
-                        # 如果是单声道，转换为立体声
-                        if len(frame.shape) == 1 or frame.shape[0] == 1:
-                            return np.tile(frame, (2,))
-                        return frame
-                    else:
-                        return np.zeros((2,), dtype=np.float32)
-                except Exception as e:
-                    logger.warning(f"获取原音频帧失败: {e}")
-                    return np.zeros((2,), dtype=np.float32)
-            
-            from moviepy.audio.AudioClip import AudioClip
-            combined = AudioClip(combined_frame, duration=self.video_clip.duration).set_fps(44100)
-            final_audio = combined
-        else:
-            # 共存模式：在区间内叠加新音频与原音频（使用 set_start 进行对齐）
-            segment_started = segment_clip.set_start(video_start_time)
-            final_audio = CompositeAudioClip([base_audio, segment_started])
-        
-        self.video_clip = self.video_clip.set_audio(final_audio)
+        self._child_clips.append(segment_clip)
+        self._mix_segment(segment_clip, video_start_time, video_end_time, 1.0, overwrite, duck)
         logger.info(f"已添加背景音乐: {audio_file}")
         logger.info(f"视频时间: {video_start_time}s - {video_end_time}s")
         logger.info(f"音频时间: {audio_start_time}s - {audio_end_time}s")
-        logger.info(f"覆盖原音频: {overwrite}")
+        logger.info(f"覆盖原音频: {overwrite}，原音频压低倍数: {duck}")
 
     def add_audio_segment(
         self,
@@ -511,6 +576,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         volume: float = 1.0,
         mix: bool = True,
         overwrite: bool = False,
+        duck: float = 1.0,
     ):
         """
         在视频的特定时间段添加音频片段。
@@ -524,6 +590,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             volume: 音频音量倍数
             mix: 是否与原音频混合（向后兼容，若提供 overwrite 则以 overwrite 为准）
             overwrite: 是否覆盖选中视频时间段的原音频（True=覆盖，仅保留新音频；False=共存）
+            duck: 共存时区间内原音频的音量倍数（0~1，小于 1 时压低原声，默认不变）
         """
         if self.video_clip is None:
             raise ValueError("视频剪辑未初始化或已被关闭")
@@ -532,9 +599,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         
         # 设置默认值
         if audio_end_time is None:
-            temp_audio = AudioFileClip(audio_file)
-            audio_end_time = temp_audio.duration
-            temp_audio.close()
+            audio_end_time = self._audio_duration(audio_file)
         
         # 验证时间参数
         if video_start_time < 0 or video_start_time >= self.video_clip.duration:
@@ -550,66 +615,13 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         if abs(audio_duration - video_audio_duration) > 0.1:
             raise ValueError(f"音频持续时间 {audio_duration}s 与视频音频持续时间 {video_audio_duration}s 不匹配")
         
-        # 加载并裁剪音频
+        # 加载并裁剪音频，音量在混音时按倍数施加
         segment_clip = AudioFileClip(audio_file).subclip(audio_start_time, audio_end_time)
-        
-        # 调整音量
-        if volume != 1.0:
-            segment_clip = segment_clip.volumex(volume)
-        
-        # 基础音频（原音频或静音）
-        base_audio = self.video_clip.audio if self.video_clip.audio is not None else self._silent_audio(self.video_clip.duration)
-        
-        if overwrite:
-            # 覆盖模式：区间内仅保留新音频，区间外保留原音频
-            def combined_frame(t):
-                if t < 0 or t > self.video_clip.duration:
-                    return np.zeros((2,), dtype=np.float32)  # 返回立体声静音帧
-                if video_start_time <= t <= video_end_time:
-                    nt = t - video_start_time
-                    if nt < segment_clip.duration:
-                        try:
-                            frame = segment_clip.get_frame(nt)
-                            # 确保返回正确的音频帧格式
-                            if frame is None:
-                                return np.zeros((2,), dtype=np.float32)
-                            # 如果是单声道，转换为立体声
-                            if len(frame.shape) == 1 or frame.shape[0] == 1:
-                                return np.tile(frame, (2,))
-                            return frame
-                        except Exception as e:
-                            logger.warning(f"获取音频片段帧失败: {e}")
-                            return np.zeros((2,), dtype=np.float32)
-                    else:
-                        return np.zeros((2,), dtype=np.float32)
-                # 区间外：保留原音频
-                try:
-                    if base_audio is not None and t < base_audio.duration:
-                        frame = base_audio.get_frame(t)
-                        if frame is None:
-                            return np.zeros((2,), dtype=np.float32)
-                        # 如果是单声道，转换为立体声
-                        if len(frame.shape) == 1 or frame.shape[0] == 1:
-                            return np.tile(frame, (2,))
-                        return frame
-                    else:
-                        return np.zeros((2,), dtype=np.float32)
-                except Exception as e:
-                    logger.warning(f"获取原音频帧失败: {e}")
-                    return np.zeros((2,), dtype=np.float32)
-            
-            from moviepy.audio.AudioClip import AudioClip
-            combined = AudioClip(combined_frame, duration=self.video_clip.duration).set_fps(44100)
-            final_audio = combined
-        else:
-            # 共存模式：叠加新音频（对齐起点）
-            segment_started = segment_clip.set_start(video_start_time)
-            final_audio = CompositeAudioClip([base_audio, segment_started])
-        
-        self.video_clip = self.video_clip.set_audio(final_audio)
+        self._child_clips.append(segment_clip)
+        self._mix_segment(segment_clip, video_start_time, video_end_time, volume, overwrite, duck)
         logger.info(f"已在视频时间段 {video_start_time}s - {video_end_time}s 添加音频: {audio_file}")
         logger.info(f"音频时间段: {audio_start_time}s - {audio_end_time}s")
-        logger.info(f"音量倍数: {volume}, 覆盖原音频: {overwrite}")
+        logger.info(f"音量倍数: {volume}, 覆盖原音频: {overwrite}, 原音频压低倍数: {duck}")
 
     def adjust_brightness(self, factor: float = 1.0):
         """调整亮度。"""
@@ -634,15 +646,18 @@ class MoviePyVideoEditor(AbstractVideoEditor):
         """保存编辑后的视频。"""
         if not hasattr(self, 'output_path') or not self.output_path:
             raise ValueError("未设置输出路径")
-        # 使用原始分辨率保存，不做任何压缩或修改
+        # 编码参数取自渲染配置（默认 share：libx264 medium，原始分辨率）
+        start_time = time.perf_counter()
         self.video_clip.write_videofile(
             self.output_path,
-            codec='libx264',
-            audio_codec='aac',
-            preset='medium',
-            ffmpeg_params=["-pix_fmt", "yuv420p"]
+            logger=progress.moviepy_logger(),
+            **self.render_profile.moviepy_kwargs(self.video_clip.fps)
         )
-        logger.info(f"视频已保存至: {self.output_path}")
+        elapsed = time.perf_counter() - start_time
+        metrics.ENCODE_SECONDS.observe(elapsed, editor='moviepy')
+        if elapsed > 0 and self.video_clip.fps:
+            metrics.ENCODE_FPS.observe(self.video_clip.duration * self.video_clip.fps / elapsed, editor='moviepy')
+        logger.info(f"视频已保存至: {self.output_path}（渲染配置: {self.render_profile.name}）")
 
     def close(self):
         """关闭视频剪辑，释放资源。"""
@@ -661,6 +676,9 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 except Exception:
                     pass
             self._child_clips = []
+        if getattr(self, '_owned_work_dir', None):
+            shutil.rmtree(self._owned_work_dir, ignore_errors=True)
+            self._owned_work_dir = None
         gc.collect()
         logger.info("视频剪辑已关闭")
 
@@ -699,6 +717,8 @@ class MoviePyVideoEditor(AbstractVideoEditor):
             logger.warning(error_msg)
             raise ValueError(error_msg)
 
+        op_start = time.perf_counter()
+        operation_name = 'unknown'
         try:
             logger.info(f"执行操作: {action_str}")
             action_parts = action_str.strip().split()
@@ -718,6 +738,7 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 key, value = param.split('=')
                 params[key] = value
 
+            operation_name = action
             operation = operations[action]
             parsed_params = {}
             for param_name, param_info in operation['params'].items():
@@ -769,10 +790,14 @@ class MoviePyVideoEditor(AbstractVideoEditor):
                 error_msg = f"未知操作: {action}"
                 logger.warning(error_msg)
                 raise ValueError(error_msg)
-                
+
+            metrics.EDITOR_OP_SECONDS.observe(time.perf_counter() - op_start, editor='moviepy',
+                                              operation=operation_name, status='ok')
             return True
 
         except Exception as e:
+            metrics.EDITOR_OP_SECONDS.observe(time.perf_counter() - op_start, editor='moviepy',
+                                              operation=operation_name, status='error')
             logger.error(f"编辑操作失败: {e}")
             raise  # 重新抛出异常，让调用方知道操作失败
 
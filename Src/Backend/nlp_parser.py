@@ -6,6 +6,7 @@ from typing import Dict, Any, Callable, Optional, Tuple, List
 from auth_util_tools import gen_sign_headers
 from user_personality_card import UserPersonalityCard
 from config import APP_ID, APP_KEY, URI, DOMAIN, METHOD, SYSTEM_PROMPT
+import metrics
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -67,8 +68,9 @@ OPERATIONS: Dict[str, Dict[str, Any]] = {
             'audio_end_time': {'type': float, 'default': None, 'required': False},
             'mix': {'type': bool, 'default': False, 'required': False},
             'overwrite': {'type': bool, 'default': False, 'required': False},
+            'duck': {'type': float, 'default': 1.0, 'required': False},
         },
-        'description': '添加背景音乐，支持精确时间控制。audio_file=音频文件路径，video_start_time=视频中音频起始时间，video_end_time=视频中音频结束时间，audio_start_time=音频文件起始时间，audio_end_time=音频文件结束时间，overwrite=是否覆盖原音频。',
+        'description': '添加背景音乐，支持精确时间控制。audio_file=音频文件路径，video_start_time=视频中音频起始时间，video_end_time=视频中音频结束时间，audio_start_time=音频文件起始时间，audio_end_time=音频文件结束时间，overwrite=是否覆盖原音频，duck=不覆盖时原音频的音量倍数（0~1，如 0.3 表示压低原声）。',
         'supported_editors': ['moviepy']
     },
     'add_audio_segment': {
@@ -81,8 +83,9 @@ OPERATIONS: Dict[str, Dict[str, Any]] = {
             'volume': {'type': float, 'default': 1.0, 'required': False},
             'mix': {'type': bool, 'default': True, 'required': False},
             'overwrite': {'type': bool, 'default': False, 'required': False},
+            'duck': {'type': float, 'default': 1.0, 'required': False},
         },
-        'description': '在视频的特定时间段添加音频片段。audio_file=音频文件路径，video_start_time=视频中音频起始时间，video_end_time=视频中音频结束时间，audio_start_time=音频文件起始时间，audio_end_time=音频文件结束时间，volume=音量倍数，overwrite=是否覆盖原音频。',
+        'description': '在视频的特定时间段添加音频片段。audio_file=音频文件路径，video_start_time=视频中音频起始时间，video_end_time=视频中音频结束时间，audio_start_time=音频文件起始时间，audio_end_time=音频文件结束时间，volume=音量倍数，overwrite=是否覆盖原音频，duck=不覆盖时原音频的音量倍数（0~1，如 0.3 表示压低原声）。',
         'supported_editors': ['moviepy']
     },
     'concatenate': {
@@ -182,7 +185,12 @@ def init_config() -> Callable:
 
         start_time = time.time()
         url = f'https://{DOMAIN}{URI}'
-        response = requests.post(url, json=data, headers=headers, params=params)
+        try:
+            response = requests.post(url, json=data, headers=headers, params=params)
+        except requests.RequestException:
+            metrics.LLM_SECONDS.observe(time.time() - start_time, status='error')
+            raise
+        metrics.LLM_SECONDS.observe(time.time() - start_time, status=str(response.status_code))
 
         content = None
         confirmation = None
@@ -201,7 +209,8 @@ def init_config() -> Callable:
                 if content.startswith("assistant:"):
                     clean_content = content.replace("assistant:", "").strip()
                 
-                confirmation = generate_confirmation(clean_content)
+                with metrics.PARSE_SECONDS.time():
+                    confirmation = generate_confirmation(clean_content)
                 assistant_message = {"role": "assistant", "content": content}
                 history.append(assistant_message)
         else:
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+并行分段渲染
+MoviePy 的逐帧生成在 Python 中单线程执行，长视频导出的吞吐量受限于一个 CPU 核。并行模式下：
+- 把剪辑后的时间轴按工作进程数切成若干区间，边界对齐到帧；时间轴与源视频一致时优先落在源视频关键帧上，
+  各进程解码时无需从更早的关键帧开始读
+- 每个区间在独立进程中从同一操作链重建剪辑并只编码视频（每段以关键帧开头，编码参数一致），音轨由单独进程整段编码一次，
+  避免 AAC 帧边界在拼接处产生间隙
+- 各段用 concat 分离器无损拼接后与音轨合并；任一段失败时返回 False，由调用方改为单进程编码
+- 所有任务与批量渲染共用一个进程池（process_pool），并发的导出与批量任务不会叠加出超过 CPU 核数的工作进程
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import logging
+import subprocess
+from concurrent.futures import as_completed
+from typing import Any, Callable, List, Optional, Tuple
+
+import metrics
+import process_pool
+import progress
+from render_profiles import RenderProfile, default_profile
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 每段的最短时长（秒），更短的区间进程启动与重建剪辑的开销大于并行收益
+MIN_SEGMENT_SECONDS = 10.0
+# 不改变时间轴的操作：操作链只含这些操作时，源视频的关键帧位置在剪辑后依然有效
+TIME_PRESERVING_OPERATIONS = {
+    'adjust_volume', 'rotate', 'crop', 'adjust_brightness', 'adjust_contrast',
+    'add_background_music', 'add_audio_segment', 'add_transition',
+}
+
+
+def plan_segments(duration: float, fps: float, workers: int, keyframes: Optional[List[float]] = None,
+                  min_segment_seconds: float = MIN_SEGMENT_SECONDS) -> Optional[List[Tuple[float, float]]]:
+    """
+    把 [0, duration] 切成至多 workers 段：[(起点, 终点), ...]。
+    边界取整到帧；给出 keyframes 时吸附到附近的关键帧。不值得拆分时返回 None。
+    """
+    count = min(workers, int(duration // min_segment_seconds))
+    if count < 2 or not fps:
+        return None
+    step = duration / count
+    boundaries = [0.0]
+    for i in range(1, count):
+        target = i * step
+        if keyframes:
+            nearest = min(keyframes, key=lambda k: abs(k - target))
+            # 偏离等分点不超过半段时才吸附，避免各段负载差距过大
+            if abs(nearest - target) <= step / 2:
+                target = nearest
+        boundary = round(target * fps) / fps
+        if boundaries[-1] < boundary < duration:
+            boundaries.append(boundary)
+    boundaries.append(duration)
+    if len(boundaries) < 3:
+        return None
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def keyframes_for(actions: List[str], keyframes: Optional[List[float]]) -> Optional[List[float]]:
+    """操作链不改变时间轴时返回源视频的关键帧，否则返回 None。"""
+    for action in actions:
+        parts = action.strip().split()
+        if len(parts) < 2 or parts[1] not in TIME_PRESERVING_OPERATIONS:
+            return None
+    return keyframes or None
+
+
+def _build_clip(video_path: str, actions: List[str], profile: RenderProfile):
+    from nlp_parser import OPERATIONS
+    from moviepy_editor import MoviePyVideoEditor
+    editor = MoviePyVideoEditor(video_path)
+    editor.render_profile = profile
+    try:
+        for action in actions:
+            if not editor.execute_action(action, OPERATIONS):
+                raise ValueError("操作执行失败，请检查参数是否正确")
+    except Exception:
+        editor.close()
+        raise
+    return editor
+
+
+def render_segment(video_path: str, actions: List[str], start: float, end: float, output_path: str,
+                   threads: int = 1, profile: Optional[RenderProfile] = None) -> str:
+    """在工作进程中执行：重建剪辑并按渲染配置只编码 [start, end] 区间的画面。"""
+    profile = profile or default_profile()
+    editor = _build_clip(video_path, actions, profile)
+    try:
+        clip = editor.video_clip
+        kwargs = profile.moviepy_kwargs(clip.fps)
+        kwargs['threads'] = profile.threads or threads
+        clip.subclip(start, end).write_videofile(output_path, fps=clip.fps, audio=False, logger=None, **kwargs)
+    finally:
+        editor.close()
+    return output_path
+
+
+def render_audio(video_path: str, actions: List[str], output_path: str,
+                 profile: Optional[RenderProfile] = None) -> Optional[str]:
+    """在工作进程中执行：重建剪辑并按渲染配置整段编码音轨；没有音轨时返回 None。"""
+    profile = profile or default_profile()
+    editor = _build_clip(video_path, actions, profile)
+    try:
+        audio = editor.video_clip.audio
+        if audio is None:
+            return None
+        audio.write_audiofile(output_path, fps=profile.audio_sample_rate, codec='aac',
+                              bitrate=f"{profile.audio_bitrate}k", logger=None)
+    finally:
+        editor.close()
+    return output_path
+
+
+def build_mux_command(list_path: str, audio_path: Optional[str], output_path: str,
+                      faststart: bool = True) -> List[str]:
+    """拼接各段画面并合并音轨（全部复制码流）。"""
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_path:
+        command += ['-i', audio_path, '-map', '0:v', '-map', '1:a']
+    command += ['-c', 'copy']
+    if faststart:
+        command += ['-movflags', '+faststart']
+    return command + [output_path]
+
+
+class ParallelRenderer:
+    """多进程分段导出"""
+
+    def __init__(self, max_workers: Optional[int] = None, min_segment_seconds: float = MIN_SEGMENT_SECONDS):
+        """
+        Args:
+            max_workers: 工作进程数，默认取 CPU 核数（共用进程池由首次使用的一方按该值创建）
+            min_segment_seconds: 每段最短时长（秒）
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_segment_seconds = min_segment_seconds
+
+    def plan(self, duration: float, fps: float, actions: List[str],
+             keyframes: Optional[List[float]] = None) -> Optional[List[Tuple[float, float]]]:
+        return plan_segments(duration, fps, self.max_workers, keyframes_for(actions, keyframes),
+                             min_segment_seconds=self.min_segment_seconds)
+
+    def render(self, video_path: str, actions: List[str], output_path: str, duration: float, fps: float,
+               keyframes: Optional[List[float]] = None, profile: Optional[RenderProfile] = None,
+               segment_worker: Callable[..., Any] = render_segment,
+               audio_worker: Callable[..., Any] = render_audio) -> bool:
+        """
+        分段并行导出剪辑结果。
+
+        Args:
+            duration / fps: 剪辑后的时长与帧率（由调用方应用操作链后得到）
+            keyframes: 源视频关键帧（操作链不改变时间轴时用于对齐分段）
+            profile: 渲染配置，默认 share
+            segment_worker / audio_worker: 子进程中执行的函数（需可被 pickle）
+        Returns:
+            bool: True 表示已输出到 output_path；False 表示不值得拆分或执行失败，调用方应单进程编码
+        """
+        segments = self.plan(duration, fps, actions, keyframes)
+        if segments is None:
+            return False
+        profile = profile or default_profile()
+
+        work_dir = tempfile.mkdtemp(prefix='parallel_', dir=os.path.dirname(os.path.abspath(output_path)))
+        tmp_path = os.path.join(work_dir, 'output.mp4')
+        list_path = os.path.join(work_dir, 'parts.txt')
+        # 各进程内 x264 的线程数按总核数平分，避免超额订阅
+        threads = max(1, (os.cpu_count() or 1) // min(self.max_workers, len(segments)))
+        executor = process_pool.get_executor(self.max_workers)
+        start_time = time.perf_counter()
+        futures = {}
+        try:
+            names = []
+            for i, (start, end) in enumerate(segments):
+                name = f"part_{i:02d}.mp4"
+                names.append(name)
+                future = executor.submit(segment_worker, video_path, actions, start, end,
+                                         os.path.join(work_dir, name), threads, profile)
+                futures[future] = name
+            audio_future = executor.submit(audio_worker, video_path, actions, os.path.join(work_dir, 'audio.m4a'),
+                                           profile)
+            futures[audio_future] = 'audio'
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"file '{name}'\n" for name in names)
+
+            reporter = progress.current()
+            reporter.begin('并行编码', len(futures) + 1, 'parts')
+            for future in as_completed(futures):
+                future.result()
+                reporter.advance()
+            subprocess.run(build_mux_command(list_path, audio_future.result(), tmp_path, profile.faststart),
+                           check=True, capture_output=True, text=True)
+            reporter.advance()
+            os.replace(tmp_path, output_path)
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            logger.warning(f"并行渲染失败，改为单进程编码: {getattr(e, 'stderr', None) or e}")
+            return False
+        finally:
+            # 取消后仍在运行的进程写完后再删除临时目录
+            for future in futures:
+                if not future.cancelled():
+                    try:
+                        future.exception()
+                    except Exception:
+                        pass
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        elapsed = time.perf_counter() - start_time
+        metrics.ENCODE_SECONDS.observe(elapsed, editor='parallel')
+        if elapsed > 0:
+            metrics.ENCODE_FPS.observe(duration * fps / elapsed, editor='parallel')
+        logger.info(f"并行渲染完成: {output_path}，{len(segments)} 段，耗时 {elapsed:.2f}秒")
+        return True
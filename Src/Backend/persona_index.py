@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+人格索引
+按用户维护人格摘要（创建时间、最后更新时间、风格摘要），在保存人格时同步更新：
+- /api/persona/list 只需一次索引查找，不再扫描目录、解析每个 persona.json
+- 列表耗时与剪辑历史、训练数据的长度无关
+- 索引持久化为 persona_models/persona_index.json，其他进程写入后按修改时间自动重新加载
+"""
+
+import os
+import json
+import uuid
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'persona_index.json'
+
+
+class PersonaIndex:
+    """用户 → 人格摘要 的持久化索引"""
+
+    def __init__(self, root: str = 'persona_models', index_name: str = INDEX_NAME):
+        """
+        Args:
+            root: 人格模型目录
+            index_name: 索引文件名（位于 root 下）
+        """
+        self.root = root
+        self.index_path = os.path.join(root, index_name)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    # ---------- 索引持久化 ----------
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('users', {})
+                self._mtime = os.path.getmtime(self.index_path)
+                return data
+            except (OSError, ValueError) as e:
+                logger.error(f"读取人格索引失败，将重建: {e}")
+        return {'users': {}}
+
+    def _refresh_locked(self):
+        # 其他进程更新过索引时重新加载
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._index = self._load_index()
+
+    def _save_index_locked(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._mtime = os.path.getmtime(self.index_path)
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    # ---------- 读写 ----------
+    def update(self, user_id: str, persona_name: str, summary: Dict[str, Any]):
+        """写入（或覆盖）单个人格的摘要。"""
+        with self._lock:
+            self._refresh_locked()
+            self._index['users'].setdefault(user_id, {})[persona_name] = summary
+            self._save_index_locked()
+
+    def update_many(self, summaries: List[Dict[str, Any]]):
+        """批量写入摘要（用于重建索引），只写一次磁盘。"""
+        with self._lock:
+            self._refresh_locked()
+            for summary in summaries:
+                self._index['users'].setdefault(summary['user_id'], {})[summary['persona_name']] = summary
+            self._save_index_locked()
+
+    def remove(self, user_id: str, persona_name: str):
+        with self._lock:
+            self._refresh_locked()
+            personas = self._index['users'].get(user_id, {})
+            if personas.pop(persona_name, None) is not None:
+                if not personas:
+                    self._index['users'].pop(user_id, None)
+                self._save_index_locked()
+
+    def list(self, user_id: str) -> List[Dict[str, Any]]:
+        """按最后更新时间倒序返回用户的全部人格摘要。"""
+        with self._lock:
+            self._refresh_locked()
+            personas = list(self._index['users'].get(user_id, {}).values())
+        return sorted(personas, key=lambda p: p.get('last_updated', ''), reverse=True)
+
+    def get(self, user_id: str, persona_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh_locked()
+            summary = self._index['users'].get(user_id, {}).get(persona_name)
+            return dict(summary) if summary else None
+
+
+_indexes: Dict[str, PersonaIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_persona_index(root: str = 'persona_models') -> PersonaIndex:
+    """返回 root 目录对应的共享索引实例。"""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = PersonaIndex(root)
+        return _indexes[key]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+渲染进程池
+批量渲染（batch_render）与并行分段渲染（parallel_render）共用一个进程池：
+同时进行的批量任务与分段导出不会各自启动一组工作进程，进程总数不超过进程池大小。
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    返回共用的进程池，首次使用时再创建；使用 spawn，避免在多线程的服务进程中 fork。
+
+    Args:
+        max_workers: 创建进程池时的工作进程数，默认取 CPU 核数；进程池已存在时忽略
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            max_workers = max_workers or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            logger.info(f"渲染进程池已启动，工作进程数: {max_workers}")
+        return _executor
+
+
+def shutdown(wait: bool = True):
+    """关闭进程池，下次使用时重新创建。"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+任务进度上报
+把编码、模型推理等耗时阶段的实时完成量（帧、窗口）换算为任务的整体进度、速率与剩余时间：
+- 工作线程执行任务时绑定一个 ProgressReporter，编辑器与模型代码通过 current() 取得，无需层层传参
+- MoviePy 通过 proglog 日志回调上报，ffmpeg 通过 -progress 输出上报，
+  SAM2 按传播的帧数上报，E2FGVI 按 tqdm 输出的窗口数上报
+- 没有绑定任务时（命令行、测试）current() 返回空实现，调用方无需判断
+- 任务状态变化以 Server-Sent Events 推送给客户端（/jobs/<job_id>/events）
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 写入任务状态的最小间隔（秒），避免逐帧更新造成锁竞争与推送风暴
+MIN_UPDATE_INTERVAL = 0.25
+# 速率指数滑动平均的平滑系数
+RATE_SMOOTHING = 0.3
+
+_local = threading.local()
+
+
+class ProgressReporter:
+    """把子阶段的完成量换算为任务整体进度（0~1）、速率（单位/秒）与本阶段剩余时间"""
+
+    active = True
+
+    def __init__(self, job=None, min_interval: float = MIN_UPDATE_INTERVAL):
+        """
+        Args:
+            job: 接收进度的任务（需提供 update(progress, stage, rate, eta, unit, done, total)）
+            min_interval: 两次写入任务状态的最小间隔（秒）
+        """
+        self.job = job
+        self.min_interval = min_interval
+        self._span: Tuple[float, float] = (0.0, 1.0)
+        self._part: Tuple[float, float] = (0.0, 1.0)
+        self.stage: Optional[str] = None
+        self.unit = 'frames'
+        self.total: Optional[float] = None
+        self.done = 0.0
+        self.rate: Optional[float] = None
+        self._last_sample: Optional[Tuple[float, float]] = None
+        self._last_emit = 0.0
+
+    @contextmanager
+    def span(self, start: float, end: float):
+        """在 with 块内，子阶段的 0~100% 映射为任务整体进度的 start~end。"""
+        previous = self._span
+        self._span = (start, end)
+        try:
+            yield self
+        finally:
+            self._span = previous
+
+    def begin(self, stage: str, total: Optional[float], unit: str = 'frames',
+              part: Tuple[float, float] = (0.0, 1.0)):
+        """
+        开始一个子阶段。
+
+        Args:
+            stage: 阶段描述
+            total: 总量（帧数、窗口数等），未知时为 None
+            unit: 计量单位
+            part: 本阶段在当前 span 中所占的区间
+        """
+        self.stage = stage
+        self.total = float(total) if total else None
+        self.unit = unit
+        self._part = part
+        self.done = 0.0
+        self.rate = None
+        self._last_sample = (time.time(), 0.0)
+        self._emit(force=True)
+
+    def advance(self, amount: float = 1):
+        self.update(self.done + amount)
+
+    def update(self, done: float, total: Optional[float] = None, rate: Optional[float] = None):
+        """
+        上报当前完成量。
+
+        Args:
+            done: 已完成量
+            total: 总量（可在过程中修正）
+            rate: 外部给出的速率（如 ffmpeg 的 fps），缺省时按完成量的变化估算
+        """
+        now = time.time()
+        if total:
+            self.total = float(total)
+        if rate is not None and rate > 0:
+            self.rate = float(rate)
+        elif self._last_sample is not None:
+            last_time, last_done = self._last_sample
+            elapsed = now - last_time
+            if elapsed >= self.min_interval and done > last_done:
+                sample = (done - last_done) / elapsed
+                self.rate = sample if self.rate is None else (
+                    RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * self.rate)
+                self._last_sample = (now, done)
+        self.done = float(done)
+        self._emit()
+
+    def fraction(self) -> Optional[float]:
+        """本阶段完成比例，总量未知时为 None。"""
+        if not self.total:
+            return None
+        return max(0.0, min(1.0, self.done / self.total))
+
+    def eta(self) -> Optional[float]:
+        """本阶段剩余时间（秒）。"""
+        if not self.total or not self.rate:
+            return None
+        return max(0.0, (self.total - self.done) / self.rate)
+
+    def overall(self) -> Optional[float]:
+        """换算后的任务整体进度。"""
+        fraction = self.fraction()
+        if fraction is None:
+            return None
+        span_start, span_end = self._span
+        part_start, part_end = self._part
+        local = part_start + (part_end - part_start) * fraction
+        return span_start + (span_end - span_start) * local
+
+    def _emit(self, force: bool = False):
+        now = time.time()
+        finished = self.total is not None and self.done >= self.total
+        if not force and not finished and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+        if self.job is None:
+            return
+        eta = self.eta()
+        self.job.update(
+            progress=self.overall(),
+            stage=self.stage,
+            rate=round(self.rate, 2) if self.rate else None,
+            eta=round(eta, 1) if eta is not None else None,
+            unit=self.unit,
+            done=self.done,
+            total=self.total,
+        )
+
+
+class _NullReporter(ProgressReporter):
+    """未绑定任务时使用，所有上报均为空操作"""
+
+    active = False
+
+    def _emit(self, force: bool = False):
+        pass
+
+
+def current() -> ProgressReporter:
+    """返回当前线程绑定的进度上报器。"""
+    reporter = getattr(_local, 'reporter', None)
+    return reporter if reporter is not None else _NullReporter()
+
+
+@contextmanager
+def bind(reporter: ProgressReporter):
+    """在 with 块内把 reporter 绑定到当前线程。"""
+    previous = getattr(_local, 'reporter', None)
+    _local.reporter = reporter
+    try:
+        yield reporter
+    finally:
+        _local.reporter = previous
+
+
+# ---------- MoviePy ----------
+
+_moviepy_logger_class = None
+
+
+def moviepy_logger():
+    """
+    返回传给 write_videofile(logger=...) 的日志对象。
+    绑定了任务时把 proglog 进度条回调转为进度上报（音频 chunk 占 10%，视频帧占 90%），否则保持原有控制台进度条。
+    """
+    reporter = current()
+    if not reporter.active:
+        return 'bar'
+    global _moviepy_logger_class
+    if _moviepy_logger_class is None:
+        from proglog import ProgressBarLogger
+
+        class MoviePyProgressLogger(ProgressBarLogger):
+            """proglog 回调：bar 't' 为视频帧，'chunk' 为音频块"""
+
+            STAGES = {
+                'chunk': ('编码音频', 'chunks', (0.0, 0.1)),
+                't': ('编码视频', 'frames', (0.1, 1.0)),
+            }
+
+            def __init__(self, reporter: ProgressReporter):
+                super().__init__()
+                self.reporter = reporter
+                self._started = set()
+
+            def bars_callback(self, bar, attr, value, old_value=None):
+                if bar not in self.STAGES or attr != 'index':
+                    return
+                total = self.bars[bar].get('total')
+                if bar not in self._started:
+                    stage, unit, part = self.STAGES[bar]
+                    self.reporter.begin(stage, total, unit, part=part)
+                    self._started.add(bar)
+                self.reporter.update(value + 1, total)
+
+        _moviepy_logger_class = MoviePyProgressLogger
+    return _moviepy_logger_class(reporter)
+
+
+# ---------- ffmpeg ----------
+
+def parse_ffmpeg_progress(lines) -> List[Dict[str, Any]]:
+    """
+    解析 ffmpeg -progress 输出（key=value，每个块以 progress=continue/end 结尾），返回每个块的摘要。
+    out_time_ms 实际单位为微秒（ffmpeg 历史遗留），与 out_time_us 相同。
+    """
+    blocks, block = [], {}
+    for line in lines:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value.strip()
+        if key == 'progress':
+            blocks.append(_progress_block(block))
+            block = {}
+    return blocks
+
+
+def _progress_block(block: Dict[str, str]) -> Dict[str, Any]:
+    out_time = None
+    for key in ('out_time_us', 'out_time_ms'):
+        try:
+            out_time = int(block[key]) / 1_000_000
+            break
+        except (KeyError, ValueError):
+            continue
+    try:
+        frame = int(block.get('frame', ''))
+    except ValueError:
+        frame = None
+    try:
+        fps = float(block.get('fps', ''))
+    except ValueError:
+        fps = None
+    return {
+        'frame': frame,
+        'fps': fps,
+        'out_time': max(0.0, out_time) if out_time is not None else None,
+        'end': block.get('progress') == 'end',
+    }
+
+
+def _drain(stream, sink: List[str]):
+    for line in iter(stream.readline, ''):
+        sink.append(line)
+    stream.close()
+
+
+def run_ffmpeg(command: List[str], stage: str = '编码输出', duration: Optional[float] = None,
+               fps: Optional[float] = None) -> subprocess.CompletedProcess:
+    """
+    运行 ffmpeg 并上报进度；失败时与 subprocess.run(check=True) 一样抛出 CalledProcessError。
+
+    Args:
+        command: ffmpeg 命令（列表）
+        stage: 阶段描述
+        duration: 输出时长（秒），用于计算进度
+        fps: 输出帧率；已知时按帧计量，否则按输出秒数计量
+    """
+    reporter = current()
+    if not reporter.active:
+        return subprocess.run(command, check=True, capture_output=True, text=True)
+
+    command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+    by_frames = bool(duration and fps)
+    reporter.begin(stage, duration * fps if by_frames else duration, 'frames' if by_frames else 'seconds')
+    stderr: List[str] = []
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stderr_thread = threading.Thread(target=_drain, args=(process.stderr, stderr), daemon=True)
+    stderr_thread.start()
+    block: List[str] = []
+    for line in iter(process.stdout.readline, ''):
+        block.append(line)
+        if not line.startswith('progress='):
+            continue
+        info = parse_ffmpeg_progress(block)[-1]
+        block = []
+        if by_frames and info['frame'] is not None:
+            reporter.update(info['frame'], rate=info['fps'])
+        elif info['out_time'] is not None:
+            reporter.update(info['out_time'])
+    process.stdout.close()
+    returncode = process.wait()
+    stderr_thread.join()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, stderr=''.join(stderr))
+    return subprocess.CompletedProcess(command, returncode, '', ''.join(stderr))
+
+
+# ---------- tqdm（E2FGVI 等外部脚本） ----------
+
+_TQDM_PATTERN = re.compile(r'(\d+)/(\d+)\s*\[')
+
+
+def parse_tqdm(text: str) -> Optional[Tuple[int, int]]:
+    """从 tqdm 进度条文本中取最后一次的 已完成/总数。"""
+    matches = _TQDM_PATTERN.findall(text)
+    if not matches:
+        return None
+    done, total = matches[-1]
+    return int(done), int(total)
+
+
+def run_with_tqdm(command: List[str], stage: str, unit: str = 'windows', **kwargs) -> subprocess.CompletedProcess:
+    """
+    运行输出 tqdm 进度条（写在 stderr，以 \\r 刷新）的外部脚本并上报进度；
+    失败时抛出 CalledProcessError。其余参数传给 Popen（如 cwd）。
+    """
+    reporter = current()
+    if not reporter.active:
+        return subprocess.run(command, check=True, **kwargs)
+
+    reporter.begin(stage, None, unit)
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, **kwargs)
+    tail = b''
+    output: List[bytes] = []
+    while True:
+        chunk = process.stderr.read1(4096) if hasattr(process.stderr, 'read1') else process.stderr.read(4096)
+        if not chunk:
+            break
+        output.append(chunk)
+        tail = (tail + chunk)[-512:]
+        parsed = parse_tqdm(tail.decode('utf-8', errors='ignore'))
+        if parsed:
+            reporter.update(parsed[0], parsed[1])
+    process.stderr.close()
+    returncode = process.wait()
+    stderr = b''.join(output).decode('utf-8', errors='replace')
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+    return subprocess.CompletedProcess(command, returncode, None, stderr)
+
+
+# ---------- 事件流 ----------
+
+# 事件流的心跳间隔（秒），防止代理因连接空闲而断开
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def format_sse(data: Dict[str, Any], event: str = 'progress') -> str:
+    """格式化为一条 Server-Sent Events 消息。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def job_event_stream(job, keepalive: float = SSE_KEEPALIVE_SECONDS):
+    """逐条产出任务状态变化的 SSE 消息，任务结束后发送 end 事件并结束（阻塞式，用于 WSGI）。"""
+    version, stalled = job.version, job.stalled
+    yield format_sse(job.to_dict())
+    while not job.done:
+        new_version = job.wait_for_update(version, timeout=keepalive)
+        if new_version == version and job.stalled == stalled:
+            yield ": keep-alive\n\n"
+            continue
+        version, stalled = new_version, job.stalled
+        yield format_sse(job.to_dict())
+    yield format_sse(job.to_dict(), event='end')
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+低分辨率代理文件
+上传后为原始视频生成一份 360p、短 GOP 的代理文件：
+- 预览时在代理上执行剪辑链，4K 素材的预览从分钟级降到秒级
+- 用户确认后再把同一条剪辑链在原始文件上重放，得到最终成片
+"""
+
+import os
+import json
+import logging
+import threading
+import subprocess
+from typing import Dict, Any, Optional, Tuple
+
+import media_probe
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 依赖像素坐标的操作参数，在代理上执行时需要按比例缩放
+PIXEL_PARAMS = {
+    'crop': {'x1': 'x', 'y1': 'y', 'x2': 'x', 'y2': 'y'},
+}
+
+
+def probe_dimensions(video_path: str) -> Tuple[int, int]:
+    """使用 ffprobe 获取视频宽高。"""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height',
+        '-of', 'csv=s=x:p=0',
+        video_path,
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    width, height = result.stdout.strip().split('x')[:2]
+    return int(width), int(height)
+
+
+def scale_action(action_str: str, scale_x: float, scale_y: float) -> str:
+    """按比例缩放 action 中的像素坐标参数，使其适用于不同分辨率的文件。"""
+    parts = action_str.strip().split()
+    if len(parts) < 2 or parts[0] != 'action:' or parts[1] not in PIXEL_PARAMS:
+        return action_str
+    axes = PIXEL_PARAMS[parts[1]]
+    scaled = parts[:2]
+    for part in parts[2:]:
+        key, sep, value = part.partition('=')
+        if sep and key in axes:
+            factor = scale_x if axes[key] == 'x' else scale_y
+            try:
+                part = f"{key}={round(float(value) * factor, 1)}"
+            except ValueError:
+                pass
+        scaled.append(part)
+    return ' '.join(scaled)
+
+
+class ProxyGenerator:
+    """生成并管理低分辨率代理文件，以源文件内容摘要命名"""
+
+    def __init__(self, root: str = 'uploads/proxies', height: int = 360, gop: int = 12):
+        """
+        Args:
+            root: 代理文件目录
+            height: 代理高度（宽度按比例取偶数）
+            gop: 关键帧间隔（帧），短 GOP 便于预览时快速定位
+        """
+        self.root = root
+        self.height = height
+        self.gop = gop
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def proxy_path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest}.mp4")
+
+    def _meta_path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest}.json")
+
+    def has_proxy(self, digest: str) -> bool:
+        return os.path.exists(self.proxy_path(digest)) and os.path.exists(self._meta_path(digest))
+
+    def get_meta(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.has_proxy(digest):
+            return None
+        with open(self._meta_path(digest), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def ensure_proxy(self, source_path: str, digest: str) -> Dict[str, Any]:
+        """生成代理文件（已存在时直接返回），同一源文件同时只会生成一次。"""
+        with self._locks_guard:
+            lock = self._locks.setdefault(digest, threading.Lock())
+        with lock:
+            meta = self.get_meta(digest)
+            if meta:
+                return meta
+
+            proxy_path = self.proxy_path(digest)
+            tmp_path = f"{proxy_path}.tmp.mp4"
+            source_meta = media_probe.get_metadata(source_path)
+            if source_meta and source_meta.get('video'):
+                source_w = source_meta['video']['display_width']
+                source_h = source_meta['video']['display_height']
+            else:
+                source_w, source_h = probe_dimensions(source_path)
+            command = [
+                'ffmpeg', '-y',
+                '-i', source_path,
+                '-vf', f"scale=-2:{self.height}",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+                '-g', str(self.gop), '-keyint_min', str(self.gop),
+                '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac', '-b:a', '96k',
+                '-movflags', '+faststart',
+                tmp_path,
+            ]
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                logger.error(f"代理文件生成失败: {e.stderr}")
+                raise
+            os.replace(tmp_path, proxy_path)
+
+            width, height = probe_dimensions(proxy_path)
+            meta = {
+                'digest': digest,
+                'source_width': source_w,
+                'source_height': source_h,
+                'width': width,
+                'height': height,
+            }
+            with open(self._meta_path(digest), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            logger.info(f"代理文件已生成: {proxy_path} ({source_w}x{source_h} → {width}x{height})")
+            return meta
+
+    def action_for_proxy(self, action_str: str, meta: Dict[str, Any]) -> str:
+        """将针对原始分辨率的 action 转换为适用于代理文件的 action。"""
+        return scale_action(
+            action_str,
+            meta['width'] / meta['source_width'],
+            meta['height'] / meta['source_height'],
+        )
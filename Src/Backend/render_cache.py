@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+渲染结果缓存
+以 (输入内容摘要, 规范化后的操作链, 编辑器类型, 编码配置) 为键缓存渲染输出：
+- 客户端重试、重复提交同一指令时直接返回已有输出，不再重新编码
+- 输出文件以缓存键命名，不同请求不会再互相覆盖 output_xxx.mp4
+- 按最近访问时间做磁盘容量上限的 LRU 淘汰；命中时只在内存中更新访问时间，索引按批写回
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 未指定渲染配置时的编码参数标识（各渲染配置的标识见 render_profiles.RenderProfile.cache_tag）
+DEFAULT_ENCODER_PROFILE = 'libx264-medium-aac-yuv420p'
+
+
+def normalize_action(action_str: str) -> str:
+    """
+    规范化 LLM 返回的操作指令：参数按名称排序，数值统一格式。
+    例如 'action: trim end=20.0 start=10' → 'action: trim end=20 start=10'
+    """
+    parts = (action_str or '').strip().split()
+    if len(parts) < 2:
+        return ' '.join(parts)
+    params = []
+    for part in parts[2:]:
+        key, sep, value = part.partition('=')
+        if sep:
+            try:
+                number = float(value)
+                value = str(int(number)) if number.is_integer() else repr(number)
+            except ValueError:
+                pass
+            part = f"{key}={value}"
+        params.append(part)
+    return ' '.join(parts[:2] + sorted(params))
+
+
+class RenderCache:
+    """渲染输出的磁盘 LRU 缓存，索引保存在 root 目录下的 JSON 文件中"""
+
+    def __init__(self, root: str = 'uploads/render_cache', max_bytes: int = 10 * 1024 ** 3,
+                 index_name: str = 'index.json', max_instructions: int = 1000,
+                 flush_every: int = 100, flush_seconds: float = 60):
+        """
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存总大小上限（字节），超过后淘汰最久未访问的输出
+            index_name: 索引文件名（位于 root 下）
+            max_instructions: 内存中保留的“指令 → 操作”解析结果数量
+            flush_every / flush_seconds: 命中累计达到该次数或距上次写索引超过该时长（秒）时才写回访问时间
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, index_name)
+        self.max_instructions = max_instructions
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        # 缓存键 → [锁, 持有或等待的请求数]，无人使用时移除
+        self._key_locks: Dict[str, list] = {}
+        self._unsaved_hits = 0
+        self._saved_at = time.time()
+        self._pinned: Dict[str, int] = {}
+        self._instructions: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    # ---------- 索引持久化 ----------
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.setdefault('entries', {})
+                logger.info(f"已加载渲染缓存索引: {len(data['entries'])} 个条目")
+                return data
+            except (OSError, ValueError) as e:
+                logger.error(f"读取渲染缓存索引失败，将重建: {e}")
+        return {'entries': {}}
+
+    def _save_index_locked(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._unsaved_hits = 0
+        self._saved_at = time.time()
+
+    def flush(self):
+        """把内存中尚未写回的访问时间写入索引。"""
+        with self._lock:
+            if self._unsaved_hits:
+                self._save_index_locked()
+
+    # ---------- 缓存键 ----------
+    @staticmethod
+    def make_key(digest: str, actions: List[str], editor_type: str = 'moviepy',
+                 profile: str = DEFAULT_ENCODER_PROFILE) -> str:
+        """由输入摘要、规范化操作链、编辑器类型与编码配置生成缓存键。"""
+        payload = json.dumps({
+            'digest': (digest or '').lower(),
+            'actions': [normalize_action(a) for a in actions],
+            'editor': editor_type,
+            'profile': profile,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def name_for(self, key: str) -> str:
+        """缓存输出相对于 uploads 目录的文件名。"""
+        return f"{os.path.basename(self.root)}/{key}.mp4"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.mp4")
+
+    @contextmanager
+    def lock_for(self, key: str) -> Iterator[None]:
+        """同一缓存键同时只渲染一次，后到的请求等待后直接命中；最后一个使用者退出后移除该键的锁。"""
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[key]
+
+    # ---------- 存取 ----------
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中时更新访问时间并返回条目，文件已被删除时视为未命中。访问时间按批写回索引。"""
+        with self._lock:
+            entry = self._index['entries'].get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self.path_for(key)):
+                del self._index['entries'][key]
+                self._save_index_locked()
+                return None
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._unsaved_hits += 1
+            if self._unsaved_hits >= self.flush_every or time.time() - self._saved_at >= self.flush_seconds:
+                self._save_index_locked()
+            return dict(entry)
+
+    def put(self, key: str, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """登记已渲染到 path_for(key) 的输出，并按容量上限淘汰旧条目。"""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"渲染输出 {path} 不存在")
+        now = time.time()
+        entry = {
+            'key': key,
+            'size': os.path.getsize(path),
+            'created_at': now,
+            'last_access': now,
+            'hits': 0,
+            'meta': meta or {},
+        }
+        with self._lock:
+            self._index['entries'][key] = entry
+            self._evict_locked(protect=key)
+            self._save_index_locked()
+        return dict(entry)
+
+    def pin(self, key: str):
+        """标记条目正在使用（如正在打包 HLS），淘汰时跳过。"""
+        with self._lock:
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        with self._lock:
+            count = self._pinned.get(key, 0) - 1
+            if count > 0:
+                self._pinned[key] = count
+            else:
+                self._pinned.pop(key, None)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e['size'] for e in self._index['entries'].values())
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """返回全部缓存条目（副本）。"""
+        with self._lock:
+            return [dict(e) for e in self._index['entries'].values()]
+
+    def remove(self, key: str) -> bool:
+        """删除单个条目；条目正在使用（已 pin）时不删除并返回 False。"""
+        with self._lock:
+            if key in self._pinned:
+                return False
+            entry = self._index['entries'].pop(key, None)
+            if entry is None:
+                return False
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除缓存文件失败 {key}: {e}")
+                self._index['entries'][key] = entry
+                return False
+            self._save_index_locked()
+        return True
+
+    def _evict_locked(self, protect: Optional[str] = None):
+        entries = self._index['entries']
+        total = sum(e['size'] for e in entries.values())
+        for entry in sorted(entries.values(), key=lambda e: e['last_access']):
+            if total <= self.max_bytes:
+                break
+            key = entry['key']
+            if key == protect or key in self._pinned:
+                continue
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除缓存文件失败 {key}: {e}")
+                continue
+            total -= entry['size']
+            del entries[key]
+            logger.info(f"淘汰渲染缓存: {key} ({entry['size']} bytes)")
+
+    # ---------- 指令解析结果 ----------
+    def remember_instruction(self, digest: str, instruction: str, action: str, confirmation: str):
+        """记录“同一视频 + 同一指令”的解析结果，重试时可跳过 LLM 调用。"""
+        with self._lock:
+            key = (digest, instruction.strip())
+            self._instructions[key] = (action, confirmation)
+            self._instructions.move_to_end(key)
+            while len(self._instructions) > self.max_instructions:
+                self._instructions.popitem(last=False)
+
+    def recall_instruction(self, digest: str, instruction: str) -> Optional[tuple]:
+        with self._lock:
+            key = (digest, instruction.strip())
+            value = self._instructions.get(key)
+            if value is not None:
+                self._instructions.move_to_end(key)
+            return value
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+渲染配置（render profile）
+编码参数不再写死在各编辑器的 save() 中，而是按请求选择一个命名配置：
+- draft：草稿预览，ultrafast + 540p，比 archive 快一个数量级以上
+- share：默认成片，与原先 MoviePy 的编码参数一致（libx264 medium，CRF 23），并把 moov 前置便于在线播放
+- archive：存档，slow + CRF 18，高码率音频
+- mobile_720p / mobile_1080p：按设备兼容性限制分辨率、H.264 profile/level 与峰值码率
+每个配置同时给出 MoviePy write_videofile 的参数与 ffmpeg 命令行参数；配置内容参与渲染缓存键。
+本机基准测试（python render_profiles.py benchmark <视频>）测量各 preset 的编码速度与体积，
+按配置的目标速度推荐 preset，可写入覆盖文件后由服务加载。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, Any, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_NAME = 'share'
+# x264 preset 由快到慢（同 CRF 下越慢体积越小）
+PRESET_LADDER = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower']
+# 基准测试默认截取的秒数
+BENCHMARK_SECONDS = 20.0
+# ffprobe 报告的 H.264 profile 对应的 x264 -profile:v
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+
+def source_h264_args(video: Dict[str, Any]) -> List[str]:
+    """
+    与探测到的 H.264 源码流相同的 -profile:v / -level 参数（未知时省略）。
+    重新编码的片段与直接复制的码流拼接时需保持一致，否则同一个 avcC 下混有不同 profile / level 的 SPS。
+    """
+    if video.get('codec') not in (None, 'h264'):
+        return []
+    args = []
+    x264_profile = X264_PROFILES.get(video.get('profile'))
+    if x264_profile:
+        args += ['-profile:v', x264_profile]
+    level = video.get('level')
+    if level and level > 0:
+        args += ['-level', f"{level // 10}.{level % 10}"]
+    return args
+
+
+class RenderProfile:
+    """一组编码参数"""
+
+    # 覆盖文件中允许修改的字段
+    FIELDS = ('description', 'preset', 'crf', 'max_bitrate', 'threads', 'gop_seconds', 'faststart', 'max_height',
+              'h264_profile', 'h264_level', 'audio_bitrate', 'audio_sample_rate', 'min_speed')
+
+    def __init__(self, name: str, description: str = '', preset: str = 'medium', crf: int = 23,
+                 max_bitrate: Optional[int] = None, threads: int = 0, gop_seconds: Optional[float] = None,
+                 faststart: bool = True, max_height: Optional[int] = None, h264_profile: Optional[str] = None,
+                 h264_level: Optional[str] = None, audio_bitrate: int = 128, audio_sample_rate: int = 44100,
+                 min_speed: Optional[float] = None):
+        """
+        Args:
+            name: 配置名
+            preset / crf: x264 的速度档位与质量
+            max_bitrate: 峰值视频码率（kbps），None 表示不限（纯 CRF）
+            threads: 编码线程数，0 表示由 x264 自动决定
+            gop_seconds: 关键帧间隔（秒），None 使用编码器默认值
+            faststart: 是否把 moov 前置
+            max_height: 输出画面短边的上限（横屏限制高度、竖屏限制宽度），超出时等比缩小
+            h264_profile / h264_level: 面向设备的 H.264 profile 与 level
+            audio_bitrate / audio_sample_rate: AAC 码率（kbps）与采样率
+            min_speed: 基准测试推荐 preset 时要求的最低编码速度（相对实时的倍数），None 表示不调整 preset
+        """
+        if preset not in PRESET_LADDER:
+            raise ValueError(f"不支持的 preset: {preset}")
+        self.name = name
+        self.description = description
+        self.preset = preset
+        self.crf = crf
+        self.max_bitrate = max_bitrate
+        self.threads = threads
+        self.gop_seconds = gop_seconds
+        self.faststart = faststart
+        self.max_height = max_height
+        self.h264_profile = h264_profile
+        self.h264_level = h264_level
+        self.audio_bitrate = audio_bitrate
+        self.audio_sample_rate = audio_sample_rate
+        self.min_speed = min_speed
+
+    @property
+    def allows_stream_copy(self) -> bool:
+        """不限制分辨率与码率时，智能剪切 / 无损合并直接复制源码流的结果同样符合该配置。"""
+        return self.max_height is None and self.max_bitrate is None
+
+    def scale_filter(self) -> Optional[str]:
+        if not self.max_height:
+            return None
+        # 限制短边：竖屏手机视频（宽 < 高）按宽度缩放，输出为 720x1280 而不是 405x720
+        n = self.max_height
+        return f"scale='if(gt(iw,ih),-2,min(iw,{n}))':'if(gt(iw,ih),min(ih,{n}),-2)'"
+
+    def video_params(self, fps: Optional[float] = None) -> List[str]:
+        """除编码器与 preset 外的视频参数（MoviePy 的 ffmpeg_params 与 ffmpeg 命令共用）。"""
+        params = ['-crf', str(self.crf), '-pix_fmt', 'yuv420p']
+        if self.max_bitrate:
+            params += ['-maxrate', f"{self.max_bitrate}k", '-bufsize', f"{self.max_bitrate * 2}k"]
+        if self.h264_profile:
+            params += ['-profile:v', self.h264_profile]
+        if self.h264_level:
+            params += ['-level', self.h264_level]
+        if self.gop_seconds and fps:
+            params += ['-g', str(max(1, int(round(self.gop_seconds * fps))))]
+        return params
+
+    def container_params(self) -> List[str]:
+        return ['-movflags', '+faststart'] if self.faststart else []
+
+    def ffmpeg_args(self, fps: Optional[float] = None, audio: bool = True) -> List[str]:
+        """ffmpeg 命令的输出编码参数（不含滤镜）。"""
+        args = ['-c:v', 'libx264', '-preset', self.preset] + self.video_params(fps)
+        if self.threads:
+            args += ['-threads', str(self.threads)]
+        if audio:
+            args += ['-c:a', 'aac', '-b:a', f"{self.audio_bitrate}k", '-ar', str(self.audio_sample_rate)]
+        return args + self.container_params()
+
+    def moviepy_kwargs(self, fps: Optional[float] = None) -> Dict[str, Any]:
+        """MoviePy write_videofile 的编码参数。"""
+        ffmpeg_params = self.video_params(fps) + self.container_params()
+        if self.scale_filter():
+            ffmpeg_params += ['-vf', self.scale_filter()]
+        return {
+            'codec': 'libx264',
+            'preset': self.preset,
+            'threads': self.threads or None,
+            'audio_codec': 'aac',
+            'audio_bitrate': f"{self.audio_bitrate}k",
+            'audio_fps': self.audio_sample_rate,
+            'ffmpeg_params': ffmpeg_params,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['name'] = self.name
+        return data
+
+    def cache_tag(self) -> str:
+        """参与渲染缓存键的配置标识：任一编码参数变化时输出不再复用。"""
+        settings = {k: v for k, v in self.to_dict().items() if k not in ('description', 'min_speed')}
+        settings['scale_filter'] = self.scale_filter()
+        digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        return f"{self.name}-{digest}"
+
+    def with_overrides(self, overrides: Dict[str, Any]) -> 'RenderProfile':
+        unknown = set(overrides) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"渲染配置 {self.name} 含未知字段: {', '.join(sorted(unknown))}")
+        data = self.to_dict()
+        data.update(overrides)
+        return RenderProfile(**data)
+
+
+BUILTIN_PROFILES = {p.name: p for p in [
+    RenderProfile('draft', '草稿预览：最快速度，最高 540p', preset='ultrafast', crf=28, gop_seconds=2.0,
+                  max_height=540, audio_bitrate=96, min_speed=8.0),
+    RenderProfile('share', '默认成片：画质与体积均衡', preset='medium', crf=23, audio_bitrate=128, min_speed=1.0),
+    RenderProfile('archive', '存档：高画质，编码较慢', preset='slow', crf=18, audio_bitrate=192,
+                  audio_sample_rate=48000),
+    RenderProfile('mobile_720p', '手机（兼容旧设备）：720p，Main@3.1，峰值 2.5Mbps', preset='medium', crf=23,
+                  max_bitrate=2500, gop_seconds=2.0, max_height=720, h264_profile='main', h264_level='3.1',
+                  audio_bitrate=128, min_speed=2.0),
+    RenderProfile('mobile_1080p', '手机：1080p，High@4.1，峰值 6Mbps', preset='medium', crf=23,
+                  max_bitrate=6000, gop_seconds=2.0, max_height=1080, h264_profile='high', h264_level='4.1',
+                  audio_bitrate=128, min_speed=1.0),
+]}
+
+
+def default_profile() -> RenderProfile:
+    return BUILTIN_PROFILES[DEFAULT_PROFILE_NAME]
+
+
+class RenderProfileRegistry:
+    """内置配置 + 覆盖文件（基准测试的推荐结果或手工调整）"""
+
+    def __init__(self, overrides_path: Optional[str] = None):
+        self.overrides_path = overrides_path
+        self._profiles: Dict[str, RenderProfile] = dict(BUILTIN_PROFILES)
+        if overrides_path and os.path.exists(overrides_path):
+            with open(overrides_path, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+            for name, values in overrides.items():
+                base = self._profiles.get(name) or RenderProfile(name)
+                self._profiles[name] = base.with_overrides(values)
+            logger.info(f"已加载渲染配置覆盖: {overrides_path}")
+
+    def get(self, name: Optional[str] = None) -> RenderProfile:
+        name = name or DEFAULT_PROFILE_NAME
+        if name not in self._profiles:
+            raise ValueError(f"未知的渲染配置: {name}，可选: {', '.join(self.names())}")
+        return self._profiles[name]
+
+    def names(self) -> List[str]:
+        return list(self._profiles)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: profile.to_dict() for name, profile in self._profiles.items()}
+
+
+# ---------- 本机基准测试 ----------
+
+def benchmark_command(video_path: str, profile: RenderProfile, preset: str, seconds: float,
+                      fps: Optional[float], output_path: str) -> List[str]:
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-t', f"{seconds:.3f}", '-i', video_path]
+    if profile.scale_filter():
+        command += ['-vf', profile.scale_filter()]
+    args = profile.with_overrides({'preset': preset}).ffmpeg_args(fps)
+    return command + args + [output_path]
+
+
+def measure(video_path: str, profile: RenderProfile, preset: str, seconds: float,
+            fps: Optional[float], work_dir: str) -> Dict[str, Any]:
+    """以指定 preset 编码样本，返回编码速度（相对实时的倍数）与码率（kbps）。"""
+    output_path = os.path.join(work_dir, f"{profile.name}_{preset}.mp4")
+    start_time = time.perf_counter()
+    subprocess.run(benchmark_command(video_path, profile, preset, seconds, fps, output_path),
+                   check=True, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start_time
+    size = os.path.getsize(output_path)
+    os.remove(output_path)
+    return {
+        'preset': preset,
+        'seconds': round(elapsed, 3),
+        'speed': round(seconds / elapsed, 2) if elapsed > 0 else None,
+        'kbps': round(size * 8 / 1000 / seconds, 1),
+    }
+
+
+def recommend(profile: RenderProfile, measurements: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    在满足 min_speed 的 preset 中选最慢的一个（同 CRF 下体积最小）；都不满足时选最快的。
+    配置没有速度要求或没有测量结果时返回 None。
+    """
+    if profile.min_speed is None or not measurements:
+        return None
+    ordered = sorted(measurements, key=lambda m: PRESET_LADDER.index(m['preset']))
+    fast_enough = [m for m in ordered if m['speed'] is not None and m['speed'] >= profile.min_speed]
+    return (fast_enough[-1] if fast_enough else ordered[0])['preset']
+
+
+def run_benchmark(video_path: str, registry: RenderProfileRegistry, names: List[str],
+                  seconds: float = BENCHMARK_SECONDS) -> Dict[str, Any]:
+    """对每个配置测量其当前 preset 与候选 preset，返回测量结果与推荐的覆盖参数。"""
+    import media_probe
+    meta = media_probe.get_metadata(video_path) or {}
+    fps = (meta.get('video') or {}).get('fps')
+    seconds = min(seconds, meta.get('duration') or seconds)
+    report, overrides = {}, {}
+    work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        for name in names:
+            profile = registry.get(name)
+            presets = PRESET_LADDER if profile.min_speed is not None else [profile.preset]
+            measurements = []
+            for preset in presets:
+                result = measure(video_path, profile, preset, seconds, fps, work_dir)
+                logger.info(f"{name} / {preset}: {result['speed']}x 实时，{result['kbps']} kbps")
+                measurements.append(result)
+            chosen = recommend(profile, measurements)
+            report[name] = {'current_preset': profile.preset, 'recommended_preset': chosen or profile.preset,
+                            'min_speed': profile.min_speed, 'measurements': measurements}
+            if chosen and chosen != profile.preset:
+                overrides[name] = {'preset': chosen}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {'video': video_path, 'sample_seconds': seconds, 'cpu_count': os.cpu_count(),
+            'profiles': report, 'overrides': overrides}
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import RENDER_PROFILES_FILE
+    parser = argparse.ArgumentParser(description='渲染配置：列出配置 / 本机编码基准测试')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='列出当前生效的渲染配置')
+    bench = sub.add_parser('benchmark', help='测量各 preset 的编码速度与体积并推荐配置参数')
+    bench.add_argument('video', help='样本视频')
+    bench.add_argument('--profiles', default=','.join(BUILTIN_PROFILES), help='逗号分隔的配置名')
+    bench.add_argument('--seconds', type=float, default=BENCHMARK_SECONDS, help='截取样本的秒数')
+    bench.add_argument('--write', action='store_true', help=f"把推荐参数合并写入 {RENDER_PROFILES_FILE}")
+    args = parser.parse_args(argv)
+
+    registry = RenderProfileRegistry(RENDER_PROFILES_FILE)
+    if args.command == 'list':
+        json.dump(registry.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+        return
+    result = run_benchmark(args.video, registry, [n for n in args.profiles.split(',') if n], args.seconds)
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    if args.write and result['overrides']:
+        existing = {}
+        if os.path.exists(RENDER_PROFILES_FILE):
+            with open(RENDER_PROFILES_FILE, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        for name, values in result['overrides'].items():
+            existing.setdefault(name, {}).update(values)
+        os.makedirs(os.path.dirname(RENDER_PROFILES_FILE) or '.', exist_ok=True)
+        with open(RENDER_PROFILES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(existing, f, ensure_ascii=False, indent=2)
+        logger.info(f"推荐参数已写入 {RENDER_PROFILES_FILE}，重启服务后生效")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import cv2
+import time
 from sympy import true
 import torch
 import subprocess
@@ -9,6 +10,9 @@ from PIL import Image
 from pathlib import Path
 from sam2.build_sam import build_sam2_video_predictor
 
+import metrics
+import progress
+
 class SAM2InstanceSegmentationModel:
     """使用 SAM2 模型对视频进行实例分割的类。"""
 
@@ -184,6 +188,13 @@ class SAM2InstanceSegmentationModel:
 
         return result
 
+    def _observe_propagation(self, start: float) -> None:
+        """记录掩码传播耗时与吞吐量（帧/秒）。"""
+        elapsed = time.perf_counter() - start
+        metrics.SAM2_PROPAGATE_SECONDS.observe(elapsed)
+        if elapsed > 0 and self.video_segments:
+            metrics.SAM2_PROPAGATE_FPS.observe(len(self.video_segments) / elapsed)
+
     def cleanup(self) -> None:
         """
         删除视频帧文件夹（保留掩码帧文件夹）。
@@ -416,6 +427,9 @@ class SAM2InstanceSegmentationModel:
 
         # 将分割传播到整个视频并存储结果
         self.video_segments = {}
+        propagate_start = time.perf_counter()
+        reporter = progress.current()
+        reporter.begin('掩码传播', inference_state1["num_frames"] + inference_state2["num_frames"], 'frames')
         
         # 处理temp1（反向视频）
         for out_frame_idx, out_obj_ids, out_mask_logits in self.predictor.propagate_in_video(inference_state1):
@@ -425,6 +439,7 @@ class SAM2InstanceSegmentationModel:
                 out_obj_id: (out_mask_logits[i] > 0.0).cpu().numpy()
                 for i, out_obj_id in enumerate(out_obj_ids)
             }
+            reporter.advance()
 
         # 处理temp2（正向视频）
         for out_frame_idx, out_obj_ids, out_mask_logits in self.predictor.propagate_in_video(inference_state2):
@@ -434,6 +449,9 @@ class SAM2InstanceSegmentationModel:
                 out_obj_id: (out_mask_logits[i] > 0.0).cpu().numpy()
                 for i, out_obj_id in enumerate(out_obj_ids)
             }
+            reporter.advance()
+
+        self._observe_propagation(propagate_start)
 
         print("实例分割完成，分割结果已存储。")
         print(f"视频已分为两段：\n1. {temp1_path} (从帧{frame_idx}到帧0)\n2. {temp2_path} (从帧{frame_idx}到结束)")
@@ -478,11 +496,16 @@ class SAM2InstanceSegmentationModel:
 
         # 将分割传播到整个视频
         self.video_segments = {}
+        propagate_start = time.perf_counter()
+        reporter = progress.current()
+        reporter.begin('掩码传播', inference_state["num_frames"], 'frames')
         for out_frame_idx, out_obj_ids, out_mask_logits in self.predictor.propagate_in_video(inference_state):
             self.video_segments[out_frame_idx] = {
                 out_obj_id: (out_mask_logits[i] > 0.0).cpu().numpy()
                 for i, out_obj_id in enumerate(out_obj_ids)
             }
+            reporter.advance()
+        self._observe_propagation(propagate_start)
 
         print("实例分割完成，分割结果已存储。")
 
@@ -690,8 +713,15 @@ def remove_detect_target(input_video_path: str, output_video_path: str = None,
         # 如果提供了输出路径，添加到命令中
         if output_video_path:
             cmd.extend(["--save_path", output_video_path])
-            
-        subprocess.run(cmd, check=True)
+
+        inpaint_start = time.perf_counter()
+        # E2FGVI 按滑动窗口推理，tqdm 进度条给出已完成/总窗口数
+        progress.run_with_tqdm(cmd, stage='目标消除', unit='windows')
+        elapsed = time.perf_counter() - inpaint_start
+        metrics.E2FGVI_SECONDS.observe(elapsed)
+        # 以掩码帧数估算修复吞吐量
+        if elapsed > 0 and os.path.isdir(mask):
+            metrics.E2FGVI_FPS.observe(len(os.listdir(mask)) / elapsed)
 
         # 切换回原始环境（通过新进程）
         subprocess.run([
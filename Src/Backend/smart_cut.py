@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+智能剪切（smart cut）
+只做时间裁剪的操作链不再整段重新编码：
+- 区间内完整的 GOP（两个关键帧之间）直接复制码流，画质无损、速度接近磁盘读写
+- 只有切点所在的不完整 GOP（开头到第一个关键帧、最后一个关键帧到结尾）重新编码
+- 视频各段以 MPEG-TS 输出后用 concat 分离器无损拼接；音轨按区间单独编码一次，避免 AAC 帧边界造成的不同步
+- 关键帧位置来自上传时探测的元数据；仅支持 H.264 源（重新编码的片段需与复制的码流兼容）
+- 切点片段沿用源码流的 H.264 profile / level，preset 与 CRF 取自渲染配置
+"""
+
+import os
+import shutil
+import tempfile
+import logging
+import subprocess
+from typing import Dict, Any, List, Optional, Tuple
+
+import progress
+from render_profiles import RenderProfile, default_profile, source_h264_args
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 可复制的中间部分短于该秒数时不值得拆分，直接整段重新编码
+MIN_COPY_SECONDS = 2.0
+# 可与复制码流拼接的源编码
+SUPPORTED_CODECS = {'h264'}
+
+PART_ENCODE = 'encode'
+PART_COPY = 'copy'
+
+
+def plan_smart_cut(keyframes: List[float], start: float, end: float, duration: float,
+                   min_copy_seconds: float = MIN_COPY_SECONDS) -> Optional[List[Tuple[str, float, float]]]:
+    """
+    规划剪切方案：[(encode|copy, 起点, 终点), ...]。
+    没有足够长的完整 GOP 可复制时返回 None。
+    """
+    epsilon = 1e-3
+    inside = [k for k in keyframes if start - epsilon <= k <= end + epsilon]
+    if not inside:
+        return None
+    copy_start = inside[0]
+    # 区间延伸到视频末尾时最后一个 GOP 也是完整的
+    copy_end = end if end >= duration - epsilon else inside[-1]
+    if copy_end - copy_start < min_copy_seconds:
+        return None
+    parts = []
+    if copy_start - start > epsilon:
+        parts.append((PART_ENCODE, start, copy_start))
+    parts.append((PART_COPY, copy_start, copy_end))
+    if end - copy_end > epsilon:
+        parts.append((PART_ENCODE, copy_end, end))
+    return parts
+
+
+def _edge_encoder_args(video: Dict[str, Any], profile: RenderProfile) -> List[str]:
+    """切点片段的编码参数：profile / level 与源码流一致，拼接后解码器无需切换参数集能力。"""
+    args = ['-c:v', 'libx264', '-preset', profile.preset, '-crf', str(profile.crf),
+            '-pix_fmt', video.get('pix_fmt') or 'yuv420p'] + source_h264_args(video)
+    if profile.threads:
+        args += ['-threads', str(profile.threads)]
+    return args
+
+
+def _part_command(video_path: str, kind: str, start: float, end: float, video: Dict[str, Any],
+                  output_path: str, profile: RenderProfile) -> List[str]:
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-ss', f"{start:.6f}", '-i', video_path, '-t', f"{end - start:.6f}", '-an', '-sn', '-map', '0:v:0']
+    if kind == PART_COPY:
+        command += ['-c:v', 'copy', '-bsf:v', 'h264_mp4toannexb']
+    else:
+        command += _edge_encoder_args(video, profile)
+        if video.get('fps'):
+            command += ['-r', f"{video['fps']:.6f}"]
+    return command + ['-f', 'mpegts', output_path]
+
+
+def build_commands(video_path: str, parts: List[Tuple[str, float, float]], meta: Dict[str, Any],
+                   work_dir: str, output_path: str, profile: Optional[RenderProfile] = None) -> List[List[str]]:
+    """生成各段、音轨与最终拼接的 ffmpeg 命令（最后一条为拼接）。"""
+    profile = profile or default_profile()
+    video = meta['video']
+    commands, names = [], []
+    for i, (kind, start, end) in enumerate(parts):
+        name = f"part_{i:02d}.ts"
+        names.append(name)
+        commands.append(_part_command(video_path, kind, start, end, video, os.path.join(work_dir, name), profile))
+    list_path = os.path.join(work_dir, 'parts.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.writelines(f"file '{name}'\n" for name in names)
+
+    concat = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if meta.get('audio'):
+        start, end = parts[0][1], parts[-1][2]
+        audio_path = os.path.join(work_dir, 'audio.m4a')
+        commands.append(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                         '-ss', f"{start:.6f}", '-i', video_path, '-t', f"{end - start:.6f}",
+                         '-vn', '-sn', '-map', '0:a:0', '-c:a', 'aac', '-b:a', f"{profile.audio_bitrate}k",
+                         '-ar', str(profile.audio_sample_rate), audio_path])
+        concat += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-shortest']
+    concat += ['-c', 'copy'] + profile.container_params() + [output_path]
+    commands.append(concat)
+    return commands
+
+
+def smart_trim(video_path: str, meta: Dict[str, Any], start: float, end: float, output_path: str,
+               profile: Optional[RenderProfile] = None) -> bool:
+    """
+    以智能剪切输出 [start, end] 区间，切点片段按渲染配置的 preset / CRF 编码。
+
+    Returns:
+        bool: True 表示已输出；False 表示不适用（非 H.264、没有可复制的 GOP）或执行失败，调用方应整段重新编码
+    """
+    video = meta.get('video') or {}
+    if video.get('codec') not in SUPPORTED_CODECS or video.get('rotation'):
+        return False
+    duration = meta.get('duration') or video.get('duration') or 0.0
+    parts = plan_smart_cut(meta.get('keyframes') or [], start, end, duration)
+    if parts is None:
+        return False
+
+    work_dir = tempfile.mkdtemp(prefix='smartcut_', dir=os.path.dirname(os.path.abspath(output_path)))
+    tmp_path = os.path.join(work_dir, 'output.mp4')
+    try:
+        commands = build_commands(video_path, parts, meta, work_dir, tmp_path, profile)
+        reporter = progress.current()
+        reporter.begin('智能剪切', len(commands), 'steps')
+        for command in commands:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+            reporter.advance()
+        os.replace(tmp_path, output_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"智能剪切失败，改为重新编码: {getattr(e, 'stderr', None) or e}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    copied = sum(e - s for kind, s, e in parts if kind == PART_COPY)
+    logger.info(f"智能剪切完成: {output_path}（{start:.3f}s - {end:.3f}s，其中 {copied:.3f}s 直接复制码流）")
+    return True
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+时间轴缩略图（雪碧图）
+为移动端拖动预览生成一张拼接了 N 个缩略图的雪碧图，以及记录每格时间点的 JSON 索引：
+- 只解码关键帧（-skip_frame nokey），低分辨率缩放后用 tile 滤镜拼接，一次 ffmpeg 调用完成
+- 已有代理文件（短 GOP、360p）时优先从代理生成，关键帧更密、解码更快
+- 按内容摘要 + 参数缓存在 uploads/sprites/<digest>/ 下，同一内容只生成一次
+"""
+
+import os
+import json
+import math
+import uuid
+import bisect
+import logging
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional
+
+import media_probe
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_SPRITE_COUNT = 400
+
+
+def sprite_layout(duration: float, count: Optional[int] = None, interval: Optional[float] = None,
+                  default_count: int = 100) -> Dict[str, Any]:
+    """根据时长与 count / interval 计算缩略图数量与间隔（秒）。"""
+    if duration <= 0:
+        raise ValueError("无法获取视频时长")
+    if interval is not None:
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError("interval 必须为正数")
+        count = int(math.ceil(duration / interval))
+    else:
+        count = default_count if count is None else int(count)
+        if count <= 0:
+            raise ValueError("count 必须为正整数")
+        interval = duration / count
+    count = max(1, min(count, MAX_SPRITE_COUNT, int(math.ceil(duration / interval))))
+    return {'count': count, 'interval': round(interval, 3)}
+
+
+class SpriteSheetGenerator:
+    """生成并缓存时间轴雪碧图"""
+
+    def __init__(self, root: str = 'uploads/sprites', tile_width: int = 160, columns: int = 10,
+                 url_prefix: str = '/uploads/sprites'):
+        """
+        Args:
+            root: 缓存目录
+            tile_width: 单个缩略图宽度（像素），高度按显示宽高比计算
+            columns: 雪碧图每行缩略图数
+            url_prefix: 对外访问的 URL 前缀
+        """
+        self.root = root
+        self.tile_width = tile_width
+        self.columns = columns
+        self.url_prefix = url_prefix
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _variant(self, layout: Dict[str, Any]) -> str:
+        return f"{layout['count']}x{layout['interval']:g}s-{self.tile_width}w"
+
+    def _paths(self, digest: str, variant: str):
+        directory = os.path.join(self.root, digest)
+        return os.path.join(directory, f"{variant}.jpg"), os.path.join(directory, f"{variant}.json")
+
+    def get(self, video_path: str, digest: str, count: Optional[int] = None,
+            interval: Optional[float] = None, proxy_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        返回雪碧图索引，未缓存时生成。
+
+        Args:
+            video_path: 原始视频
+            digest: 原始视频的内容摘要
+            count / interval: 缩略图数量或间隔（二选一，默认 100 张）
+            proxy_path: 代理文件（存在时优先用于解码）
+        """
+        meta = media_probe.get_metadata(video_path)
+        if not meta or not meta.get('video'):
+            raise ValueError("无法读取视频信息，请确认已安装 ffprobe 并视频文件可用")
+        duration = meta.get('duration') or meta['video']['duration']
+        layout = sprite_layout(duration, count, interval)
+        variant = self._variant(layout)
+        image_path, index_path = self._paths(digest, variant)
+
+        with self._locks_guard:
+            lock = self._locks.setdefault(f"{digest}/{variant}", threading.Lock())
+        with lock:
+            if os.path.exists(index_path) and os.path.exists(image_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            source, source_meta = video_path, meta
+            if proxy_path and os.path.exists(proxy_path):
+                source, source_meta = proxy_path, media_probe.get_metadata(proxy_path) or {}
+            keyframes = source_meta.get('keyframes') or []
+            index = self._generate(source, keyframes, meta, digest, layout, variant, image_path)
+            tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path)
+            return index
+
+    def _generate(self, source: str, keyframes: List[float], meta: Dict[str, Any], digest: str,
+                  layout: Dict[str, Any], variant: str, image_path: str) -> Dict[str, Any]:
+        video = meta['video']
+        tile_width = self.tile_width
+        tile_height = max(2, int(round(tile_width * video['display_height'] / video['display_width'] / 2)) * 2)
+        count, interval = layout['count'], layout['interval']
+        columns = min(self.columns, count)
+        rows = int(math.ceil(count / columns))
+
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp.jpg"
+        # 最后一个关键帧之后的格子以及末行空位用最后一帧补齐
+        duration = meta.get('duration') or video['duration']
+        pad_seconds = duration - (keyframes[-1] if keyframes else 0.0) + interval * (columns * rows - count + 1)
+        # 只解码关键帧；fps 滤镜把稀疏的关键帧补齐为固定间隔（每格显示该时刻之前最近的关键帧）
+        command = [
+            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+            '-skip_frame', 'nokey',
+            '-i', source,
+            '-an', '-sn',
+            '-vf', (f"tpad=stop_mode=clone:stop_duration={pad_seconds:.3f},fps=1/{interval}:round=down,"
+                    f"scale={tile_width}:{tile_height},tile={columns}x{rows}"),
+            '-frames:v', '1',
+            '-q:v', '5',
+            tmp_path,
+        ]
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.error(f"雪碧图生成失败: {e.stderr}")
+            raise
+        os.replace(tmp_path, image_path)
+
+        # 每格实际显示的关键帧时间（用于客户端提示“近似位置”）
+        frames = []
+        for i in range(count):
+            time_point = round(i * interval, 3)
+            k = bisect.bisect_right(keyframes, time_point + 1e-6) - 1
+            frames.append({
+                'index': i,
+                'time': time_point,
+                'keyframe_time': keyframes[k] if k >= 0 else None,
+                'x': (i % columns) * tile_width,
+                'y': (i // columns) * tile_height,
+            })
+        logger.info(f"雪碧图已生成: {image_path}（{count} 张，间隔 {interval}s）")
+        return {
+            'digest': digest,
+            'url': f"{self.url_prefix}/{digest}/{variant}.jpg",
+            'count': count,
+            'interval': interval,
+            'columns': columns,
+            'rows': rows,
+            'tile_width': tile_width,
+            'tile_height': tile_height,
+            'duration': duration,
+            'frames': frames,
+        }
+
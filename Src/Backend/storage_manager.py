@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+磁盘容量管理
+为 uploads 下的各类文件（原始视频、代理文件、渲染输出、HLS 分段、掩码帧、遗留输出）设定总字节预算：
+- 按引用键（内容摘要或渲染缓存键）记录最近访问时间，持久化到 JSON 文件
+- 超出预算时按最近访问时间淘汰，先淘汰可重新生成的派生文件，最后才淘汰原始视频
+- 被进行中的任务或剪辑会话引用的文件、以及最近仍在写入的文件，永不淘汰
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import fnmatch
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 淘汰顺序：数值小的先淘汰
+TIER_DERIVED = 0
+TIER_ORIGINAL = 1
+
+
+class Artifact:
+    """一个可淘汰的存储单元（可能包含多个文件，如代理视频 + 代理元数据）"""
+
+    def __init__(self, kind: str, ref: str, size: int, last_access: float, tier: int,
+                 remove: Callable[[], bool], modified_at: Optional[float] = None):
+        """
+        Args:
+            kind: 类别（original / proxy / render / hls / mask ...）
+            ref: 引用键，任务与会话通过它声明正在使用
+            size: 占用字节数
+            last_access: 最近访问时间
+            tier: 淘汰层级（TIER_DERIVED 先于 TIER_ORIGINAL）
+            remove: 删除函数，返回是否删除成功
+            modified_at: 最近修改时间，用于跳过仍在写入的文件
+        """
+        self.kind = kind
+        self.ref = ref
+        self.size = size
+        self.last_access = last_access
+        self.tier = tier
+        self.remove = remove
+        self.modified_at = modified_at if modified_at is not None else last_access
+
+
+def path_size(path: str) -> int:
+    """文件大小，或目录下全部文件的大小之和。"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def directory_artifacts(kind: str, root: str, patterns: List[str],
+                        tier: int = TIER_DERIVED) -> List[Artifact]:
+    """
+    扫描 root 下匹配 patterns 的文件或目录，按名称第一个 '.' 之前的部分分组，
+    每组为一个 Artifact（如 proxies/<digest>.mp4 与 proxies/<digest>.json）。
+    """
+    if not os.path.isdir(root):
+        return []
+    groups: Dict[str, List[str]] = {}
+    for name in os.listdir(root):
+        if name.startswith('.') or not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        groups.setdefault(name.split('.', 1)[0], []).append(os.path.join(root, name))
+
+    artifacts = []
+    for ref, paths in groups.items():
+        try:
+            size = sum(path_size(p) for p in paths)
+            modified_at = max(os.path.getmtime(p) for p in paths)
+        except OSError:
+            continue
+
+        def remove(paths=paths):
+            for path in paths:
+                _remove_path(path)
+            return True
+
+        artifacts.append(Artifact(kind, ref, size, modified_at, tier, remove, modified_at))
+    return artifacts
+
+
+def content_store_artifacts(store, on_remove: Optional[Callable[[str], None]] = None) -> List[Artifact]:
+    """内容寻址存储中的原始视频。on_remove 在删除后调用，用于清理依附于该摘要的文件。"""
+    artifacts = []
+    for record in store.objects():
+        digest = record['digest']
+        path = store.path_for(record['name'])
+        try:
+            modified_at = os.path.getmtime(path)
+        except OSError:
+            continue
+
+        def remove(digest=digest):
+            removed = store.remove(digest)
+            if removed and on_remove is not None:
+                on_remove(digest)
+            return removed
+
+        last_access = record.get('last_access') or record.get('created_at') or modified_at
+        artifacts.append(Artifact('original', digest, record['size'], last_access,
+                                  TIER_ORIGINAL, remove, modified_at))
+    return artifacts
+
+
+def render_cache_artifacts(cache) -> List[Artifact]:
+    """渲染缓存中的输出（通过 RenderCache 删除，正在使用的条目会被跳过）。"""
+    # 命中时的访问时间只在内存中更新，随每次清理写回索引
+    cache.flush()
+    return [
+        Artifact('render', entry['key'], entry['size'], entry['last_access'], TIER_DERIVED,
+                 lambda key=entry['key']: cache.remove(key), entry.get('created_at'))
+        for entry in cache.entries()
+    ]
+
+
+class StorageManager:
+    """按字节预算淘汰最久未访问的文件"""
+
+    def __init__(self, budget_bytes: int, access_path: str = 'uploads/.storage_access.json',
+                 min_age_seconds: float = 600):
+        """
+        Args:
+            budget_bytes: 全部受管文件的总字节预算
+            access_path: 访问时间记录文件
+            min_age_seconds: 修改时间在此之内的文件不淘汰（可能仍在写入）
+        """
+        self.budget_bytes = budget_bytes
+        self.access_path = access_path
+        self.min_age_seconds = min_age_seconds
+        self._sources: List[Callable[[], List[Artifact]]] = []
+        self._protectors: List[Callable[[], Iterable[str]]] = []
+        self._access: Dict[str, float] = self._load_access()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # ---------- 访问记录 ----------
+    def _load_access(self) -> Dict[str, float]:
+        if os.path.exists(self.access_path):
+            try:
+                with open(self.access_path, 'r', encoding='utf-8') as f:
+                    return {k: float(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                logger.error(f"读取访问记录失败，将重建: {e}")
+        return {}
+
+    def _save_access(self):
+        with self._lock:
+            data = dict(self._access)
+        directory = os.path.dirname(self.access_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.access_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.access_path)
+
+    def touch(self, ref: str):
+        """记录一次访问（内容摘要或渲染缓存键）。"""
+        if ref:
+            with self._lock:
+                self._access[ref.lower()] = time.time()
+
+    # ---------- 注册 ----------
+    def add_source(self, scanner: Callable[[], List[Artifact]]):
+        """注册一类受管文件的扫描函数。"""
+        self._sources.append(scanner)
+
+    def add_protector(self, provider: Callable[[], Iterable[str]]):
+        """注册“正在使用的引用键”提供函数（进行中的任务、剪辑会话等）。"""
+        self._protectors.append(provider)
+
+    # ---------- 扫描与淘汰 ----------
+    def scan(self) -> List[Artifact]:
+        artifacts = []
+        for scanner in self._sources:
+            try:
+                artifacts.extend(scanner())
+            except Exception as e:
+                logger.error(f"扫描受管文件失败: {e}")
+        with self._lock:
+            for artifact in artifacts:
+                artifact.last_access = max(artifact.last_access, self._access.get(artifact.ref.lower(), 0))
+        return artifacts
+
+    def _protected_refs(self) -> set:
+        refs = set()
+        for provider in self._protectors:
+            refs.update(r.lower() for r in provider() if r)
+        return refs
+
+    def usage(self) -> Dict[str, int]:
+        """各类别占用的字节数。"""
+        result: Dict[str, int] = {}
+        for artifact in self.scan():
+            result[artifact.kind] = result.get(artifact.kind, 0) + artifact.size
+        return result
+
+    def sweep(self) -> Dict[str, Any]:
+        """总占用超出预算时，按 层级 → 最近访问时间 的顺序淘汰，直到回到预算之内。"""
+        with self._sweep_lock:
+            artifacts = self.scan()
+            usage: Dict[str, int] = {}
+            for artifact in artifacts:
+                usage[artifact.kind] = usage.get(artifact.kind, 0) + artifact.size
+            total = sum(usage.values())
+            evicted = []
+
+            if total > self.budget_bytes:
+                protected = self._protected_refs()
+                now = time.time()
+                candidates = [a for a in artifacts
+                              if a.ref.lower() not in protected
+                              and now - a.modified_at >= self.min_age_seconds]
+                candidates.sort(key=lambda a: (a.tier, a.last_access))
+                for artifact in candidates:
+                    if total <= self.budget_bytes:
+                        break
+                    try:
+                        removed = artifact.remove()
+                    except OSError as e:
+                        logger.warning(f"淘汰失败 {artifact.kind}/{artifact.ref}: {e}")
+                        continue
+                    if not removed:
+                        continue
+                    total -= artifact.size
+                    usage[artifact.kind] -= artifact.size
+                    evicted.append({'kind': artifact.kind, 'ref': artifact.ref, 'size': artifact.size})
+                    metrics.STORAGE_EVICTED.inc(kind=artifact.kind)
+                    logger.info(f"淘汰 {artifact.kind}: {artifact.ref} ({artifact.size} bytes)")
+                if total > self.budget_bytes:
+                    logger.warning(f"淘汰后仍超出磁盘预算: {total} / {self.budget_bytes} bytes"
+                                   f"（其余文件正在使用或刚刚写入）")
+
+            for kind, size in usage.items():
+                metrics.STORAGE_BYTES.set(size, kind=kind)
+            # 只保留仍存在的文件的访问记录
+            live = {a.ref.lower() for a in artifacts} - {e['ref'].lower() for e in evicted}
+            with self._lock:
+                self._access = {k: v for k, v in self._access.items() if k in live}
+            self._save_access()
+            return {'total_bytes': total, 'budget_bytes': self.budget_bytes,
+                    'usage': usage, 'evicted': evicted}
+
+    # ---------- 后台清理 ----------
+    def start(self, interval: float = 300):
+        """启动后台线程，每 interval 秒（或 request_sweep 时）检查一次。"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stopped:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"磁盘容量检查失败: {e}")
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+        self._thread = threading.Thread(target=loop, name='storage-manager', daemon=True)
+        self._thread.start()
+
+    def request_sweep(self):
+        """提前触发一次检查（如上传或渲染完成后）。"""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()